@@ -16,18 +16,79 @@ class Settings(BaseSettings):
     AZURE_OPENAI_API_KEY: str
     AZURE_OPENAI_DEPLOYMENT_NAME: str = "gpt-4o"
     AZURE_OPENAI_API_VERSION: str = "2024-02-15-preview"
+    # Per-operation deployments (empty = AZURE_OPENAI_DEPLOYMENT_NAME), e.g. a small model for the
+    # text tasks; output failing validation is retried on AZURE_OPENAI_DEPLOYMENT_NAME
+    AZURE_OPENAI_ANALYSIS_DEPLOYMENT: str = ""
+    AZURE_OPENAI_EXPLANATION_DEPLOYMENT: str = ""
+    AZURE_OPENAI_PRACTICE_DEPLOYMENT: str = ""
+    ANALYSIS_TILE_MIN_MEGAPIXELS: float = 16.0  # Larger pages (dense A3 scans) are analyzed in tiles; 0 disables tiling
+    ANALYSIS_TILE_MAX_PX: int = 2048  # Longest tile edge (the vision model downsamples beyond this)
+    ANALYSIS_TILE_OVERLAP: float = 0.1  # Overlap of neighbouring tiles, as a fraction of the page
+    ANALYSIS_MAX_TILES: int = 9
+    VISION_CALL_CONCURRENCY: int = 4  # Vision calls in flight at once, across pages, tiles and submissions
+    AZURE_OPENAI_EMBEDDING_DEPLOYMENT: str = "text-embedding-ada-002"
+    EMBEDDING_DIMENSIONS: int = 1536  # Below 1536 needs a text-embedding-3 deployment (and a matching halfvec(N) index)
+    # The two above are the initial model; later models are switched online via /admin/embeddings/models
+    EMBEDDING_MODEL_REFRESH_SECONDS: int = 30  # How soon other processes see a model cutover
+    EMBEDDING_SHADOW_READ_SAMPLE: float = 0.25  # Share of searches replayed on the shadow model during a migration
+    EMBEDDING_REQUESTS_PER_MINUTE: int = 300  # Embeddings request budget for the backfill job
+    EMBEDDING_BACKFILL_BATCH_SIZE: int = 64  # Questions per embeddings request
+    EMBEDDING_BACKFILL_CONCURRENCY: int = 4
+    EMBEDDING_BACKFILL_CHECKPOINT: str = "embedding_backfill.json"
 
-    # Supabase
-    SUPABASE_URL: str
-    SUPABASE_KEY: str
+    # Supabase (not needed with DB_BACKEND=sqlite)
+    SUPABASE_URL: str = ""
+    SUPABASE_KEY: str = ""
     SUPABASE_SERVICE_ROLE_KEY: Optional[str] = None  # Optional - using anon key + RLS instead
 
     # Database
     DATABASE_URL: str = "sqlite+aiosqlite:///./student_review.db"
+    DB_BACKEND: str = "supabase"  # supabase (PostgREST) | postgres (asyncpg) | sqlite (offline, local files)
+    DATABASE_POOL_MIN_SIZE: int = 1
+    DATABASE_POOL_MAX_SIZE: int = 10
+    DATABASE_STATEMENT_CACHE_SIZE: int = 100  # 0 disables prepared statements (pgbouncer transaction mode)
+
+    # Vector search
+    VECTOR_MATCH_THRESHOLD: float = 0.7  # Minimum cosine similarity for search hits
+    VECTOR_INDEX_MAX_MB: int = 256  # In-process per-user search index budget; 0 disables it
+    VECTOR_INDEX_PRECISION: str = "float32"  # float32 | float16 | int8 (rescored on full precision)
+    VECTOR_RESCORE_FACTOR: int = 4  # Candidates per result fetched before rescoring
+    SEARCH_CANDIDATE_FACTOR: int = 3  # Hybrid search: candidates per result from each of vector and full-text
+    SEARCH_RRF_K: int = 60  # Reciprocal rank fusion damping constant
+
+    # Explanation reuse (ingest-time semantic cache)
+    EXPLANATION_REUSE_ENABLED: bool = True
+    EXPLANATION_REUSE_THRESHOLD: float = 0.97  # Min cosine similarity to reuse a same subject/grade explanation
+    EXPLANATION_MODE: str = "eager"  # eager: at upload | lazy: on first open of GET /questions/{id}
+    EXPLANATION_PREFETCH_COUNT: int = 3  # Lazy mode: next pending questions in review order generated in the background
+
+    # Practice question pools (POST /questions/{id}/similar)
+    PRACTICE_POOL_BATCH_SIZE: int = 6  # Practice questions generated per completion
+    PRACTICE_POOL_LOW_WATER: int = 3  # Refill in the background when fewer unseen questions remain
+    PRACTICE_POOL_MAX_SIZE: int = 30  # Pools stop growing here; clicks then cycle through them
+    PRACTICE_POOL_WARM_ON_OPEN: bool = False  # Fill an opened unresolved question's empty pool in the background (costs a completion per question opened)
+
+    # Deferred deletion (purge worker for deleted questions' embeddings and images)
+    PURGE_BATCH_SIZE: int = 100  # Queue entries per embeddings delete / storage remove
+    PURGE_INTERVAL_SECONDS: int = 30  # Queue poll interval when idle (deletes wake the worker)
+    PURGE_RETRY_BASE_SECONDS: int = 30  # Backoff after a failed batch, doubled per attempt
+    PURGE_RETRY_MAX_SECONDS: int = 3600
 
     # File Upload
+    STORAGE_BACKEND: str = ""  # local | supabase; empty follows DB_BACKEND (sqlite -> local)
+    STORAGE_CACHE_DIR: str = "storage_cache"  # Local LRU cache of bucket objects
+    STORAGE_CACHE_MAX_MB: int = 256  # 0 disables the cache
     UPLOAD_DIR: str = "uploads"
+    SIGNED_UPLOAD_EXPIRE_SECONDS: int = 600  # Lifetime of direct-upload URLs (the Supabase bucket fixes 2 hours)
     MAX_UPLOAD_SIZE: int = 10485760  # 10MB
+    MAX_UPLOAD_PAGES: int = 20  # Pages per multi-page submission (images, or pages of a PDF)
+    PAGE_ANALYSIS_CONCURRENCY: int = 4  # Pages of one submission analyzed at the same time
+    PDF_RENDER_DPI: int = 150  # Resolution PDF pages are rendered at for analysis
+    IMAGE_THUMBNAIL_MAX_PX: int = 320  # Longest edge of the list thumbnail (WebP)
+    IMAGE_REVIEW_MAX_PX: int = 1600  # Longest edge of the review-screen image (WebP)
+    IMAGE_WEBP_QUALITY: int = 80
+    IMAGE_SNIPPET_MAX_PX: int = 1024  # Longest edge of a per-question crop
+    IMAGE_SNIPPET_PADDING: float = 0.02  # Margin added around each question's bounding box (fraction of the page)
 
     # CORS
     ALLOWED_ORIGINS: str = "http://localhost:3000"
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response
 from google.oauth2 import id_token
 from google.auth.transport import requests as google_requests
 from datetime import datetime, timedelta
@@ -6,6 +6,7 @@ from jose import JWTError, jwt
 from typing import Optional, Dict, Any
 
 from app.services.supabase_db_service import supabase_db
+from app.services.user_version_service import user_versions
 from app.schemas import (
     GoogleLoginRequest,
     TokenResponse,
@@ -136,9 +137,15 @@ async def google_login(
 
 @router.get("/me", response_model=UserResponse)
 async def get_current_user_info(
+    request: Request,
+    response: Response,
     current_user: Dict[str, Any] = Depends(get_current_user)
 ):
     """Get current user information"""
+    not_modified = user_versions.check_not_modified(request, response, current_user['id'], "auth.me")
+    if not_modified:
+        return not_modified
+
     return UserResponse(**current_user)
 
 @router.put("/grade", response_model=UserResponse)
@@ -0,0 +1,135 @@
+"""
+Admin-only embedding maintenance router
+Start, monitor and cancel the background embedding backfill / re-index job,
+and migrate to a new embedding model (shadow re-embedding, dual read, cutover)
+"""
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from pydantic import BaseModel
+from typing import Dict, Any
+
+from app.routers.users import get_admin_user
+from app.services.embedding_backfill_service import backfill_runner, MODES
+from app.services.embedding_model_service import embedding_models
+
+router = APIRouter()
+
+class BackfillRequest(BaseModel):
+    mode: str = "missing"  # missing | all | shadow
+    restart: bool = False  # Ignore the checkpoint and start from the first question
+
+class ModelMigrationRequest(BaseModel):
+    deployment: str  # Azure OpenAI embedding deployment name
+    dimensions: int = 1536
+
+class CutoverRequest(BaseModel):
+    force: bool = False  # Cut over even if some questions lack a shadow embedding
+
+@router.post("/backfill", status_code=status.HTTP_202_ACCEPTED)
+async def start_backfill(
+    backfill_request: BackfillRequest,
+    admin_user: Dict[str, Any] = Depends(get_admin_user)
+):
+    """
+    Start the embedding backfill in the background (admin only)
+    mode=missing repairs absent/zero vectors; mode=all re-embeds every question;
+    mode=shadow embeds every question with the model being migrated to
+    """
+    if backfill_request.mode not in MODES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"mode must be one of: {', '.join(MODES)}"
+        )
+    if backfill_request.mode == "shadow" and not await embedding_models.get_shadow():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="No embedding model migration in progress"
+        )
+
+    try:
+        return backfill_runner.start(backfill_request.mode, restart=backfill_request.restart)
+    except RuntimeError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+
+@router.get("/backfill")
+async def get_backfill_status(
+    admin_user: Dict[str, Any] = Depends(get_admin_user)
+):
+    """Progress and throughput of the current or last backfill job (admin only)"""
+    return backfill_runner.status()
+
+@router.delete("/backfill")
+async def cancel_backfill(
+    admin_user: Dict[str, Any] = Depends(get_admin_user)
+):
+    """Cancel the running backfill job; it resumes from its checkpoint next time (admin only)"""
+    if not await backfill_runner.cancel():
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No backfill job is running"
+        )
+    return backfill_runner.status()
+
+# ==================== MODEL MIGRATION ====================
+
+@router.get("/models")
+async def get_embedding_models(
+    coverage: bool = False,
+    admin_user: Dict[str, Any] = Depends(get_admin_user)
+):
+    """
+    Active and shadow embedding models with dual-read agreement (admin only)
+    coverage=true also counts questions embedded with the shadow model (full scan)
+    """
+    await embedding_models.refresh(force=True)
+    result = embedding_models.get_status()
+    if coverage and embedding_models.shadow_tag:
+        result["shadow_coverage"] = await embedding_models.coverage(embedding_models.shadow_tag)
+    return result
+
+@router.post("/models/migration")
+async def start_model_migration(
+    migration_request: ModelMigrationRequest,
+    admin_user: Dict[str, Any] = Depends(get_admin_user)
+):
+    """
+    Start migrating to a new embedding model (admin only)
+    New questions are embedded with both models; run the backfill with mode=shadow
+    for existing ones, then POST /models/cutover
+    """
+    try:
+        await embedding_models.start_migration(migration_request.deployment, migration_request.dimensions)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return embedding_models.get_status()
+
+@router.delete("/models/migration")
+async def abort_model_migration(
+    admin_user: Dict[str, Any] = Depends(get_admin_user)
+):
+    """Abandon the migration; the active model is unchanged (admin only)"""
+    await embedding_models.abort_migration()
+    return embedding_models.get_status()
+
+@router.post("/models/cutover")
+async def cutover_embedding_model(
+    cutover_request: CutoverRequest,
+    admin_user: Dict[str, Any] = Depends(get_admin_user)
+):
+    """
+    Make the shadow model active in one config write (admin only)
+    Refused while questions lack a shadow embedding unless force=true.
+    The old model's vectors are kept until DELETE /models/retired
+    """
+    try:
+        await embedding_models.cutover(force=cutover_request.force)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    return embedding_models.get_status()
+
+@router.delete("/models/retired")
+async def delete_retired_embeddings(
+    admin_user: Dict[str, Any] = Depends(get_admin_user)
+):
+    """Delete vectors of models that are neither active nor shadow (admin only)"""
+    return {"deleted": await embedding_models.delete_retired_embeddings()}
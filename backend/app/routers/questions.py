@@ -1,8 +1,9 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
-from typing import Optional, List, Dict, Any
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Request, Response
+from typing import Optional, List, Dict, Any, Tuple
 from datetime import datetime
+import asyncio
+import mimetypes
 import os
-import uuid
 import shutil
 import tempfile
 
@@ -11,16 +12,45 @@ from app.schemas import (
     QuestionResponse,
     QuestionUpdate,
     UploadResponse,
-    QuestionSearchRequest
+    QuestionSearchRequest,
+    SignedUploadRequest,
+    SignedUploadResponse,
+    FinalizeUploadRequest,
+    BulkDeleteRequest,
+    BulkDeleteResponse,
+    BulkQuestionUpdate,
+    BulkUpdateResponse,
+    UploadStatusResponse
 )
 from app.routers.auth import get_current_user
 from app.services.azure_ai_service import azure_ai_service
 from app.services.supabase_service import supabase_service
+from app.services import hybrid_search
+from app.services.explanation_reuse_service import explanation_reuse, generated_provenance, edited_provenance
+from app.services.lazy_explanation_service import lazy_explanations, is_pending, pending_provenance
+from app.services.practice_pool_service import practice_pools
+from app.services.embedding_model_service import embedding_models, model_tag
+from app.services.storage_backend import content_address, content_digest, digest_address
 from app.services.supabase_storage_service import supabase_storage
+from app.services.local_storage_service import local_storage
+from app.services.image_ref_service import image_refs
+from app.services.purge_service import purge_worker
+from app.services import image_derivative_service as image_derivatives
+from app.services.worksheet_service import merge_page_questions, render_pdf_pages
+from app.services.user_version_service import user_versions
 from app.config import settings
 
 router = APIRouter()
 
+# Question columns holding stored images (each holds one image reference)
+IMAGE_URL_FIELDS = ('image_url', 'image_snippet_url', 'image_thumbnail_url', 'image_review_url')
+
+# Questions per bulk request
+MAX_BULK_QUESTIONS = 500
+
+# Practice questions per /similar click
+SIMILAR_QUESTION_COUNT = 3
+
 @router.post("/upload", response_model=UploadResponse)
 async def upload_question_paper(
     file: UploadFile = File(...),
@@ -32,53 +62,271 @@ async def upload_question_paper(
     Upload and analyze question paper image
     Extracts wrongly answered questions using Azure GPT-4o Vision
     Images are stored in Supabase Storage for persistence
+    (clients that can upload straight to storage use /upload-url and /upload/finalize)
     """
-    temp_file_path = None
-    
+    # Validate file type
+    if not file.content_type.startswith('image/'):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="File must be an image"
+        )
+
+    held_image_urls = []  # Temporary references taken while storing images, released at the end
     try:
-        # Validate file type
-        if not file.content_type.startswith('image/'):
+        # Read file data into memory
+        file_data = await file.read()
+        stored_path, image_url = await _store_page(
+            file_data, os.path.splitext(file.filename)[1], file.content_type, held_image_urls
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Upload failed: {str(e)}"
+        )
+
+    return await _analyze_stored_pages(
+        [(file_data, stored_path, image_url)], held_image_urls, subject, grade, current_user
+    )
+
+@router.post("/upload/pages", response_model=UploadResponse)
+async def upload_question_pages(
+    files: List[UploadFile] = File(...),
+    subject: str = Form(...),
+    grade: str = Form(None),
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """
+    Upload and analyze a multi-page worksheet as one submission
+
+    Accepts page images and/or PDFs (each PDF page becomes a page, in order).
+    Pages are analyzed concurrently, questions running over a page break are
+    joined, and the submission gets a single upload record whose progress
+    (pages_analyzed) and token usage can be followed at /uploads/{upload_id}.
+    """
+    for file in files:
+        if not (file.content_type.startswith('image/') or file.content_type == 'application/pdf'):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
-                detail="File must be an image"
+                detail="Files must be images or PDFs"
             )
 
-        # Read file data into memory
-        file_data = await file.read()
-        
-        # Generate unique filename
-        file_ext = os.path.splitext(file.filename)[1]
-        unique_filename = f"{uuid.uuid4()}{file_ext}"
-        
-        # Save to temporary file for Azure AI processing
-        with tempfile.NamedTemporaryFile(delete=False, suffix=file_ext) as temp_file:
-            temp_file.write(file_data)
-            temp_file_path = temp_file.name
-
-        # Upload to Supabase Storage for persistence
-        try:
-            image_url = await supabase_storage.upload_image(
-                file_data=file_data,
-                filename=unique_filename,
-                content_type=file.content_type
-            )
-            print(f"✅ Image uploaded to Supabase Storage: {image_url}")
-        except Exception as e:
-            print(f"❌ Supabase Storage upload failed, using local fallback: {e}")
-            # Fallback to local storage if Supabase fails
-            upload_dir = settings.UPLOAD_DIR
-            os.makedirs(upload_dir, exist_ok=True)
-            local_file_path = os.path.join(upload_dir, unique_filename)
-            with open(local_file_path, "wb") as buffer:
-                buffer.write(file_data)
-            image_url = f"/uploads/{unique_filename}"
+    # Expand PDFs into page images
+    page_files = []  # (bytes, file extension, content type) per page
+    try:
+        for file in files:
+            file_data = await file.read()
+            if file.content_type == 'application/pdf':
+                rendered = await asyncio.to_thread(
+                    render_pdf_pages, file_data, settings.PDF_RENDER_DPI, settings.MAX_UPLOAD_PAGES
+                )
+                page_files.extend((page_data, ".jpg", "image/jpeg") for page_data in rendered)
+            else:
+                page_files.append((file_data, os.path.splitext(file.filename)[1], file.content_type))
+            if len(page_files) > settings.MAX_UPLOAD_PAGES:
+                raise ValueError(f"At most {settings.MAX_UPLOAD_PAGES} pages per submission")
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    # The same page uploaded twice is analyzed once
+    unique_pages = {}
+    for page_data, file_ext, content_type in page_files:
+        unique_pages.setdefault(content_address(page_data, file_ext), (page_data, file_ext, content_type))
+
+    held_image_urls = []  # Temporary references taken while storing images, released at the end
+    stored = await asyncio.gather(*(
+        _store_page(page_data, file_ext, content_type, held_image_urls)
+        for page_data, file_ext, content_type in unique_pages.values()
+    ), return_exceptions=True)
+    failure = next((result for result in stored if isinstance(result, Exception)), None)
+    if failure is not None:
+        await image_refs.release(held_image_urls)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Upload failed: {str(failure)}"
+        )
+
+    pages = [
+        (page_data, stored_path, image_url)
+        for (page_data, _, _), (stored_path, image_url) in zip(unique_pages.values(), stored)
+    ]
+    filename = os.path.basename(files[0].filename or pages[0][1])
+    return await _analyze_stored_pages(pages, held_image_urls, subject, grade, current_user, filename)
+
+@router.get("/uploads/{upload_id}", response_model=UploadStatusResponse)
+async def get_upload_status(
+    upload_id: int,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Progress and token usage of an upload (poll while a multi-page submission runs)"""
+    upload = await supabase_db.get_upload_history_by_id(upload_id)
+
+    if not upload or upload.get('user_id') != current_user['id']:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Upload not found"
+        )
+
+    return UploadStatusResponse(**upload)
+
+async def _store_page(
+    file_data: bytes,
+    file_ext: str,
+    content_type: str,
+    held_image_urls: List[Optional[str]]
+) -> Tuple[str, str]:
+    """
+    Store an uploaded page image (skipped if the same image is already stored)
+
+    Returns:
+        (content address, image URL); the reference taken is added to held_image_urls
+    """
+    # Images are stored under their content hash, so re-uploads are not stored twice
+    stored_path = content_address(file_data, file_ext)
+
+    # Upload to Supabase Storage for persistence
+    try:
+        image_url = await image_refs.store(file_data, file_ext, content_type)
+        held_image_urls.append(image_url)
+        print(f"✅ Image uploaded to Supabase Storage: {image_url}")
+    except Exception as e:
+        print(f"❌ Supabase Storage upload failed, using local fallback: {e}")
+        # Fallback to local storage if Supabase fails (not reference counted)
+        image_url = await local_storage.upload_object(stored_path, file_data, content_type)
+    return stored_path, image_url
+
+@router.post("/upload-url", response_model=SignedUploadResponse)
+async def create_upload_url(
+    upload_request: SignedUploadRequest,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """
+    Issue a short-lived signed URL to upload a question paper image straight to storage
+
+    The image never passes through the API on the way in: the client PUTs it
+    to upload_url, then calls /upload/finalize with the returned path. When the
+    same image is already stored, already_stored is set and the client skips
+    straight to finalize.
+    """
+    digest = upload_request.sha256.lower()
+    file_ext = os.path.splitext(upload_request.filename)[1].lstrip('.').lower()
+    if not upload_request.content_type.startswith('image/'):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="File must be an image")
+    if len(digest) != 64 or any(c not in "0123456789abcdef" for c in digest):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="sha256 must be a hex digest")
+    if not file_ext.isalnum():
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Filename needs an extension")
+    if upload_request.size > settings.MAX_UPLOAD_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"File exceeds {settings.MAX_UPLOAD_SIZE} bytes"
+        )
+
+    path = digest_address(digest, file_ext)
+    try:
+        if await supabase_storage.object_exists(path):
+            return SignedUploadResponse(path=path, already_stored=True)
+
+        signed = await supabase_storage.create_upload_url(
+            path,
+            upload_request.content_type,
+            settings.SIGNED_UPLOAD_EXPIRE_SECONDS
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Direct upload unavailable: {str(e)}"
+        )
+
+    return SignedUploadResponse(
+        path=path,
+        already_stored=False,
+        upload_url=signed["url"],
+        method=signed["method"],
+        headers=signed["headers"],
+        expires_in=signed["expires_in"]
+    )
+
+@router.post("/upload/finalize", response_model=UploadResponse)
+async def finalize_upload(
+    finalize_request: FinalizeUploadRequest,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """
+    Analyze an image uploaded through /upload-url, reading it from storage
+    """
+    path = finalize_request.path
+    if content_digest(path) is None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid upload path")
+
+    try:
+        file_data = await supabase_storage.read_object(path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Upload not found; upload the file first")
+
+    # The content must be what the path names (and what /upload accepts)
+    file_ext = os.path.splitext(path)[1]
+    content_type = mimetypes.guess_type(path)[0] or ""
+    if (content_address(file_data, file_ext) != path or len(file_data) > settings.MAX_UPLOAD_SIZE
+            or not content_type.startswith('image/')):
+        await image_refs.discard(supabase_storage.object_url(path))
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Uploaded file was rejected")
+
+    try:
+        image_url = await image_refs.adopt(path, file_data, content_type)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Upload failed: {str(e)}"
+        )
+
+    return await _analyze_stored_pages(
+        [(file_data, path, image_url)], [image_url], finalize_request.subject, finalize_request.grade, current_user
+    )
+
+async def _analyze_stored_pages(
+    pages: List[Tuple[bytes, str, str]],
+    held_image_urls: List[Optional[str]],
+    subject: str,
+    grade: Optional[str],
+    current_user: Dict[str, Any],
+    filename: Optional[str] = None
+) -> UploadResponse:
+    """
+    Extract, explain and save the wrong questions of stored question paper pages
+
+    Args:
+        pages: Per page, in order: (image bytes, content address, image URL)
+        held_image_urls: Temporary image references to release at the end
+            (the questions created take their own)
+        subject: Subject of the paper
+        grade: Grade (defaults to the user's)
+        current_user: Uploading user
+        filename: Name shown in the upload history (defaults to the first page's)
+    """
+    temp_file_paths = []
+    derivative_tasks = []
+    page_count = len(pages)
+
+    try:
+        # Save to temporary files for Azure AI processing
+        for file_data, stored_path, _ in pages:
+            with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(stored_path)[1]) as temp_file:
+                temp_file_paths.append(temp_file.name)
+                temp_file.write(file_data)
+
+        # Render thumbnail/review-size copies in worker threads while the pages are analyzed
+        derivative_tasks = [
+            asyncio.ensure_future(image_derivatives.store_derivatives(file_data))
+            for file_data, _, _ in pages
+        ]
 
         # Create upload history record
         upload_record = await supabase_db.create_upload_history(
             user_id=current_user['id'],
-            filename=unique_filename,
+            filename=filename or os.path.basename(pages[0][1]),
             subject=subject,
-            status="processing"
+            status="processing",
+            pages_total=page_count
         )
 
         try:
@@ -87,85 +335,176 @@ async def upload_question_paper(
             total_completion_tokens = 0
             total_tokens = 0
 
-            # Analyze image with Azure GPT-4o Vision (using temp file)
-            analysis_result = await azure_ai_service.analyze_question_paper(
-                temp_file_path,
-                subject
-            )
+            # Analyze the pages with Azure GPT-4o Vision (using temp files), a few at a time
+            semaphore = asyncio.Semaphore(settings.PAGE_ANALYSIS_CONCURRENCY)
 
-            # Track tokens from image analysis
-            if "tokens_used" in analysis_result:
-                tokens = analysis_result["tokens_used"]
-                total_prompt_tokens += tokens.get("prompt_tokens", 0)
-                total_completion_tokens += tokens.get("completion_tokens", 0)
-                total_tokens += tokens.get("total_tokens", 0)
+            async def analyze_page(page_index: int) -> Tuple[int, Dict[str, Any]]:
+                async with semaphore:
+                    return page_index, await azure_ai_service.analyze_question_paper(
+                        temp_file_paths[page_index],
+                        subject,
+                        page_number=page_index + 1,
+                        page_count=page_count
+                    )
 
-            wrong_questions = analysis_result.get("wrong_questions", [])
+            analysis_tasks = [asyncio.ensure_future(analyze_page(i)) for i in range(page_count)]
+            page_questions: List[List[Dict[str, Any]]] = [[] for _ in range(page_count)]
+            try:
+                for pages_analyzed, next_analysis in enumerate(asyncio.as_completed(analysis_tasks), start=1):
+                    page_index, analysis_result = await next_analysis
+                    page_questions[page_index] = analysis_result.get("wrong_questions", [])
+
+                    # Track tokens from image analysis
+                    if "tokens_used" in analysis_result:
+                        tokens = analysis_result["tokens_used"]
+                        total_prompt_tokens += tokens.get("prompt_tokens", 0)
+                        total_completion_tokens += tokens.get("completion_tokens", 0)
+                        total_tokens += tokens.get("total_tokens", 0)
+
+                    # Report progress on the upload record
+                    if page_count > 1:
+                        await supabase_db.update_upload_history(
+                            upload_id=upload_record['id'],
+                            pages_analyzed=pages_analyzed,
+                            prompt_tokens=total_prompt_tokens,
+                            completion_tokens=total_completion_tokens,
+                            total_tokens=total_tokens
+                        )
+            finally:
+                # One failed page fails the submission; stop analyzing the rest
+                for task in analysis_tasks:
+                    task.cancel()
+
+            # Questions running over a page break are joined, repeats dropped
+            wrong_questions = merge_page_questions(page_questions)
             questions_created = []
+            derivative_urls = await asyncio.gather(*derivative_tasks)
+
+            # Crop one snippet per question from its bounding box (one decode per page, uploaded together)
+            page_snippets = await asyncio.gather(*(
+                image_derivatives.store_snippets(
+                    file_data,
+                    [q_data.get("bounding_box") for q_data in wrong_questions if q_data["page"] == page_index]
+                )
+                for page_index, (file_data, _, _) in enumerate(pages)
+            ))
+            snippet_iterators = [iter(snippet_urls) for snippet_urls in page_snippets]
+            snippet_urls = [next(snippet_iterators[q_data["page"]]) for q_data in wrong_questions]
+            held_image_urls.extend(snippet_urls)
 
             # Process each wrong question
-            for q_data in wrong_questions:
+            for q_data, snippet_url in zip(wrong_questions, snippet_urls):
                 question_text = q_data.get("question_text", "")
                 if not question_text:
                     continue
 
-                # Generate AI explanation
-                explanation, explain_tokens = await azure_ai_service.explain_question(
-                    question_text,
-                    subject,
-                    grade or current_user.get('grade')
-                )
-
-                # Track explanation tokens
-                total_prompt_tokens += explain_tokens.get("prompt_tokens", 0)
-                total_completion_tokens += explain_tokens.get("completion_tokens", 0)
-                total_tokens += explain_tokens.get("total_tokens", 0)
+                page_index = q_data["page"]
+                image_url = pages[page_index][2]
+                question_grade = grade or current_user.get('grade')
 
-                # Generate embedding for vector search
-                embedding, embedding_tokens = await azure_ai_service.generate_embedding(question_text)
+                # Generate embedding for vector search (and near-duplicate lookup)
+                active_model = await embedding_models.get_active()
+                embedding, embedding_tokens = await azure_ai_service.generate_embedding(question_text, active_model)
 
                 # Track embedding tokens
                 total_prompt_tokens += embedding_tokens.get("prompt_tokens", 0)
                 total_completion_tokens += embedding_tokens.get("completion_tokens", 0)
                 total_tokens += embedding_tokens.get("total_tokens", 0)
 
+                # Reuse the explanation of a near-duplicate question if there is one
+                reused = await explanation_reuse.find_reusable(embedding, subject, question_grade)
+                if reused:
+                    explanation = reused["explanation"]
+                    provenance = reused["provenance"]
+                elif lazy_explanations.enabled:
+                    # Generated on first open (GET /questions/{id}) instead
+                    explanation = None
+                    provenance = pending_provenance()
+                else:
+                    # Generate AI explanation
+                    explanation, explain_tokens = await azure_ai_service.explain_question(
+                        question_text,
+                        subject,
+                        question_grade
+                    )
+                    provenance = generated_provenance(explain_tokens)
+
+                    # Track explanation tokens
+                    total_prompt_tokens += explain_tokens.get("prompt_tokens", 0)
+                    total_completion_tokens += explain_tokens.get("completion_tokens", 0)
+                    total_tokens += explain_tokens.get("total_tokens", 0)
+
+                question_metadata = {"explanation": provenance}
+                if page_count > 1:
+                    question_metadata["page"] = page_index + 1
+
                 # Create question record with Supabase Storage URL
                 question = await supabase_db.create_question(
                     user_id=current_user['id'],
                     subject=subject,
-                    grade=grade or current_user.get('grade'),
+                    grade=question_grade,
                     question_text=question_text,
                     image_url=image_url,  # Now using Supabase Storage URL
+                    image_snippet_url=snippet_url,
+                    image_thumbnail_url=derivative_urls[page_index].get("thumbnail"),
+                    image_review_url=derivative_urls[page_index].get("review"),
                     explanation=explanation,
-                    status="pending"
+                    status="pending",
+                    question_metadata=question_metadata
                 )
+                await image_refs.acquire(question.get(url_field) for url_field in IMAGE_URL_FIELDS)
 
-                # Store embedding in Supabase
+                # Store embedding in Supabase (a failed embedding is left for the backfill job)
                 try:
+                    if not any(embedding):
+                        raise ValueError("embedding generation failed")
                     vector_id = await supabase_service.store_question_embedding(
                         user_id=current_user['id'],
                         question_id=question['id'],
                         question_text=question_text,
                         embedding=embedding,
                         subject=subject,
-                        grade=grade or current_user.get('grade'),
+                        grade=question_grade,
                         metadata={
                             "topic": q_data.get("topic", ""),
                             "question_number": q_data.get("question_number", "")
-                        }
+                        },
+                        embedding_model=model_tag(active_model)
                     )
                     # Update question with vector_id
                     await supabase_db.update_question(question['id'], vector_id=vector_id)
                 except Exception as e:
                     print(f"Warning: Failed to store embedding: {e}")
 
+                # During a model migration, also embed with the shadow model
+                # (migration cost, not billed to the user; gaps are left for the shadow backfill)
+                shadow_model = await embedding_models.get_shadow()
+                if shadow_model:
+                    try:
+                        shadow_embeddings, _ = await azure_ai_service.generate_embeddings([question_text], shadow_model)
+                        await supabase_service.store_question_embedding(
+                            user_id=current_user['id'],
+                            question_id=question['id'],
+                            question_text=question_text,
+                            embedding=shadow_embeddings[0],
+                            subject=subject,
+                            grade=question_grade,
+                            embedding_model=model_tag(shadow_model)
+                        )
+                    except Exception as e:
+                        print(f"Warning: Failed to store shadow embedding: {e}")
+
                 questions_created.append(question)
 
             # Update upload history
             await supabase_db.update_upload_history(
                 upload_id=upload_record['id'],
                 questions_extracted=len(questions_created),
-                status="completed"
+                status="completed",
+                pages_analyzed=page_count,
+                prompt_tokens=total_prompt_tokens,
+                completion_tokens=total_completion_tokens,
+                total_tokens=total_tokens
             )
 
             # Track token usage for the user
@@ -183,7 +522,8 @@ async def upload_question_paper(
             return UploadResponse(
                 message=f"Successfully extracted {len(questions_created)} wrong question(s)",
                 questions_count=len(questions_created),
-                upload_id=upload_record['id']
+                upload_id=upload_record['id'],
+                pages=page_count
             )
 
         except Exception as e:
@@ -207,15 +547,51 @@ async def upload_question_paper(
             detail=f"Upload failed: {str(e)}"
         )
     finally:
-        # Clean up temporary file
-        if temp_file_path and os.path.exists(temp_file_path):
+        # Hand image references over to the questions created; unused images are deleted
+        for derivatives_task in derivative_tasks:
+            held_image_urls.extend((await derivatives_task).values())
+        try:
+            await image_refs.release(held_image_urls)
+        except Exception as e:
+            print(f"Warning: Failed to release image references: {e}")
+
+        # Clean up temporary files
+        for temp_file_path in temp_file_paths:
             try:
                 os.remove(temp_file_path)
             except Exception:
                 pass
 
+@router.delete("", response_model=BulkDeleteResponse)
+async def delete_questions(
+    delete_request: BulkDeleteRequest,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """
+    Delete many questions in one statement
+    Their embeddings and images are removed in the background by the purge worker
+    """
+    question_ids = list(dict.fromkeys(delete_request.question_ids))
+    if len(question_ids) > MAX_BULK_QUESTIONS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {MAX_BULK_QUESTIONS} questions per request"
+        )
+
+    deleted = await supabase_db.delete_questions(current_user['id'], question_ids) if question_ids else []
+    if deleted:
+        purge_worker.notify()
+
+    deleted_set = set(deleted)
+    return BulkDeleteResponse(
+        deleted=[question_id for question_id in question_ids if question_id in deleted_set],
+        not_found=[question_id for question_id in question_ids if question_id not in deleted_set]
+    )
+
 @router.get("/wrong", response_model=List[QuestionResponse])
 async def get_wrong_questions(
+    request: Request,
+    response: Response,
     subject: Optional[str] = None,
     grade: Optional[str] = None,
     status: Optional[str] = None,
@@ -224,6 +600,11 @@ async def get_wrong_questions(
     current_user: Dict[str, Any] = Depends(get_current_user)
 ):
     """Get all wrong questions with optional filters"""
+    # Answer 304 if nothing changed since the client's copy
+    not_modified = user_versions.check_not_modified(request, response, current_user['id'], "questions.wrong")
+    if not_modified:
+        return not_modified
+
     # Get questions from Supabase
     questions = await supabase_db.get_questions_by_user(
         user_id=current_user['id'],
@@ -260,51 +641,45 @@ async def search_questions(
     search_request: QuestionSearchRequest,
     current_user: Dict[str, Any] = Depends(get_current_user)
 ):
-    """Search questions using vector similarity (semantic search)"""
+    """Search questions by meaning and by exact terms (hybrid vector + full-text search)"""
     try:
         # Generate embedding for search query
-        query_embedding = await azure_ai_service.generate_embedding(search_request.query)
+        query_embedding, embedding_tokens = await azure_ai_service.generate_embedding(search_request.query)
+
+        # Track embedding tokens
+        if embedding_tokens.get("total_tokens", 0) > 0:
+            try:
+                await supabase_db.add_token_usage(
+                    user_id=current_user['id'],
+                    prompt_tokens=embedding_tokens.get("prompt_tokens", 0),
+                    completion_tokens=embedding_tokens.get("completion_tokens", 0),
+                    total_tokens=embedding_tokens.get("total_tokens", 0)
+                )
+            except Exception as e:
+                print(f"Warning: Failed to track token usage: {e}")
 
-        # Search in Supabase vector DB
-        similar_questions = await supabase_service.search_similar_questions(
+        # Vector + full-text search, fused by rank
+        question_ids = await hybrid_search.search_question_ids(
             user_id=current_user['id'],
+            query=search_request.query,
             query_embedding=query_embedding,
             limit=search_request.limit
         )
 
-        # Get question IDs from vector search results
-        question_ids = [q.get("question_id") for q in similar_questions if q.get("question_id")]
-
-        if not question_ids:
-            # Fallback to simple text search
-            all_questions = await supabase_db.get_questions_by_user(
-                user_id=current_user['id'],
-                limit=search_request.limit
-            )
-            # Filter by text match
-            questions = [q for q in all_questions
-                        if search_request.query.lower() in q.get('question_text', '').lower()]
-        else:
-            # Get questions by IDs from vector search
-            questions = []
-            for qid in question_ids:
-                q = await supabase_db.get_question_by_id(qid)
-                if q and q.get('user_id') == current_user['id']:
-                    questions.append(q)
+        # Fetch all hits in one query, scoped to the user and kept in ranking order
+        questions = await supabase_db.get_questions_by_ids(
+            question_ids,
+            user_id=current_user['id']
+        )
 
         return [QuestionResponse(**q) for q in questions]
 
     except Exception as e:
-        # Fallback to simple text search on error
-        all_questions = await supabase_db.get_questions_by_user(
-            user_id=current_user['id'],
-            limit=search_request.limit
+        print(f"Error searching questions: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Search failed: {str(e)}"
         )
-        # Filter by text match
-        questions = [q for q in all_questions
-                    if search_request.query.lower() in q.get('question_text', '').lower()]
-
-        return [QuestionResponse(**q) for q in questions]
 
 @router.post("/{question_id}/regenerate", response_model=QuestionResponse)
 async def regenerate_explanation(
@@ -328,10 +703,13 @@ async def regenerate_explanation(
             question.get('grade')
         )
 
-        # Update question with new explanation
+        # Update question with new explanation (replacing any reused one)
+        metadata = dict(question.get('question_metadata') or {})
+        metadata["explanation"] = generated_provenance(tokens_used)
         updated_question = await supabase_db.update_question(
             question_id,
-            explanation=new_explanation
+            explanation=new_explanation,
+            question_metadata=metadata
         )
 
         # Track token usage
@@ -358,7 +736,13 @@ async def generate_similar_questions(
     question_id: int,
     current_user: Dict[str, Any] = Depends(get_current_user)
 ):
-    """Generate 3 similar practice questions for the student to try"""
+    """
+    Get 3 similar practice questions for the student to try
+    Served from the question's stored practice pool, new ones first on repeat
+    clicks; the pool is generated on the first click (or in the background when
+    an unresolved question is opened, with PRACTICE_POOL_WARM_ON_OPEN) and
+    refilled in the background
+    """
     question = await supabase_db.get_question_by_id(question_id)
 
     if not question or question.get('user_id') != current_user['id']:
@@ -368,28 +752,11 @@ async def generate_similar_questions(
         )
 
     try:
-        # Generate similar questions
-        similar_questions, tokens_used = await azure_ai_service.generate_similar_questions(
-            question.get('question_text'),
-            question.get('subject'),
-            question.get('grade')
-        )
-
-        # Track token usage
-        try:
-            await supabase_db.add_token_usage(
-                user_id=current_user['id'],
-                prompt_tokens=tokens_used.get("prompt_tokens", 0),
-                completion_tokens=tokens_used.get("completion_tokens", 0),
-                total_tokens=tokens_used.get("total_tokens", 0)
-            )
-        except Exception as e:
-            print(f"Warning: Failed to track token usage: {e}")
+        similar_questions = await practice_pools.take(question, SIMILAR_QUESTION_COUNT)
 
         return {
             "question_id": question_id,
-            "similar_questions": similar_questions,
-            "tokens_used": tokens_used
+            "similar_questions": similar_questions
         }
 
     except Exception as e:
@@ -398,6 +765,52 @@ async def generate_similar_questions(
             detail=f"Failed to generate similar questions: {str(e)}"
         )
 
+@router.put("/status", response_model=BulkUpdateResponse)
+async def update_questions_status(
+    update: BulkQuestionUpdate,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """
+    Update status and/or explanation of many questions in one statement
+    Ownership is checked by the statement itself; ids that are missing or not
+    owned come back in not_found
+    """
+    question_ids = list(dict.fromkeys(update.question_ids))
+    if len(question_ids) > MAX_BULK_QUESTIONS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {MAX_BULK_QUESTIONS} questions per request"
+        )
+
+    update_data = {}
+    if update.status:
+        update_data['status'] = update.status
+    if update.explanation:
+        update_data['explanation'] = update.explanation
+        # User-written: keeps them out of explanation reuse
+        update_data['explanation_provenance'] = edited_provenance()
+    if not update_data:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Nothing to update: set status and/or explanation"
+        )
+
+    rows = await supabase_db.update_questions(
+        current_user['id'],
+        question_ids,
+        full_rows=update.return_questions,
+        **update_data
+    ) if question_ids else []
+
+    rows_by_id = {row['id']: row for row in rows}
+    updated = [question_id for question_id in question_ids if question_id in rows_by_id]
+    return BulkUpdateResponse(
+        updated=updated,
+        not_found=[question_id for question_id in question_ids if question_id not in rows_by_id],
+        questions=[QuestionResponse(**rows_by_id[question_id]) for question_id in updated]
+        if update.return_questions else None
+    )
+
 @router.put("/{question_id}/status", response_model=QuestionResponse)
 async def update_question_status(
     question_id: int,
@@ -419,6 +832,10 @@ async def update_question_status(
         update_data['status'] = update.status
     if update.explanation:
         update_data['explanation'] = update.explanation
+        # User-written: keeps it out of explanation reuse
+        metadata = dict(question.get('question_metadata') or {})
+        metadata['explanation'] = edited_provenance()
+        update_data['question_metadata'] = metadata
 
     # Update question
     updated_question = await supabase_db.update_question(question_id, **update_data)
@@ -430,7 +847,13 @@ async def get_question(
     question_id: int,
     current_user: Dict[str, Any] = Depends(get_current_user)
 ):
-    """Get a specific question by ID"""
+    """
+    Get a specific question by ID
+    In lazy explanation mode, the first open generates the explanation and
+    prefetches the next pending ones in the background. With
+    PRACTICE_POOL_WARM_ON_OPEN, an unresolved question's empty practice pool is
+    filled in the background, ready for /similar
+    """
     question = await supabase_db.get_question_by_id(question_id)
 
     if not question or question.get('user_id') != current_user['id']:
@@ -439,6 +862,16 @@ async def get_question(
             detail="Question not found"
         )
 
+    if is_pending(question):
+        try:
+            question = await lazy_explanations.ensure_explanation(question)
+        except Exception as e:
+            # Still pending; the next open tries again
+            print(f"Warning: Failed to generate explanation: {e}")
+    if lazy_explanations.enabled:
+        lazy_explanations.prefetch_after(question)
+    practice_pools.warm(question)
+
     return QuestionResponse(**question)
 
 @router.delete("/{question_id}")
@@ -446,32 +879,17 @@ async def delete_question(
     question_id: int,
     current_user: Dict[str, Any] = Depends(get_current_user)
 ):
-    """Delete a question and its associated image from Supabase Storage"""
-    question = await supabase_db.get_question_by_id(question_id)
+    """
+    Delete a question
+    Its embeddings and images are removed in the background by the purge worker
+    """
+    deleted = await supabase_db.delete_questions(current_user['id'], [question_id])
 
-    if not question or question.get('user_id') != current_user['id']:
+    if not deleted:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Question not found"
         )
 
-    # Delete from vector DB if exists
-    vector_id = question.get('vector_id')
-    if vector_id:
-        try:
-            await supabase_service.delete_question_embedding(vector_id)
-        except Exception as e:
-            print(f"Warning: Failed to delete embedding: {e}")
-
-    # Delete image from Supabase Storage if it's a Supabase URL
-    image_url = question.get('image_url')
-    if image_url and 'supabase' in image_url:
-        try:
-            await supabase_storage.delete_image(image_url)
-        except Exception as e:
-            print(f"Warning: Failed to delete image from Supabase Storage: {e}")
-
-    # Delete question
-    await supabase_db.delete_question(question_id)
-
+    purge_worker.notify()
     return {"message": "Question deleted successfully"}
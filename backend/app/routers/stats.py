@@ -1,18 +1,24 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request, Response
 from typing import List, Dict, Any
 
 from app.services.supabase_db_service import supabase_db
 from app.schemas import StudentStats, SubjectStats
 from app.routers.auth import get_current_user
+from app.services.user_version_service import user_versions
 
 router = APIRouter()
 
 @router.get("/", response_model=StudentStats)
 async def get_student_stats(
+    request: Request,
+    response: Response,
     grade: str = None,
     current_user: Dict[str, Any] = Depends(get_current_user)
 ):
     """Get overall statistics for the student with optional grade filter"""
+    not_modified = user_versions.check_not_modified(request, response, current_user['id'], "stats.overall")
+    if not_modified:
+        return not_modified
 
     # Get comprehensive user stats from Supabase (filtered by grade if provided)
     stats = await supabase_db.get_user_stats(current_user['id'], grade=grade)
@@ -30,10 +36,15 @@ async def get_student_stats(
 
 @router.get("/by-subject", response_model=List[SubjectStats])
 async def get_subject_stats(
+    request: Request,
+    response: Response,
     grade: str = None,
     current_user: Dict[str, Any] = Depends(get_current_user)
 ):
     """Get statistics broken down by subject with optional grade filter"""
+    not_modified = user_versions.check_not_modified(request, response, current_user['id'], "stats.by_subject")
+    if not_modified:
+        return not_modified
 
     # Get subject statistics from Supabase (filtered by grade if provided)
     subject_stats = await supabase_db.get_subject_stats(current_user['id'], grade=grade)
@@ -0,0 +1,192 @@
+"""
+Uploads Router
+Serves stored images under /uploads
+
+Files on local disk (the local backend, or the fallback when the bucket upload
+failed) are served directly; bucket objects are served from the storage cache.
+Content-addressed files never change, so they get a strong ETag (their sha256)
+and a year-long immutable Cache-Control. Single byte ranges are supported; the
+body is streamed from disk in chunks.
+
+PUT accepts direct uploads to signed URLs issued by the local store
+(POST /questions/upload-url), standing in for the bucket's signed uploads.
+"""
+
+import mimetypes
+import os
+from email.utils import formatdate
+from typing import Optional, Tuple
+
+import anyio
+from fastapi import APIRouter, HTTPException, Request, status
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+from app.config import settings
+from app.services.local_storage_service import local_storage
+from app.services.storage_backend import content_digest, safe_relative_path
+from app.services.storage_cache_service import CachedStorageBackend
+from app.services.supabase_storage_service import supabase_storage
+
+router = APIRouter()
+
+mimetypes.add_type("image/webp", ".webp")
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+MUTABLE_CACHE_CONTROL = "public, max-age=3600"
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single-range "bytes=" header against a file size
+
+    Returns:
+        (start, end) inclusive, or None if the range cannot be satisfied.
+        Raises ValueError for headers that are not a single byte range (which
+        are ignored: the full file is sent).
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        raise ValueError(header)
+    first, _, last = spec.strip().partition("-")
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length <= 0 or size == 0:
+            return None
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start > end or start >= size:
+        return None
+    return start, min(end, size - 1)
+
+
+class StoredFileResponse(Response):
+    """File response with strong validators and byte ranges"""
+
+    chunk_size = 256 * 1024
+
+    def __init__(self, full_path: str, stat_result: os.stat_result, etag: str,
+                 cache_control: str, byte_range: Optional[Tuple[int, int]] = None,
+                 send_body: bool = True):
+        self.full_path = full_path
+        self.send_body = send_body
+        size = stat_result.st_size
+        self.offset, end = byte_range if byte_range else (0, size - 1)
+        self.count = max(0, end - self.offset + 1)
+        self.status_code = status.HTTP_206_PARTIAL_CONTENT if byte_range else status.HTTP_200_OK
+        self.media_type = mimetypes.guess_type(full_path)[0] or "application/octet-stream"
+        self.background = None
+        self.init_headers({
+            "ETag": etag,
+            "Cache-Control": cache_control,
+            "Last-Modified": formatdate(stat_result.st_mtime, usegmt=True),
+            "Accept-Ranges": "bytes",
+            "Content-Length": str(self.count),
+        })
+        if byte_range:
+            self.headers["Content-Range"] = f"bytes {self.offset}-{end}/{size}"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if not self.send_body or self.count == 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        async with await anyio.open_file(self.full_path, mode="rb") as file:
+            await file.seek(self.offset)
+            remaining = self.count
+            while remaining > 0:
+                chunk = await file.read(min(self.chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            if remaining > 0:
+                # File shrank underneath us; end the body anyway
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+async def _find_file(path: str) -> Optional[str]:
+    """Local file serving an object path: local store first, then the bucket cache"""
+    full_path = local_storage.local_file(path)
+    if os.path.isfile(full_path):
+        return full_path
+    # Bucket objects are content-addressed: any other path is a 404 without a download
+    if isinstance(supabase_storage, CachedStorageBackend) and content_digest(path):
+        try:
+            return await supabase_storage.cached_file(path)
+        except FileNotFoundError:
+            return None
+    return None
+
+
+def _etag(path: str, stat_result: os.stat_result) -> Tuple[str, str]:
+    """Strong ETag and Cache-Control for a stored file"""
+    digest = content_digest(path)
+    if digest:
+        return f'"{digest}"', IMMUTABLE_CACHE_CONTROL
+    # Files stored before content addressing: identified by size and modification time
+    return f'"{stat_result.st_size:x}-{stat_result.st_mtime_ns:x}"', MUTABLE_CACHE_CONTROL
+
+
+@router.api_route("/{path:path}", methods=["GET", "HEAD"])
+async def serve_upload(path: str, request: Request):
+    """Serve a stored image (public, like the bucket's public URLs)"""
+    try:
+        path = safe_relative_path(path)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
+
+    full_path = await _find_file(path)
+    try:
+        stat_result = await anyio.to_thread.run_sync(os.stat, full_path) if full_path else None
+    except OSError:
+        stat_result = None
+    if stat_result is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
+
+    etag, cache_control = _etag(path, stat_result)
+
+    # Weak comparison for If-None-Match; If-Range below needs the exact strong tag
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        if "*" in candidates or etag in candidates:
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED,
+                            headers={"ETag": etag, "Cache-Control": cache_control})
+
+    byte_range = None
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (if_range is None or if_range.strip() == etag):
+        try:
+            byte_range = parse_range(range_header, stat_result.st_size)
+        except ValueError:
+            byte_range = None
+        else:
+            if byte_range is None:
+                return Response(status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+                                headers={"Content-Range": f"bytes */{stat_result.st_size}", "ETag": etag})
+
+    return StoredFileResponse(full_path, stat_result, etag, cache_control, byte_range,
+                              send_body=request.method != "HEAD")
+
+
+@router.put("/{path:path}")
+async def receive_upload(path: str, request: Request, expires: int, signature: str):
+    """Accept a direct upload to a signed URL from the local store"""
+    content_type = request.headers.get("content-type", "")
+    try:
+        path = safe_relative_path(path)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
+    if not local_storage.verify_upload_signature(path, content_type, expires, signature):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid or expired upload URL")
+
+    try:
+        await local_storage.receive_upload(path, request.stream(), settings.MAX_UPLOAD_SIZE)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return {"path": path}
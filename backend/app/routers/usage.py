@@ -1,14 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response, Query
 from typing import Dict, Any
 from datetime import datetime
 
 from app.services.supabase_db_service import supabase_db
 from app.routers.auth import get_current_user
+from app.services.user_version_service import user_versions
 
 router = APIRouter()
 
 @router.get("/tokens")
 async def get_token_usage(
+    request: Request,
+    response: Response,
     current_user: Dict[str, Any] = Depends(get_current_user)
 ):
     """
@@ -20,6 +23,10 @@ async def get_token_usage(
         - completion_tokens_used: Total completion/output tokens
         - last_token_update: Timestamp of last usage
     """
+    not_modified = user_versions.check_not_modified(request, response, current_user['id'], "usage.tokens")
+    if not_modified:
+        return not_modified
+
     try:
         usage_stats = await supabase_db.get_user_token_usage(current_user['id'])
 
@@ -40,6 +47,7 @@ async def get_token_usage(
 
 @router.get("/tokens/all")
 async def get_all_users_token_usage(
+    limit: int = Query(100, ge=1, le=1000),
     current_user: Dict[str, Any] = Depends(get_current_user)
 ):
     """
@@ -50,10 +58,10 @@ async def get_all_users_token_usage(
         - total_prompt_tokens: Total prompt/input tokens across all users
         - total_completion_tokens: Total completion/output tokens across all users
         - total_users: Number of users in the system
-        - users: List of individual user token usage (sorted by usage, highest first)
+        - users: Top `limit` users by token usage (highest first)
     """
     try:
-        all_usage = await supabase_db.get_all_users_token_usage()
+        all_usage = await supabase_db.get_all_users_token_usage(limit=limit)
 
         return {
             "total_tokens": all_usage.get('total_tokens', 0),
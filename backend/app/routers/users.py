@@ -3,12 +3,13 @@ Admin-only user management router
 Only users with is_admin=True can access these endpoints
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List, Dict, Any
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
+from typing import List, Dict, Any, Optional
 
 from app.services.supabase_db_service import supabase_db
-from app.schemas import AdminUserCreate, UserListResponse
+from app.schemas import AdminUserCreate, UserListResponse, UserSort
 from app.routers.auth import get_current_user
+from app.services.purge_service import purge_worker
 
 router = APIRouter()
 
@@ -28,13 +29,42 @@ async def get_admin_user(
 
 @router.get("/", response_model=List[UserListResponse])
 async def list_all_users(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    cursor: Optional[str] = None,
+    sort: UserSort = UserSort.CREATED_AT,
+    search: Optional[str] = Query(None, min_length=1, max_length=100),
     admin_user: Dict[str, Any] = Depends(get_admin_user)
 ):
     """
-    List all users in the system (admin only)
+    List users in the system (admin only)
+
+    Without paging parameters the whole list is returned, newest first.
+    With `limit`, `cursor`, `sort` or `search`, one page is returned, sorted
+    and filtered in the database; the X-Next-Cursor response header holds the
+    cursor for the next page (absent on the last page).
     """
-    users = await supabase_db.get_all_users()
-    return [UserListResponse(**user) for user in users]
+    if limit is None and cursor is None and search is None and sort == UserSort.CREATED_AT:
+        users = await supabase_db.get_all_users()
+        return [UserListResponse(**user) for user in users]
+
+    try:
+        page = await supabase_db.get_users_page(
+            limit=limit or 50,
+            cursor=cursor,
+            sort=sort.value,
+            search=search
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+    if page["next_cursor"]:
+        response.headers["X-Next-Cursor"] = page["next_cursor"]
+
+    return [UserListResponse(**user) for user in page["users"]]
 
 @router.post("/", response_model=UserListResponse)
 async def create_new_user(
@@ -89,8 +119,9 @@ async def delete_user(
             detail=f"User with ID {user_id} not found"
         )
 
-    # Delete the user
+    # Delete the user (their questions' embeddings and images are purged in the background)
     success = await supabase_db.delete_user(user_id)
+    purge_worker.notify()
 
     if not success:
         raise HTTPException(
@@ -1,6 +1,6 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, field_validator
 from datetime import datetime
-from typing import Optional, List
+from typing import Optional, List, Dict, Any
 from enum import Enum
 
 class QuestionStatus(str, Enum):
@@ -8,6 +8,10 @@ class QuestionStatus(str, Enum):
     REVIEWING = "reviewing"
     UNDERSTOOD = "understood"
 
+class UserSort(str, Enum):
+    CREATED_AT = "created_at"
+    TOKENS = "tokens"
+
 # User Schemas
 class UserBase(BaseModel):
     email: EmailStr
@@ -59,16 +63,32 @@ class QuestionUpdate(BaseModel):
     status: Optional[QuestionStatus] = None
     explanation: Optional[str] = None
 
+# Explanation provenance fields naming the (often another user's) source question;
+# kept in the database for auditing, never returned
+INTERNAL_PROVENANCE_FIELDS = ("from_question_id", "origin_question_id")
+
 class QuestionResponse(QuestionBase):
     id: int
     user_id: int
     image_url: Optional[str] = None
     image_snippet_url: Optional[str] = None
+    image_thumbnail_url: Optional[str] = None  # WebP, for lists
+    image_review_url: Optional[str] = None  # WebP, screen-sized; fall back to image_url when unset
     explanation: Optional[str] = None
     status: QuestionStatus
+    question_metadata: Optional[Dict[str, Any]] = None  # Includes explanation provenance
     created_at: datetime
     updated_at: datetime
 
+    @field_validator("question_metadata")
+    @classmethod
+    def hide_internal_provenance(cls, metadata: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        provenance = (metadata or {}).get("explanation")
+        if isinstance(provenance, dict) and any(field in provenance for field in INTERNAL_PROVENANCE_FIELDS):
+            public = {key: value for key, value in provenance.items() if key not in INTERNAL_PROVENANCE_FIELDS}
+            metadata = {**metadata, "explanation": public}
+        return metadata
+
     class Config:
         from_attributes = True
 
@@ -81,6 +101,56 @@ class UploadResponse(BaseModel):
     message: str
     questions_count: int
     upload_id: int
+    pages: int = 1
+
+class UploadStatusResponse(BaseModel):
+    id: int
+    filename: str
+    subject: Optional[str] = None
+    status: str
+    questions_extracted: int = 0
+    pages_total: int = 1
+    pages_analyzed: int = 0  # Pages whose analysis has finished
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    total_tokens: int = 0
+    error_message: Optional[str] = None
+    created_at: datetime
+
+class SignedUploadRequest(BaseModel):
+    filename: str
+    content_type: str
+    sha256: str  # Hex digest of the file, computed by the client
+    size: int
+
+class SignedUploadResponse(BaseModel):
+    path: str  # Pass to /questions/upload/finalize after uploading
+    already_stored: bool  # Same image already in storage: skip the upload, just finalize
+    upload_url: Optional[str] = None
+    method: Optional[str] = None
+    headers: Dict[str, str] = {}
+    expires_in: Optional[int] = None  # Seconds
+
+class FinalizeUploadRequest(BaseModel):
+    path: str
+    subject: str
+    grade: Optional[str] = None
+
+class BulkDeleteRequest(BaseModel):
+    question_ids: List[int]
+
+class BulkDeleteResponse(BaseModel):
+    deleted: List[int]
+    not_found: List[int]  # Missing or owned by another user
+
+class BulkQuestionUpdate(QuestionUpdate):
+    question_ids: List[int]
+    return_questions: bool = False  # Include the updated rows, not just their ids
+
+class BulkUpdateResponse(BaseModel):
+    updated: List[int]
+    not_found: List[int]  # Missing or owned by another user
+    questions: Optional[List[QuestionResponse]] = None
 
 class QuestionSearchRequest(BaseModel):
     query: str
@@ -117,6 +187,7 @@ class UserListResponse(BaseModel):
     grade: Optional[str] = None
     is_admin: bool
     created_at: datetime
+    total_tokens_used: Optional[int] = None
 
     class Config:
         from_attributes = True
@@ -1,8 +1,121 @@
 from openai import AzureOpenAI
 from app.config import settings
+from app.services.embedding_codec import decode_embedding, reduce_dimensions
+from app.services.embedding_model_service import embedding_models
+from app.services.worksheet_service import merge_tile_questions, render_tiles
+import asyncio
 import base64
-from typing import List, Dict, Any, Optional
+from collections import deque
+from typing import Callable, List, Dict, Any, Optional, Tuple
 import json
+import re
+import time
+
+# Operation -> setting naming its deployment (empty = AZURE_OPENAI_DEPLOYMENT_NAME)
+ROUTE_SETTINGS = {
+    "analyze": "AZURE_OPENAI_ANALYSIS_DEPLOYMENT",
+    "explain": "AZURE_OPENAI_EXPLANATION_DEPLOYMENT",
+    "practice": "AZURE_OPENAI_PRACTICE_DEPLOYMENT",
+}
+
+# Explanation saved by explain_question when generation fails
+EXPLANATION_UNAVAILABLE = "Unable to generate explanation at this time."
+
+# Sections every explanation must have (see the prompt in explain_question)
+EXPLANATION_SECTIONS = ("## Question", "## Step-by-step solution", "## Final answer")
+
+
+def _strip_code_fence(text: str) -> str:
+    """Remove markdown code blocks if present"""
+    if text.startswith("```json"):
+        text = text[7:]
+    if text.startswith("```"):
+        text = text[3:]
+    if text.endswith("```"):
+        text = text[:-3]
+    return text.strip()
+
+
+def _parse_analysis(text: str) -> Optional[Dict[str, Any]]:
+    """Question paper analysis from the model output, or None if it is not the requested JSON"""
+    try:
+        result = json.loads(_strip_code_fence(text))
+    except json.JSONDecodeError:
+        return None
+    if not isinstance(result, dict) or not isinstance(result.get("wrong_questions"), list):
+        return None
+    return result
+
+
+def _parse_explanation(text: str) -> Optional[str]:
+    """The explanation, or None if it is missing a required section"""
+    return text if all(section in text for section in EXPLANATION_SECTIONS) else None
+
+
+def _parse_practice(text: str) -> Optional[List[str]]:
+    """Practice questions from a JSON array of strings, or None if the output is not one"""
+    try:
+        parsed = json.loads(_strip_code_fence(text))
+    except json.JSONDecodeError:
+        return None
+    if not isinstance(parsed, list):
+        return None
+    questions = [q.strip() for q in parsed if isinstance(q, str) and q.strip()]
+    return questions or None
+
+
+class RouteMetrics:
+    """Calls, failures, latency and tokens per operation and deployment"""
+
+    LATENCY_WINDOW = 256  # Recent calls kept per route for the p95
+
+    def __init__(self):
+        self.routes: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self.escalations: Dict[str, int] = {}
+
+    def record(
+        self,
+        operation: str,
+        deployment: str,
+        seconds: float,
+        tokens_used: Optional[Dict[str, int]] = None,
+        error: bool = False,
+        invalid: bool = False
+    ) -> None:
+        route = self.routes.setdefault((operation, deployment), {
+            "calls": 0, "errors": 0, "invalid": 0, "latency_total": 0.0, "latency_max": 0.0,
+            "recent": deque(maxlen=self.LATENCY_WINDOW), "prompt_tokens": 0, "completion_tokens": 0
+        })
+        route["calls"] += 1
+        route["errors"] += int(error)
+        route["invalid"] += int(invalid)
+        route["latency_total"] += seconds
+        route["latency_max"] = max(route["latency_max"], seconds)
+        route["recent"].append(seconds)
+        if tokens_used:
+            route["prompt_tokens"] += tokens_used.get("prompt_tokens", 0)
+            route["completion_tokens"] += tokens_used.get("completion_tokens", 0)
+
+    def escalated(self, operation: str) -> None:
+        self.escalations[operation] = self.escalations.get(operation, 0) + 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats: Dict[str, Any] = {}
+        for (operation, deployment), route in sorted(self.routes.items()):
+            recent = sorted(route["recent"])
+            entry = stats.setdefault(operation, {"escalations": self.escalations.get(operation, 0), "deployments": {}})
+            entry["deployments"][deployment] = {
+                "calls": route["calls"],
+                "errors": route["errors"],
+                "invalid": route["invalid"],
+                "avg_ms": round(1000 * route["latency_total"] / route["calls"], 1),
+                "p95_ms": round(1000 * recent[int(0.95 * (len(recent) - 1))], 1),
+                "max_ms": round(1000 * route["latency_max"], 1),
+                "prompt_tokens": route["prompt_tokens"],
+                "completion_tokens": route["completion_tokens"]
+            }
+        return stats
+
 
 class AzureAIService:
     def __init__(self):
@@ -12,6 +125,87 @@ class AzureAIService:
             azure_endpoint=settings.AZURE_OPENAI_ENDPOINT
         )
         self.deployment_name = settings.AZURE_OPENAI_DEPLOYMENT_NAME
+        self.route_metrics = RouteMetrics()
+        # Vision calls in flight, across pages, tiles and submissions (Azure rate limits)
+        self.vision_calls = asyncio.Semaphore(settings.VISION_CALL_CONCURRENCY)
+
+    def deployment_for(self, operation: str) -> str:
+        """Deployment an operation (a ROUTE_SETTINGS key) is sent to first"""
+        return getattr(settings, ROUTE_SETTINGS[operation]) or self.deployment_name
+
+    async def _complete(
+        self,
+        operation: str,
+        parse: Callable[[str], Any],
+        **request: Any
+    ) -> Tuple[Any, str, Dict[str, int]]:
+        """
+        Chat completion on an operation's deployment, escalated to the default
+        deployment (AZURE_OPENAI_DEPLOYMENT_NAME) when the call fails or its
+        output is truncated or fails validation
+
+        Args:
+            operation: Route name (a ROUTE_SETTINGS key)
+            parse: Turns the output text into the result; returns None for invalid output
+            **request: chat.completions.create arguments other than the model
+
+        Returns:
+            Tuple of (parsed result, or None if no deployment gave valid output,
+            last output text, token_usage dict summed over the attempts)
+
+        Raises:
+            Exception: if the call to the last deployment fails
+        """
+        deployments = [self.deployment_for(operation)]
+        if deployments[0] != self.deployment_name:
+            deployments.append(self.deployment_name)
+
+        tokens_used = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+        text = ""
+        for attempt, deployment in enumerate(deployments):
+            last = attempt == len(deployments) - 1
+            started = time.perf_counter()
+            try:
+                response = await asyncio.to_thread(
+                    self.client.chat.completions.create,
+                    model=deployment,
+                    **request
+                )
+            except Exception as e:
+                self.route_metrics.record(operation, deployment, time.perf_counter() - started, error=True)
+                if last:
+                    raise
+                print(f"⚠️  {operation} on {deployment} failed, escalating to {self.deployment_name}: {e}")
+                self.route_metrics.escalated(operation)
+                continue
+
+            usage = {
+                "prompt_tokens": response.usage.prompt_tokens,
+                "completion_tokens": response.usage.completion_tokens,
+                "total_tokens": response.usage.total_tokens
+            }
+            for key in tokens_used:
+                tokens_used[key] += usage[key]
+
+            choice = response.choices[0]
+            text = (choice.message.content or "").strip()
+            # Output cut off at max_tokens is incomplete even if it parses
+            result = parse(text) if getattr(choice, "finish_reason", None) != "length" else None
+            self.route_metrics.record(
+                operation, deployment, time.perf_counter() - started, usage, invalid=result is None
+            )
+            if result is not None or last:
+                return result, text, tokens_used
+            print(f"⚠️  {operation} output from {deployment} failed validation, escalating to {self.deployment_name}")
+            self.route_metrics.escalated(operation)
+
+    def get_route_stats(self) -> Dict[str, Any]:
+        """Per operation: its deployment, escalations, and per deployment calls, latency and tokens"""
+        stats = self.route_metrics.get_stats()
+        return {
+            operation: {"deployment": self.deployment_for(operation), **stats.get(operation, {"escalations": 0, "deployments": {}})}
+            for operation in ROUTE_SETTINGS
+        }
 
     def encode_image(self, image_path: str) -> str:
         """Encode image to base64"""
@@ -21,21 +215,107 @@ class AzureAIService:
     async def analyze_question_paper(
         self,
         image_path: str,
-        subject: str
+        subject: str,
+        page_number: int = 1,
+        page_count: int = 1
     ) -> Dict[str, Any]:
         """
         Analyze question paper image to extract wrongly answered questions
 
+        Args:
+            image_path: Page image file
+            subject: Subject of the paper
+            page_number: Position of the page in a multi-page submission (1-based)
+            page_count: Pages in the submission; with more than one, questions
+                cut off by a page break are flagged (continues_on_next_page,
+                continued_from_previous_page) so the pages can be joined
+
         Returns:
             Dict containing:
-            - wrong_questions: List of wrongly answered questions
+            - wrong_questions: List of wrongly answered questions, each with an
+              optional bounding_box {x, y, width, height} in fractions of the page
             - total_questions: Total number of questions detected
             - analysis: Additional analysis from AI
+            - tiles: Number of tiles, when a dense page was analyzed in tiles
+              (pages over ANALYSIS_TILE_MIN_MEGAPIXELS; bounding boxes are
+              still fractions of the whole page)
             - tokens_used: Token usage info (prompt_tokens, completion_tokens, total_tokens)
         """
+        with open(image_path, "rb") as image_file:
+            file_data = image_file.read()
+
+        # Dense pages are analyzed in overlapping tiles, so small handwriting stays legible
+        try:
+            tiled = await asyncio.to_thread(render_tiles, file_data)
+        except Exception as e:
+            print(f"⚠️  Could not split page into tiles, analyzing it whole: {e}")
+            tiled = None
+        if tiled is None:
+            return await self._analyze_image(file_data, subject, page_number, page_count)
+
+        (width, height), tiles = tiled
+        print(f"🧩 Analyzing dense page ({width}x{height}) in {len(tiles)} tiles")
+        tile_results = await asyncio.gather(*(
+            self._analyze_image(tile_data, subject, page_number, page_count, tile_count=len(tiles))
+            for _, tile_data in tiles
+        ))
+
+        tokens_used = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+        for tile_result in tile_results:
+            for key in tokens_used:
+                tokens_used[key] += tile_result["tokens_used"].get(key, 0)
+
+        wrong_questions = merge_tile_questions(
+            [(box, tile_result.get("wrong_questions", [])) for (box, _), tile_result in zip(tiles, tile_results)],
+            width,
+            height
+        )
+        return {
+            "wrong_questions": wrong_questions,
+            "total_wrong_questions": len(wrong_questions),
+            "analysis_notes": "\n".join(
+                str(tile_result["analysis_notes"]) for tile_result in tile_results if tile_result.get("analysis_notes")
+            ),
+            "tiles": len(tiles),
+            "tokens_used": tokens_used
+        }
+
+    async def _analyze_image(
+        self,
+        image_data: bytes,
+        subject: str,
+        page_number: int = 1,
+        page_count: int = 1,
+        tile_count: int = 0
+    ) -> Dict[str, Any]:
+        """One vision call on a page image (or, with tile_count, on one tile of a page)"""
         try:
             # Encode image
-            base64_image = self.encode_image(image_path)
+            base64_image = base64.b64encode(image_data).decode('utf-8')
+
+            tile_instructions = ""
+            if tile_count:
+                tile_instructions = f"""
+TILE: This image is one of {tile_count} overlapping tiles cut from a larger, dense page.
+Report every wrong question visible in this tile, including questions cut off at the
+tile's edges (give the part you can see). Bounding boxes are relative to this tile.
+"""
+
+            page_instructions = ""
+            page_fields = ""
+            if page_count > 1:
+                page_instructions = f"""
+PAGES: This image is page {page_number} of {page_count} of one worksheet. A question may
+start at the bottom of one page and continue at the top of the next. For the last question
+on this page, set "continues_on_next_page" to true if it is cut off by the page break. For
+a question (or the working of one) at the top of this page that began on the previous
+page, set "continued_from_previous_page" to true and give only the part on this page.
+Include such a cut-off question unless this page shows it marked correct: its mark may be
+on the other page.
+"""
+                page_fields = """,
+            "continues_on_next_page": false,
+            "continued_from_previous_page": false"""
 
             # Create prompt for GPT-4o Vision
             prompt = f"""You are an expert educational AI assistant analyzing exam papers and worksheets.
@@ -50,7 +330,10 @@ INSTRUCTIONS:
    - Question number (if visible)
    - Any visible context or sub-parts
    - A brief explanation of what concept/topic it covers
-
+   - The bounding box of the question on the page (question text, working and
+     marks), as fractions of the image width and height: x and y of the
+     top-left corner, then width and height, each between 0 and 1
+{tile_instructions}{page_instructions}
 4. Return your analysis as a JSON object with this EXACT structure:
 {{
     "wrong_questions": [
@@ -58,7 +341,8 @@ INSTRUCTIONS:
             "question_number": "1a" or null if not visible,
             "question_text": "Complete question text here",
             "topic": "Brief topic/concept covered",
-            "explanation": "Brief explanation of what this question tests"
+            "explanation": "Brief explanation of what this question tests",
+            "bounding_box": {{"x": 0.05, "y": 0.12, "width": 0.9, "height": 0.15}} or null if unsure{page_fields}
         }}
     ],
     "total_questions_detected": <number>,
@@ -74,58 +358,41 @@ IMPORTANT:
 
 Return ONLY valid JSON, no additional text."""
 
-            # Call Azure OpenAI GPT-4o Vision
-            response = self.client.chat.completions.create(
-                model=self.deployment_name,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "text",
-                                "text": prompt
-                            },
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:image/jpeg;base64,{base64_image}"
+            # Call Azure OpenAI GPT-4o Vision (in a worker thread, so the pages
+            # of a multi-page submission are analyzed concurrently), counted
+            # against the process-wide limit shared by pages and tiles
+            async with self.vision_calls:
+                result, result_text, tokens_used = await self._complete(
+                    "analyze",
+                    _parse_analysis,
+                    messages=[
+                        {
+                            "role": "user",
+                            "content": [
+                                {
+                                    "type": "text",
+                                    "text": prompt
+                                },
+                                {
+                                    "type": "image_url",
+                                    "image_url": {
+                                        "url": f"data:image/jpeg;base64,{base64_image}"
+                                    }
                                 }
-                            }
-                        ]
-                    }
-                ],
-                max_tokens=2000,
-                temperature=0.3
-            )
-
-            # Parse response
-            result_text = response.choices[0].message.content.strip()
-
-            # Extract token usage
-            tokens_used = {
-                "prompt_tokens": response.usage.prompt_tokens,
-                "completion_tokens": response.usage.completion_tokens,
-                "total_tokens": response.usage.total_tokens
-            }
-
-            # Try to parse JSON from response
-            try:
-                # Remove markdown code blocks if present
-                if result_text.startswith("```json"):
-                    result_text = result_text[7:]
-                if result_text.startswith("```"):
-                    result_text = result_text[3:]
-                if result_text.endswith("```"):
-                    result_text = result_text[:-3]
-
-                result = json.loads(result_text.strip())
-            except json.JSONDecodeError:
+                            ]
+                        }
+                    ],
+                    max_tokens=2000,
+                    temperature=0.3
+                )
+
+            if result is None:
                 # If JSON parsing fails, create a structured response
                 result = {
                     "wrong_questions": [],
                     "total_questions_detected": 0,
                     "total_wrong_questions": 0,
-                    "analysis_notes": result_text
+                    "analysis_notes": _strip_code_fence(result_text)
                 }
 
             # Add token usage to result
@@ -137,31 +404,80 @@ Return ONLY valid JSON, no additional text."""
             print(f"Error analyzing question paper: {e}")
             raise Exception(f"Failed to analyze image: {str(e)}")
 
-    async def generate_embedding(self, text: str) -> tuple[List[float], Dict[str, int]]:
+    async def generate_embedding(
+        self,
+        text: str,
+        model: Optional[Dict[str, Any]] = None
+    ) -> tuple[List[float], Dict[str, int]]:
         """
         Generate embedding vector for text using Azure OpenAI
 
+        On failure returns a zero vector (callers must not store it; the
+        embedding backfill job repairs questions left without a vector).
+
+        Args:
+            text: Text to embed
+            model: {"deployment", "dimensions"} (default: the active embedding model)
+
         Returns:
             Tuple of (embedding vector, token_usage dict)
         """
+        model = model or await embedding_models.get_active()
         try:
-            response = self.client.embeddings.create(
-                model="text-embedding-ada-002",  # or your deployed embedding model
-                input=text
-            )
-
-            tokens_used = {
-                "prompt_tokens": response.usage.prompt_tokens,
-                "completion_tokens": 0,  # Embeddings don't have completion tokens
-                "total_tokens": response.usage.total_tokens
-            }
-
-            return response.data[0].embedding, tokens_used
+            embeddings, tokens_used = await self.generate_embeddings([text], model)
+            return embeddings[0], tokens_used
 
         except Exception as e:
             print(f"Error generating embedding: {e}")
             # Return a dummy embedding if fails
-            return [0.0] * 1536, {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+            return [0.0] * model["dimensions"], {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+
+    async def generate_embeddings(
+        self,
+        texts: List[str],
+        model: Optional[Dict[str, Any]] = None
+    ) -> tuple[List[List[float]], Dict[str, int]]:
+        """
+        Generate embeddings for several texts in one request; raises on failure
+
+        Vectors are fetched base64-encoded (float32, ~4x smaller than JSON) and
+        reduced to the model's dimensions. The blocking client call runs in a
+        worker thread.
+
+        Args:
+            texts: Texts to embed
+            model: {"deployment", "dimensions"} (default: the active embedding model)
+
+        Returns:
+            Tuple of (embedding vectors in input order, token_usage dict)
+        """
+        model = model or await embedding_models.get_active()
+        dimensions = model["dimensions"]
+
+        options = {}
+        if dimensions != 1536:
+            # Only text-embedding-3 deployments accept a dimensions parameter
+            options["extra_body"] = {"dimensions": dimensions}
+
+        response = await asyncio.to_thread(
+            self.client.embeddings.create,
+            model=model["deployment"],
+            input=texts,
+            encoding_format="base64",
+            **options
+        )
+
+        tokens_used = {
+            "prompt_tokens": response.usage.prompt_tokens,
+            "completion_tokens": 0,  # Embeddings don't have completion tokens
+            "total_tokens": response.usage.total_tokens
+        }
+
+        embeddings = [
+            reduce_dimensions(decode_embedding(item.embedding), dimensions).tolist()
+            for item in sorted(response.data, key=lambda item: item.index)
+        ]
+        return embeddings, tokens_used
 
     async def explain_question(
         self,
@@ -172,13 +488,37 @@ Return ONLY valid JSON, no additional text."""
         """
         Generate an explanation/solution for a question
 
+        On failure returns EXPLANATION_UNAVAILABLE with zero token usage
+        (use generate_explanation to handle failures instead).
+
         Returns:
             Tuple of (explanation text, token_usage dict)
         """
         try:
-            grade_context = f" for {grade} level" if grade else ""
+            return await self.generate_explanation(question_text, subject, grade)
 
-            prompt = f"""Question: {question_text}
+        except Exception as e:
+            print(f"Error generating explanation: {e}")
+            return EXPLANATION_UNAVAILABLE, {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+
+    async def generate_explanation(
+        self,
+        question_text: str,
+        subject: str,
+        grade: Optional[str] = None
+    ) -> tuple[str, Dict[str, int]]:
+        """
+        Generate an explanation/solution for a question; raises on failure
+
+        Returns:
+            Tuple of (explanation text, token_usage dict)
+
+        Raises:
+            Exception: if the completion fails or returns no text
+        """
+        grade_context = f" for {grade} level" if grade else ""
+
+        prompt = f"""Question: {question_text}
 
 Subject: {subject}{grade_context}
 
@@ -214,120 +554,93 @@ STRICT RULES:
 - NEVER use parentheses () for math, ALWAYS use $...$
 - Show mathematical working clearly"""
 
-            response = self.client.chat.completions.create(
-                model=self.deployment_name,
-                messages=[
-                    {"role": "system", "content": "You are a tutor. Output ONLY structured markdown with headers, bullet points, and numbered lists. NEVER write paragraphs. Use $...$ for ALL mathematical expressions. Be concise."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=600,
-                temperature=0.2
-            )
-
-            tokens_used = {
-                "prompt_tokens": response.usage.prompt_tokens,
-                "completion_tokens": response.usage.completion_tokens,
-                "total_tokens": response.usage.total_tokens
-            }
+        explanation, text, tokens_used = await self._complete(
+            "explain",
+            _parse_explanation,
+            messages=[
+                {"role": "system", "content": "You are a tutor. Output ONLY structured markdown with headers, bullet points, and numbered lists. NEVER write paragraphs. Use $...$ for ALL mathematical expressions. Be concise."},
+                {"role": "user", "content": prompt}
+            ],
+            max_tokens=600,
+            temperature=0.2
+        )
 
-            return response.choices[0].message.content.strip(), tokens_used
+        if not text:
+            raise Exception("Empty explanation")
 
-        except Exception as e:
-            print(f"Error generating explanation: {e}")
-            return "Unable to generate explanation at this time.", {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+        # Malformed output from the default deployment is still better than none
+        return explanation or text, tokens_used
 
     async def generate_similar_questions(
         self,
         question_text: str,
         subject: str,
-        grade: Optional[str] = None
+        grade: Optional[str] = None,
+        count: int = 3,
+        exclude: Optional[List[str]] = None
     ) -> tuple[List[str], Dict[str, int]]:
         """
-        Generate 3 similar practice questions based on the original question
+        Generate similar practice questions based on the original question
+
+        Args:
+            question_text: The original (wrong) question
+            subject: Subject of the question
+            grade: Grade level, if known
+            count: Number of practice questions to generate
+            exclude: Practice questions already generated, not to be repeated
 
         Returns:
-            Tuple of (list of 3 similar questions, token_usage dict)
+            Tuple of (list of up to count similar questions, token_usage dict);
+            questions the response could not be parsed into are left out
+
+        Raises:
+            Exception: if the completion fails
         """
         try:
             grade_context = f" for {grade} level" if grade else ""
+            exclude_context = ""
+            if exclude:
+                listed = "\n".join(f"- {text}" for text in exclude)
+                exclude_context = f"""
+These practice questions already exist; do NOT repeat them or make near-copies:
+{listed}
+"""
 
             prompt = f"""Based on this {subject} question{grade_context}:
 
 "{question_text}"
 
-Generate 3 SIMILAR practice questions that test the SAME concepts and skills but with DIFFERENT numbers, scenarios, or contexts.
-
+Generate {count} SIMILAR practice questions that test the SAME concepts and skills but with DIFFERENT numbers, scenarios, or contexts.
+{exclude_context}
 REQUIREMENTS:
 1. Each question should be at the same difficulty level
 2. Each question should test the same underlying concept/skill
 3. Use different numbers, names, scenarios, or contexts
 4. Questions should be clearly distinct from each other
 5. Keep each question concise and clear
-6. Number the questions as 1), 2), 3)
 
-Output ONLY the 3 numbered questions, nothing else."""
+Return ONLY a JSON array of {count} strings, one per question, no additional text."""
 
-            response = self.client.chat.completions.create(
-                model=self.deployment_name,
+            questions, result_text, tokens_used = await self._complete(
+                "practice",
+                _parse_practice,
                 messages=[
                     {"role": "system", "content": "You are an expert educational question generator. Create practice questions that help students master concepts through varied practice."},
                     {"role": "user", "content": prompt}
                 ],
-                max_tokens=500,
+                max_tokens=150 * count + 100,
                 temperature=0.7  # Higher temperature for more variety
             )
 
-            tokens_used = {
-                "prompt_tokens": response.usage.prompt_tokens,
-                "completion_tokens": response.usage.completion_tokens,
-                "total_tokens": response.usage.total_tokens
-            }
-
-            # Parse the response to extract the 3 questions
-            result_text = response.choices[0].message.content.strip()
-
-            # Split by numbered patterns (1), 2), 3))
-            questions = []
-            lines = result_text.split('\n')
-            current_question = []
-
-            for line in lines:
-                line = line.strip()
-                # Check if line starts with a number pattern
-                if line.startswith(('1)', '2)', '3)')):
-                    if current_question:
-                        # Save previous question
-                        questions.append(' '.join(current_question).strip())
-                        current_question = []
-                    # Remove the number prefix and add the line
-                    current_question.append(line[2:].strip())
-                elif current_question:
-                    # Continue current question
-                    current_question.append(line)
-
-            # Add the last question
-            if current_question:
-                questions.append(' '.join(current_question).strip())
-
-            # Ensure we have exactly 3 questions
-            if len(questions) < 3:
-                # If parsing failed, try simple split
-                parts = result_text.split('\n\n')
-                questions = [p.strip() for p in parts if p.strip()][:3]
-
-            # Pad with placeholder if needed
-            while len(questions) < 3:
-                questions.append("Unable to generate question. Please try again.")
-
-            return questions[:3], tokens_used
+            if questions is None:
+                # Fall back to one question per line with text, without list numbering
+                lines = [re.sub(r"^\s*(?:[-*]|\d+[.)])\s*", "", line) for line in _strip_code_fence(result_text).split("\n")]
+                questions = [q.strip() for q in lines if re.search(r"\w", q)]
+            return questions[:count], tokens_used
 
         except Exception as e:
             print(f"Error generating similar questions: {e}")
-            return [
-                "Unable to generate similar question 1.",
-                "Unable to generate similar question 2.",
-                "Unable to generate similar question 3."
-            ], {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+            raise Exception(f"Failed to generate similar questions: {str(e)}")
 
 # Create a singleton instance
 azure_ai_service = AzureAIService()
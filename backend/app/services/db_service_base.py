@@ -0,0 +1,260 @@
+"""
+Database Service Base
+Backend-agnostic pieces shared by every database backend:
+single-flight read coalescing, per-user version bumps, and
+operations composed from the backend's primitive methods
+"""
+
+import asyncio
+import base64
+import copy
+import json
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Optional, List, Dict, Any, Callable, Awaitable
+
+from app.services.user_version_service import user_versions
+
+# Admin user list sort keys -> column (always descending, ties broken by id)
+USER_SORT_COLUMNS = {
+    "created_at": "created_at",
+    "tokens": "total_tokens_used"
+}
+
+# Columns returned by the paginated admin user list
+USER_LIST_COLUMNS = "id, email, name, grade, is_admin, created_at, total_tokens_used"
+
+
+def encode_cursor(sort_value: Any, row_id: int) -> str:
+    """Encode the last row's (sort value, id) as an opaque keyset cursor"""
+    raw = json.dumps([sort_value, row_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """Decode a cursor from encode_cursor; raises ValueError if malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        sort_value, row_id = json.loads(raw)
+        return sort_value, int(row_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def user_sort_column(sort: str) -> str:
+    """Map a sort key to its column; raises ValueError for unknown keys"""
+    if sort not in USER_SORT_COLUMNS:
+        raise ValueError(f"Unknown sort: {sort}")
+    return USER_SORT_COLUMNS[sort]
+
+
+def page_result(rows: List[Dict[str, Any]], limit: int, sort_column: str) -> Dict[str, Any]:
+    """Trim a limit+1 fetch to one page and build the next cursor"""
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = None
+    if has_more and rows:
+        last = rows[-1]
+        next_cursor = encode_cursor(last.get(sort_column), last["id"])
+    return {"users": rows, "next_cursor": next_cursor}
+
+
+class DBServiceBase:
+    """Shared behaviour for database backends (Supabase, asyncpg, ...)"""
+
+    def __init__(self):
+        # Single-flight state: identical concurrent reads share one in-flight query
+        self._inflight: Dict[tuple, Dict[str, Any]] = {}
+        self.singleflight_stats = {"calls": 0, "executed": 0, "coalesced": 0}
+
+    async def _singleflight(self, key: tuple, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run a read query once for all concurrent callers with the same key
+
+        User-scoped keys include the user's change counter, and lookups whose owner
+        is not known before the query (by question id, email, ...) the count of all
+        writes, so a read issued after a write never joins a flight that started before it.
+
+        Args:
+            key: Identifies the read (operation name plus arguments)
+            fetch: Zero-argument coroutine factory that performs the read
+
+        Returns:
+            The query result; callers that shared a flight each get their own copy
+        """
+        self.singleflight_stats["calls"] += 1
+
+        entry = self._inflight.get(key)
+        if entry is None:
+            self.singleflight_stats["executed"] += 1
+            task = asyncio.ensure_future(fetch())
+            entry = {"task": task, "waiters": 1}
+            self._inflight[key] = entry
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.singleflight_stats["coalesced"] += 1
+            entry["waiters"] += 1
+
+        # Shield so one caller's cancellation doesn't cancel the shared query
+        result = await asyncio.shield(entry["task"])
+        return copy.deepcopy(result) if entry["waiters"] > 1 else result
+
+    def get_singleflight_stats(self) -> Dict[str, Any]:
+        """Get single-flight counters (calls, executed queries, coalesced calls)"""
+        stats = dict(self.singleflight_stats)
+        stats["inflight"] = len(self._inflight)
+        stats["coalesced_ratio"] = (stats["coalesced"] / stats["calls"]) if stats["calls"] else 0
+        return stats
+
+    @staticmethod
+    def _order_by_ids(rows: List[Dict[str, Any]], ids: List[int]) -> List[Dict[str, Any]]:
+        """Return rows in the order of ids, skipping ids with no row"""
+        by_id = {row["id"]: row for row in rows}
+        return [by_id[row_id] for row_id in ids if row_id in by_id]
+
+    @staticmethod
+    def _split_pool_counts(rows: List[Dict[str, Any]]) -> tuple:
+        """Split served practice rows carrying pool_size / pool_unseen into (rows, {"size", "unseen"})"""
+        if not rows:
+            return [], {"size": 0, "unseen": 0}  # Nothing served: the pool is empty
+        pool = {"size": rows[0]["pool_size"], "unseen": rows[0]["pool_unseen"]}
+        served = [
+            {key: value for key, value in row.items() if key not in ("pool_size", "pool_unseen")}
+            for row in rows
+        ]
+        return sorted(served, key=lambda row: row["id"]), pool
+
+    def _bump_owners(self, rows: Optional[List[Dict[str, Any]]]) -> None:
+        """Bump the change counter of every user owning one of the written rows"""
+        for user_id in {row.get("user_id") for row in rows or []}:
+            user_versions.bump(user_id)
+
+    @asynccontextmanager
+    async def transaction(self):
+        """
+        Group several operations into one transaction
+
+        Backends without real transactions (PostgREST) run the block as-is.
+        """
+        yield
+
+    async def close(self) -> None:
+        """Release backend resources (connection pools, clients)"""
+        pass
+
+    # ==================== USER OPERATIONS ====================
+
+    async def update_user_grade(self, user_id: int, grade: str) -> Dict[str, Any]:
+        """Update user's grade"""
+        return await self.update_user(user_id, grade=grade)
+
+    async def add_token_usage(self, user_id: int, prompt_tokens: int,
+                             completion_tokens: int, total_tokens: int) -> Dict[str, Any]:
+        """
+        Add token usage to user's total
+
+        Args:
+            user_id: User ID
+            prompt_tokens: Prompt/input tokens used
+            completion_tokens: Completion/output tokens used
+            total_tokens: Total tokens used
+        """
+        # Get current token counts
+        user = await self.get_user_by_id(user_id)
+        if not user:
+            raise ValueError(f"User {user_id} not found")
+
+        current_total = user.get('total_tokens_used', 0) or 0
+        current_prompt = user.get('prompt_tokens_used', 0) or 0
+        current_completion = user.get('completion_tokens_used', 0) or 0
+
+        # Update with new usage
+        update_data = {
+            'total_tokens_used': current_total + total_tokens,
+            'prompt_tokens_used': current_prompt + prompt_tokens,
+            'completion_tokens_used': current_completion + completion_tokens,
+            'last_token_update': datetime.utcnow().isoformat()
+        }
+
+        return await self.update_user(user_id, **update_data)
+
+    async def get_user_token_usage(self, user_id: int) -> Dict[str, Any]:
+        """
+        Get user's token usage statistics
+
+        Returns:
+            Dict with total_tokens_used, prompt_tokens_used, completion_tokens_used, last_token_update
+        """
+        user = await self.get_user_by_id(user_id)
+        if not user:
+            return {
+                'total_tokens_used': 0,
+                'prompt_tokens_used': 0,
+                'completion_tokens_used': 0,
+                'last_token_update': None
+            }
+
+        return {
+            'total_tokens_used': user.get('total_tokens_used', 0) or 0,
+            'prompt_tokens_used': user.get('prompt_tokens_used', 0) or 0,
+            'completion_tokens_used': user.get('completion_tokens_used', 0) or 0,
+            'last_token_update': user.get('last_token_update')
+        }
+
+    # ==================== QUESTION OPERATIONS ====================
+
+    async def update_question_status(self, question_id: int, status: str) -> Dict[str, Any]:
+        """Update question status"""
+        return await self.update_question(question_id, status=status)
+
+    # ==================== STATISTICS OPERATIONS ====================
+
+    async def get_user_stats(self, user_id: int, grade: Optional[str] = None) -> Dict[str, Any]:
+        """Get comprehensive user statistics with optional grade filter"""
+        # Get all questions (filtered by grade if provided)
+        all_questions = await self.get_questions_by_user(user_id, grade=grade)
+
+        # Count by status
+        pending = len([q for q in all_questions if q['status'] == 'pending'])
+        reviewing = len([q for q in all_questions if q['status'] == 'reviewing'])
+        understood = len([q for q in all_questions if q['status'] == 'understood'])
+
+        # Count by subject
+        subjects = {}
+        for q in all_questions:
+            subject = q['subject']
+            if subject not in subjects:
+                subjects[subject] = {'total': 0, 'understood': 0}
+            subjects[subject]['total'] += 1
+            if q['status'] == 'understood':
+                subjects[subject]['understood'] += 1
+
+        return {
+            "total_questions": len(all_questions),
+            "pending": pending,
+            "reviewing": reviewing,
+            "understood": understood,
+            "completion_rate": (understood / len(all_questions) * 100) if all_questions else 0,
+            "subjects": subjects
+        }
+
+    async def get_subject_stats(self, user_id: int, grade: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Get statistics grouped by subject with optional grade filter"""
+        questions = await self.get_questions_by_user(user_id, grade=grade)
+
+        subjects = {}
+        for q in questions:
+            subject = q['subject']
+            if subject not in subjects:
+                subjects[subject] = {
+                    'subject': subject,
+                    'total': 0,
+                    'pending': 0,
+                    'reviewing': 0,
+                    'understood': 0
+                }
+
+            subjects[subject]['total'] += 1
+            subjects[subject][q['status']] += 1
+
+        return list(subjects.values())
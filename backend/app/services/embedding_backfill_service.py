@@ -0,0 +1,324 @@
+"""
+Embedding Backfill Service
+Repairs and rebuilds question embeddings in concurrent, rate-limited batches
+
+Modes:
+    missing - questions with no stored vector of the active model, or only ones
+              that are all zeros or of the wrong dimension (left behind when
+              generate_embedding or store_question_embedding failed)
+    all     - every question, e.g. after changing the embedding model's settings
+    shadow  - "missing" for the shadow model of an embedding model migration
+              (see embedding_model_service); the active model's vectors are untouched
+
+Progress is checkpointed to a JSON file after every page of questions, so an
+interrupted run resumes where it stopped. Run from the CLI
+(backfill_embeddings.py) or in the background via /admin/embeddings/backfill.
+"""
+
+import asyncio
+import json
+import os
+import time
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Callable
+
+from app.config import settings
+from app.services.azure_ai_service import azure_ai_service
+from app.services.embedding_model_service import embedding_models, model_tag
+from app.services.supabase_db_service import supabase_db
+from app.services.supabase_service import supabase_service
+
+MODES = ("missing", "all", "shadow")
+MAX_ATTEMPTS = 4  # Per batch, with exponential backoff (rate limits, transient errors)
+
+
+class RateLimiter:
+    """Spaces out requests to stay under a requests-per-minute budget"""
+
+    def __init__(self, requests_per_minute: int):
+        self.interval = 60.0 / requests_per_minute if requests_per_minute > 0 else 0.0
+        self._next_slot = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self) -> None:
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class EmbeddingBackfillJob:
+    """One backfill run; resumable through its checkpoint file"""
+
+    def __init__(
+        self,
+        mode: str = "missing",
+        batch_size: Optional[int] = None,
+        concurrency: Optional[int] = None,
+        requests_per_minute: Optional[int] = None,
+        checkpoint_path: Optional[str] = None,
+        restart: bool = False,
+        log: Callable[[str], None] = print
+    ):
+        """
+        Args:
+            mode: "missing" (repair), "all" (re-index the whole corpus) or
+                  "shadow" (embed with the model being migrated to)
+            batch_size: Questions per embeddings request
+            concurrency: Embeddings requests in flight at once
+            requests_per_minute: Request budget shared by all workers
+            checkpoint_path: JSON checkpoint file
+            restart: Ignore an existing checkpoint and start from the first question
+            log: Progress output
+        """
+        if mode not in MODES:
+            raise ValueError(f"Unknown backfill mode: {mode}")
+
+        self.mode = mode
+        self.batch_size = batch_size or settings.EMBEDDING_BACKFILL_BATCH_SIZE
+        self.concurrency = concurrency or settings.EMBEDDING_BACKFILL_CONCURRENCY
+        self.checkpoint_path = checkpoint_path or settings.EMBEDDING_BACKFILL_CHECKPOINT
+        self.restart = restart
+        self.log = log
+
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._limiter = RateLimiter(requests_per_minute or settings.EMBEDDING_REQUESTS_PER_MINUTE)
+        self._health: Dict[int, List[Dict[str, Any]]] = {}
+        self.model: Optional[Dict[str, Any]] = None  # Resolved when the run starts
+        self.tag: Optional[str] = None
+        self._started = 0.0
+        self._resumed_from = {"embedded": 0, "tokens": 0}
+        self.state = self._new_state()
+
+    def _new_state(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "model": self.tag,
+            "after_id": 0,
+            "scanned": 0,
+            "embedded": 0,
+            "failed": 0,
+            "tokens": 0,
+            "started_at": datetime.utcnow().isoformat(),
+            "updated_at": None,
+            "finished": False
+        }
+
+    # ==================== CHECKPOINT ====================
+
+    def _load_checkpoint(self) -> None:
+        if self.restart or not os.path.exists(self.checkpoint_path):
+            return
+        with open(self.checkpoint_path) as f:
+            saved = json.load(f)
+        if saved.get("mode") == self.mode and saved.get("model") == self.tag and not saved.get("finished"):
+            self.state = saved
+            self.log(f"↩️  Resuming {self.mode} backfill after question {saved['after_id']}")
+
+    def _save_checkpoint(self) -> None:
+        self.state["updated_at"] = datetime.utcnow().isoformat()
+        tmp_path = f"{self.checkpoint_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    # ==================== RUN ====================
+
+    async def run(self) -> Dict[str, Any]:
+        """Run (or resume) the backfill; returns the final counters"""
+        if self.mode == "shadow":
+            self.model = await embedding_models.get_shadow()
+            if not self.model:
+                raise ValueError("No embedding model migration in progress")
+        else:
+            self.model = await embedding_models.get_active()
+        self.tag = model_tag(self.model)
+        self.state["model"] = self.tag
+
+        self._load_checkpoint()
+        self._started = time.monotonic()
+        self._resumed_from = {"embedded": self.state["embedded"], "tokens": self.state["tokens"]}
+
+        await self._load_health()
+        self.log(f"🔎 {sum(len(rows) for rows in self._health.values())} stored {self.tag} embeddings checked")
+
+        page_size = self.batch_size * self.concurrency
+        while True:
+            page = await supabase_db.get_questions_batch(self.state["after_id"], page_size)
+            if not page:
+                break
+
+            candidates = [q for q in page if self._needs_embedding(q)]
+            batches = [candidates[i:i + self.batch_size] for i in range(0, len(candidates), self.batch_size)]
+            embedded = self.state["embedded"]
+            await asyncio.gather(*(self._process_batch(batch) for batch in batches))
+
+            self.state["after_id"] = page[-1]["id"]
+            self.state["scanned"] += len(page)
+            self._save_checkpoint()
+            if self.state["embedded"] > embedded and self.mode != "shadow":
+                # App processes reload their in-process indexes (shadow vectors are not indexed)
+                await embedding_models.vectors_changed()
+            self._report()
+
+        self.state["finished"] = True
+        self._save_checkpoint()
+        self.log(f"✅ Backfill finished: {self.progress()}")
+        return self.progress()
+
+    async def _load_health(self) -> None:
+        """Index stored embeddings of the job's model by question (id, size, zero flag - no vectors)"""
+        after = 0
+        while True:
+            rows = await supabase_service.get_embedding_health(after, 1000)
+            if not rows:
+                break
+            for row in rows:
+                if row.get("embedding_model") == self.tag:
+                    self._health.setdefault(row["question_id"], []).append(row)
+            after = rows[-1]["question_id"]
+
+    def _needs_embedding(self, question: Dict[str, Any]) -> bool:
+        if not question.get("question_text"):
+            return False
+        if self.mode == "all":
+            return True
+
+        return not any(
+            not row["is_zero"] and row["dims"] == self.model["dimensions"]
+            for row in self._health.get(question["id"], [])
+        )
+
+    async def _process_batch(self, batch: List[Dict[str, Any]]) -> None:
+        async with self._semaphore:
+            for attempt in range(MAX_ATTEMPTS):
+                await self._limiter.wait()
+                try:
+                    embeddings, tokens_used = await azure_ai_service.generate_embeddings(
+                        [q["question_text"] for q in batch],
+                        self.model
+                    )
+                    break
+                except Exception as e:
+                    if attempt == MAX_ATTEMPTS - 1:
+                        self.log(f"❌ Batch starting at question {batch[0]['id']} failed: {e}")
+                        self.state["failed"] += len(batch)
+                        return
+                    await asyncio.sleep(2 ** attempt)
+
+        self.state["tokens"] += tokens_used.get("total_tokens", 0)
+        for question, embedding in zip(batch, embeddings):
+            try:
+                await self._store(question, embedding)
+                self.state["embedded"] += 1
+            except Exception as e:
+                self.log(f"❌ Question {question['id']}: {e}")
+                self.state["failed"] += 1
+
+    async def _store(self, question: Dict[str, Any], embedding: List[float]) -> None:
+        """Overwrite the question's stored vector of the job's model in place, or store a new one"""
+        if not any(embedding):
+            raise ValueError("Embedding model returned a zero vector")
+
+        existing = [row["id"] for row in self._health.get(question["id"], [])]
+        vector_id = question.get("vector_id") if question.get("vector_id") in existing else None
+        if vector_id is None and existing:
+            vector_id = existing[0]
+
+        if vector_id:
+            if not await supabase_service.update_question_embedding(vector_id, embedding=embedding):
+                raise RuntimeError(f"Failed to update embedding {vector_id}")
+            # Drop duplicate vectors of the same question
+            for other_id in existing:
+                if other_id != vector_id:
+                    await supabase_service.delete_question_embedding(other_id)
+        else:
+            vector_id = await supabase_service.store_question_embedding(
+                user_id=question["user_id"],
+                question_id=question["id"],
+                question_text=question["question_text"],
+                embedding=embedding,
+                subject=question["subject"],
+                grade=question.get("grade"),
+                embedding_model=self.tag
+            )
+
+        # vector_id points at the active model's vector; shadow vectors are found by question_id
+        if self.mode != "shadow" and question.get("vector_id") != vector_id:
+            await supabase_db.update_question(question["id"], vector_id=vector_id)
+
+    # ==================== REPORTING ====================
+
+    def progress(self) -> Dict[str, Any]:
+        """Counters plus throughput for this process's share of the run"""
+        elapsed = time.monotonic() - self._started if self._started else 0
+        progress = dict(self.state)
+        progress["elapsed_seconds"] = round(elapsed, 1)
+        embedded = self.state["embedded"] - self._resumed_from["embedded"]
+        tokens = self.state["tokens"] - self._resumed_from["tokens"]
+        progress["questions_per_second"] = round(embedded / elapsed, 2) if elapsed else 0
+        progress["tokens_per_second"] = round(tokens / elapsed, 1) if elapsed else 0
+        return progress
+
+    def _report(self) -> None:
+        p = self.progress()
+        self.log(
+            f"📈 scanned {p['scanned']} (up to question {p['after_id']}) | embedded {p['embedded']} | "
+            f"failed {p['failed']} | {p['questions_per_second']} q/s | {p['tokens_per_second']} tokens/s"
+        )
+
+
+class BackfillRunner:
+    """Runs at most one backfill job in the background of the app process"""
+
+    def __init__(self):
+        self.job: Optional[EmbeddingBackfillJob] = None
+        self.task: Optional[asyncio.Task] = None
+        self.error: Optional[str] = None
+
+    @property
+    def running(self) -> bool:
+        return self.task is not None and not self.task.done()
+
+    def start(self, mode: str = "missing", restart: bool = False) -> Dict[str, Any]:
+        """Start a job; raises RuntimeError if one is already running"""
+        if self.running:
+            raise RuntimeError("A backfill job is already running")
+
+        self.job = EmbeddingBackfillJob(mode=mode, restart=restart)
+        self.error = None
+        self.task = asyncio.ensure_future(self._run(self.job))
+        return self.status()
+
+    async def _run(self, job: EmbeddingBackfillJob) -> None:
+        try:
+            await job.run()
+        except asyncio.CancelledError:
+            job.log("⏹️  Backfill cancelled (progress is checkpointed)")
+            raise
+        except Exception as e:
+            self.error = str(e)
+            job.log(f"❌ Backfill failed: {e}")
+
+    async def cancel(self) -> bool:
+        """Cancel the running job; returns False if none was running"""
+        if not self.running:
+            return False
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        return True
+
+    def status(self) -> Dict[str, Any]:
+        """Current or last job's progress"""
+        if self.job is None:
+            return {"running": False}
+        return {"running": self.running, "error": self.error, **self.job.progress()}
+
+
+# Create a singleton instance
+backfill_runner = BackfillRunner()
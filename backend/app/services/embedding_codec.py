@@ -0,0 +1,60 @@
+"""
+Embedding Codec
+Compact encodings for embedding vectors: dimension reduction, quantization,
+and the pgvector text format used on the wire to the database
+"""
+
+import base64
+from typing import List, Tuple, Union
+
+import numpy as np
+
+# Significant digits kept when sending vectors to pgvector, which stores float32
+PGVECTOR_DIGITS = 7
+
+
+def decode_embedding(data: Union[str, List[float]]) -> np.ndarray:
+    """Decode an API embedding (float list, or base64 little-endian float32) to float32"""
+    if isinstance(data, str):
+        return np.frombuffer(base64.b64decode(data), dtype="<f4").astype(np.float32)
+    return np.asarray(data, dtype=np.float32)
+
+
+def reduce_dimensions(vector: np.ndarray, dimensions: int) -> np.ndarray:
+    """
+    Truncate to the first `dimensions` components and re-normalize
+
+    Matches the API's `dimensions` parameter for text-embedding-3 models, whose
+    leading components carry most of the signal. Not meaningful for ada-002.
+    """
+    vector = np.asarray(vector, dtype=np.float32)
+    if dimensions <= 0 or len(vector) <= dimensions:
+        return vector
+    vector = vector[:dimensions]
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def normalize(vector) -> np.ndarray:
+    """L2-normalize to float32 (cosine similarity becomes a dot product)"""
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def quantize_int8(vector: np.ndarray) -> Tuple[np.ndarray, float]:
+    """Symmetric per-vector int8 quantization; returns (codes, scale)"""
+    peak = float(np.max(np.abs(vector))) if len(vector) else 0.0
+    scale = peak / 127 if peak else 1.0
+    codes = np.clip(np.rint(vector / scale), -127, 127).astype(np.int8)
+    return codes, scale
+
+
+def to_pgvector(embedding) -> str:
+    """
+    Encode as pgvector text ("[0.1234567,...]")
+
+    Sent instead of a JSON float list: pgvector parses it directly, and 7
+    significant digits (about float32's precision) roughly halve the payload.
+    """
+    return "[" + ",".join(f"{x:.{PGVECTOR_DIGITS}g}" for x in np.asarray(embedding, dtype=np.float32).tolist()) + "]"
@@ -0,0 +1,235 @@
+"""
+Embedding Model Service
+Which embedding model is live, and online migration to a new one
+
+Every stored embedding is tagged with its model ("<deployment>@<dimensions>").
+The live ("active") model and an optional "shadow" model under migration are
+kept in one config row (study_app_config, key "embedding_models"), so a cutover
+is a single-row write that every app process picks up within
+EMBEDDING_MODEL_REFRESH_SECONDS. Until then each process keeps searching the
+old model's vectors, which are retained, so search never mixes vector spaces.
+
+Vectors rewritten outside the app process (backfill_embeddings.py) are signalled
+the same way: the job writes a new version to the "embedding_vectors_version"
+row, and every process that sees it change drops its in-process vector indexes,
+which are reloaded on the next search.
+
+Migration:
+    1. start_migration(deployment, dimensions)  - new questions are embedded with both models
+    2. backfill job, mode "shadow"               - re-embeds existing questions with the shadow model
+    3. dual-read: searches are replayed against the shadow model in the background
+       and the overlap with live results is reported
+    4. cutover()                                 - shadow becomes active (refuses if coverage < 100%)
+    5. delete_retired_embeddings()               - drop the old model's vectors
+"""
+
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, Any, Optional, List
+
+from app.config import settings
+from app.services.supabase_db_service import supabase_db
+from app.services.vector_index_service import vector_index
+
+CONFIG_KEY = "embedding_models"
+VECTORS_VERSION_KEY = "embedding_vectors_version"
+
+
+def model_tag(model: Dict[str, Any]) -> str:
+    """Tag stored with every embedding, e.g. "text-embedding-ada-002@1536" """
+    return f"{model['deployment']}@{model['dimensions']}"
+
+
+def default_model() -> Dict[str, Any]:
+    """The model configured in settings (used until a config row exists)"""
+    return {
+        "deployment": settings.AZURE_OPENAI_EMBEDDING_DEPLOYMENT,
+        "dimensions": settings.EMBEDDING_DIMENSIONS
+    }
+
+
+class EmbeddingModelService:
+    """Cached view of the embedding model config row, plus migration operations"""
+
+    def __init__(self):
+        self._config: Dict[str, Any] = {"active": default_model(), "shadow": None}
+        self._loaded_at = 0.0
+        self._vectors_version: Optional[str] = None  # Last seen; None until the first refresh
+        self.shadow_read_stats = {"compared": 0, "overlap_sum": 0.0, "tokens": 0}
+
+    @property
+    def active_tag(self) -> str:
+        """Tag of the live model (last known; call refresh() to re-read)"""
+        return model_tag(self._config["active"])
+
+    @property
+    def shadow_tag(self) -> Optional[str]:
+        shadow = self._config.get("shadow")
+        return model_tag(shadow) if shadow else None
+
+    async def refresh(self, force: bool = False) -> Dict[str, Any]:
+        """Re-read the config row if the cached copy is older than EMBEDDING_MODEL_REFRESH_SECONDS"""
+        if not force and time.monotonic() - self._loaded_at < settings.EMBEDDING_MODEL_REFRESH_SECONDS:
+            return self._config
+
+        self._loaded_at = time.monotonic()
+        try:
+            stored = await supabase_db.get_app_config(CONFIG_KEY)
+        except Exception as e:
+            print(f"⚠️  Failed to read embedding model config, keeping {self.active_tag}: {e}")
+            return self._config
+
+        config = stored or {"active": default_model(), "shadow": None}
+        if model_tag(config["active"]) != self.active_tag:
+            print(f"🔁 Embedding model cutover: {self.active_tag} -> {model_tag(config['active'])}")
+            # In-process indexes hold the old model's vectors
+            vector_index.clear()
+        self._config = config
+        await self._check_vectors_version()
+        return self._config
+
+    async def _check_vectors_version(self) -> None:
+        try:
+            stored = await supabase_db.get_app_config(VECTORS_VERSION_KEY)
+        except Exception as e:
+            print(f"⚠️  Failed to read embedding vectors version: {e}")
+            return
+        version = (stored or {}).get("version") or ""
+        if self._vectors_version is not None and version != self._vectors_version:
+            print("🔁 Embeddings rewritten by another process; clearing in-process vector indexes")
+            vector_index.clear()
+        self._vectors_version = version
+
+    async def vectors_changed(self) -> None:
+        """Signal every app process that stored active-model vectors were rewritten (they reload their indexes)"""
+        await supabase_db.set_app_config(VECTORS_VERSION_KEY, {
+            "version": uuid.uuid4().hex,
+            "at": datetime.utcnow().isoformat()
+        })
+
+    async def get_active(self) -> Dict[str, Any]:
+        """The live model: {"deployment", "dimensions"}"""
+        return (await self.refresh())["active"]
+
+    async def get_shadow(self) -> Optional[Dict[str, Any]]:
+        """The model being migrated to, or None"""
+        return (await self.refresh()).get("shadow")
+
+    async def _write(self, config: Dict[str, Any]) -> Dict[str, Any]:
+        await supabase_db.set_app_config(CONFIG_KEY, config)
+        return await self.refresh(force=True)
+
+    # ==================== MIGRATION ====================
+
+    async def start_migration(self, deployment: str, dimensions: int) -> Dict[str, Any]:
+        """Make (deployment, dimensions) the shadow model; new questions get both embeddings"""
+        config = await self.refresh(force=True)
+        shadow = {"deployment": deployment, "dimensions": dimensions}
+        if model_tag(shadow) == model_tag(config["active"]):
+            raise ValueError(f"{model_tag(shadow)} is already the active embedding model")
+
+        self.shadow_read_stats = {"compared": 0, "overlap_sum": 0.0, "tokens": 0}
+        return await self._write({
+            **config,
+            "shadow": shadow,
+            "shadow_started_at": datetime.utcnow().isoformat()
+        })
+
+    async def abort_migration(self) -> Dict[str, Any]:
+        """Stop migrating; shadow vectors stay until delete_retired_embeddings()"""
+        config = await self.refresh(force=True)
+        return await self._write({"active": config["active"], "shadow": None})
+
+    async def cutover(self, force: bool = False) -> Dict[str, Any]:
+        """
+        Atomically make the shadow model active
+
+        Args:
+            force: Cut over even if some questions have no shadow embedding yet
+                   (they drop out of vector search until backfilled)
+
+        Raises:
+            ValueError: No migration in progress, or shadow coverage incomplete
+        """
+        config = await self.refresh(force=True)
+        shadow = config.get("shadow")
+        if not shadow:
+            raise ValueError("No embedding model migration in progress")
+
+        if not force:
+            coverage = await self.coverage(model_tag(shadow))
+            if coverage["missing"]:
+                raise ValueError(
+                    f"{coverage['missing']} question(s) have no {model_tag(shadow)} embedding yet; "
+                    f"run the shadow backfill first"
+                )
+
+        return await self._write({
+            "active": shadow,
+            "shadow": None,
+            "previous": config["active"],
+            "cutover_at": datetime.utcnow().isoformat()
+        })
+
+    async def coverage(self, tag: str) -> Dict[str, int]:
+        """Count questions with and without a valid embedding of the given model"""
+        from app.services.supabase_service import supabase_service
+
+        embedded = set()
+        after = 0
+        while True:
+            rows = await supabase_service.get_embedding_health(after, 1000)
+            if not rows:
+                break
+            embedded.update(r["question_id"] for r in rows if r.get("embedding_model") == tag and not r["is_zero"])
+            after = rows[-1]["question_id"]
+
+        total = missing = 0
+        after = 0
+        while True:
+            page = await supabase_db.get_questions_batch(after, 1000)
+            if not page:
+                break
+            total += len(page)
+            missing += sum(1 for q in page if q["id"] not in embedded and q.get("question_text"))
+            after = page[-1]["id"]
+
+        return {"questions": total, "embedded": total - missing, "missing": missing}
+
+    async def delete_retired_embeddings(self) -> int:
+        """Delete vectors of models that are neither active nor shadow; returns rows deleted"""
+        from app.services.supabase_service import supabase_service
+
+        config = await self.refresh(force=True)
+        keep = [model_tag(config["active"])] + ([model_tag(config["shadow"])] if config.get("shadow") else [])
+        return await supabase_service.delete_embeddings_except(keep)
+
+    # ==================== DUAL READ ====================
+
+    def record_shadow_comparison(self, live_ids: List[int], shadow_ids: List[int], tokens: int = 0) -> None:
+        """Record how much of the live top-K the shadow model also returned"""
+        if not live_ids:
+            return
+        overlap = len(set(live_ids) & set(shadow_ids)) / len(live_ids)
+        self.shadow_read_stats["compared"] += 1
+        self.shadow_read_stats["overlap_sum"] += overlap
+        self.shadow_read_stats["tokens"] += tokens
+
+    def get_status(self) -> Dict[str, Any]:
+        """Active/shadow models and dual-read agreement"""
+        stats = self.shadow_read_stats
+        return {
+            **self._config,
+            "active_tag": self.active_tag,
+            "shadow_tag": self.shadow_tag,
+            "shadow_reads": {
+                "compared": stats["compared"],
+                "mean_overlap": (stats["overlap_sum"] / stats["compared"]) if stats["compared"] else None,
+                "tokens": stats["tokens"]
+            }
+        }
+
+
+# Create a singleton instance
+embedding_models = EmbeddingModelService()
@@ -0,0 +1,122 @@
+"""
+Explanation Reuse Service
+Ingest-time semantic cache: a new question that is a near-duplicate of an
+existing one (reworded, or OCR'd differently, often by another student) in the
+same subject and grade reuses that question's explanation instead of calling
+explain_question again.
+
+Every explanation records its provenance in question_metadata["explanation"]:
+    {"source": "generated", "tokens": 812, "at": "..."}
+    {"source": "reused", "from_question_id": 41, "origin_question_id": 7,
+     "similarity": 0.981, "tokens": 812, "at": "..."}
+    {"source": "pending"}  (lazy mode: generated on first open, see lazy_explanation_service)
+so reuse can be audited in SQL and undone with POST /questions/{id}/regenerate.
+The question ids stay in the database: API responses leave them out, as the
+source is often another user's question (see QuestionResponse).
+"""
+
+from datetime import datetime
+from typing import Dict, Any, Optional, List
+
+from app.config import settings
+from app.services.azure_ai_service import EXPLANATION_UNAVAILABLE
+from app.services.supabase_db_service import supabase_db
+from app.services.supabase_service import supabase_service
+
+
+def generated_provenance(tokens_used: Dict[str, int]) -> Dict[str, Any]:
+    """Provenance for an explanation produced by the model"""
+    return {
+        "source": "generated",
+        "tokens": tokens_used.get("total_tokens", 0),
+        "at": datetime.utcnow().isoformat()
+    }
+
+
+def edited_provenance() -> Dict[str, Any]:
+    """Provenance for an explanation written by the user (never reused for others)"""
+    return {
+        "source": "edited",
+        "at": datetime.utcnow().isoformat()
+    }
+
+
+class ExplanationReuseService:
+    """Finds reusable explanations and counts hits and tokens saved"""
+
+    def __init__(self):
+        self.stats = {"lookups": 0, "hits": 0, "tokens_saved": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return settings.EXPLANATION_REUSE_ENABLED
+
+    async def find_reusable(
+        self,
+        embedding: List[float],
+        subject: str,
+        grade: Optional[str] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Look up an explanation to reuse for a new question
+
+        Args:
+            embedding: The new question's embedding
+            subject: Subject of the new question
+            grade: Grade of the new question (must match exactly, including None)
+
+        Returns:
+            {"explanation", "provenance"} if the nearest question is similar enough
+            (EXPLANATION_REUSE_THRESHOLD) and has a successfully generated
+            explanation, otherwise None
+        """
+        if not self.enabled or not any(embedding):
+            return None
+
+        self.stats["lookups"] += 1
+        try:
+            nearest = await supabase_service.find_nearest_question(embedding, subject, grade)
+            if not nearest or nearest["similarity"] < settings.EXPLANATION_REUSE_THRESHOLD:
+                return None
+
+            source = await supabase_db.get_question_by_id(nearest["question_id"])
+            if not source or not source.get("explanation"):
+                return None
+        except Exception as e:
+            print(f"⚠️  Explanation reuse lookup failed: {e}")
+            return None
+
+        source_provenance = (source.get("question_metadata") or {}).get("explanation") or {}
+        tokens = source_provenance.get("tokens", 0)
+
+        # Only model output is shared: edited (user-written) or unknown sources are not,
+        # and a failed generation saved a placeholder with no tokens
+        if source_provenance.get("source") not in ("generated", "reused") or not tokens or \
+                source["explanation"] == EXPLANATION_UNAVAILABLE:
+            return None
+
+        self.stats["hits"] += 1
+        self.stats["tokens_saved"] += tokens
+
+        return {
+            "explanation": source["explanation"],
+            "provenance": {
+                "source": "reused",
+                "from_question_id": source["id"],
+                "origin_question_id": source_provenance.get("origin_question_id", source["id"]),
+                "similarity": round(nearest["similarity"], 4),
+                "tokens": tokens,
+                "at": datetime.utcnow().isoformat()
+            }
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get reuse counters (lookups, hits, tokens saved) and hit rate"""
+        stats = dict(self.stats)
+        stats["hit_rate"] = (stats["hits"] / stats["lookups"]) if stats["lookups"] else 0
+        stats["threshold"] = settings.EXPLANATION_REUSE_THRESHOLD
+        return stats
+
+
+# Create a singleton instance
+explanation_reuse = ExplanationReuseService()
@@ -0,0 +1,125 @@
+"""
+Hybrid Search
+Question search combining vector similarity with indexed full-text search
+
+The two rankings are merged with reciprocal rank fusion (RRF): a question
+scores sum(1 / (k + rank)) over the lists it appears in. Only ranks are used,
+so cosine similarities and text-search scores never need calibrating
+against each other. Lexical queries (question numbers, formulas) are carried
+by the full-text side, paraphrases by the vector side.
+
+During an embedding model migration a sample of searches is replayed in the
+background against the shadow model's vectors, and the overlap with the live
+vector ranking is reported in the model status (dual read).
+"""
+
+import asyncio
+import random
+from typing import List, Dict, Optional
+
+from app.config import settings
+from app.services.azure_ai_service import azure_ai_service
+from app.services.embedding_model_service import embedding_models
+from app.services.supabase_db_service import supabase_db
+from app.services.supabase_service import supabase_service
+
+# Keeps background shadow reads referenced until they finish
+_shadow_reads = set()
+
+
+def reciprocal_rank_fusion(rankings: List[List[int]], k: int = 60) -> List[int]:
+    """
+    Fuse several best-first rankings of IDs
+
+    Args:
+        rankings: Lists of IDs, best first (duplicates within a list are ignored)
+        k: Damping constant; larger values flatten the advantage of top ranks
+
+    Returns:
+        All IDs ordered by fused score, ties broken by first appearance
+    """
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, item in enumerate(dict.fromkeys(ranking), start=1):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=lambda item: scores[item], reverse=True)
+
+
+async def search_question_ids(
+    user_id: int,
+    query: str,
+    query_embedding: Optional[List[float]],
+    limit: int = 10
+) -> List[int]:
+    """
+    Rank the user's questions for a search query
+
+    Runs vector and full-text search concurrently; either side failing or
+    returning nothing leaves the other side's ranking.
+
+    Args:
+        user_id: User ID
+        query: Raw search text (full-text side)
+        query_embedding: Embedding of the query (vector side); None skips it
+        limit: Number of IDs to return
+
+    Returns:
+        Question IDs, best match first
+    """
+    # Fetch deeper lists than needed so fusion can promote items found by both sides
+    depth = limit * settings.SEARCH_CANDIDATE_FACTOR
+
+    async def vector_ids() -> List[int]:
+        if not query_embedding or not any(query_embedding):
+            return []
+        hits = await supabase_service.search_similar_questions(
+            user_id=user_id,
+            query_embedding=query_embedding,
+            limit=depth
+        )
+        return [hit["question_id"] for hit in hits if hit.get("question_id")]
+
+    async def text_ids() -> List[int]:
+        return await supabase_db.search_question_ids(user_id, query, limit=depth)
+
+    results = await asyncio.gather(vector_ids(), text_ids(), return_exceptions=True)
+
+    rankings = []
+    for name, result in zip(("vector", "full-text"), results):
+        if isinstance(result, Exception):
+            print(f"⚠️  {name} search failed: {result}")
+        else:
+            rankings.append(result)
+
+    live_vector_ids = results[0]
+    if (embedding_models.shadow_tag and live_vector_ids and not isinstance(live_vector_ids, Exception)
+            and random.random() < settings.EMBEDDING_SHADOW_READ_SAMPLE):
+        task = asyncio.ensure_future(_shadow_read(user_id, query, live_vector_ids[:limit]))
+        _shadow_reads.add(task)
+        task.add_done_callback(_shadow_reads.discard)
+
+    return reciprocal_rank_fusion(rankings, k=settings.SEARCH_RRF_K)[:limit]
+
+
+async def _shadow_read(user_id: int, query: str, live_ids: List[int]) -> None:
+    """Run the vector search on the shadow model and record its overlap with the live results"""
+    shadow_model = await embedding_models.get_shadow()
+    if not shadow_model:
+        return
+    try:
+        embeddings, tokens_used = await azure_ai_service.generate_embeddings([query], shadow_model)
+        hits = await supabase_service.search_similar_questions(
+            user_id=user_id,
+            query_embedding=embeddings[0],
+            limit=len(live_ids),
+            embedding_model=embedding_models.shadow_tag
+        )
+    except Exception as e:
+        print(f"⚠️  Shadow search failed: {e}")
+        return
+
+    embedding_models.record_shadow_comparison(
+        live_ids,
+        [hit["question_id"] for hit in hits],
+        tokens_used.get("total_tokens", 0)
+    )
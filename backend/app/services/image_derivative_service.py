@@ -0,0 +1,189 @@
+"""
+Image Derivative Service
+Downscaled WebP copies of uploaded question images
+
+Phone photos of worksheets are several megabytes; list and review screens only
+need a small thumbnail and a screen-sized image. Derivatives are rendered once
+at upload, in a worker thread, and stored like the original: content-addressed
+and reference-counted (image_ref_service), so identical renders are stored once.
+
+Worksheet pages with several wrong questions also get one cropped snippet per
+question, cut from the bounding boxes returned by the page analysis, so review
+screens load a small crop instead of the page.
+"""
+
+import asyncio
+from io import BytesIO
+from typing import Dict, List, Optional, Any, Tuple
+
+from PIL import Image, ImageOps
+
+from app.config import settings
+from app.services.image_ref_service import image_refs
+
+
+def derivative_sizes() -> Dict[str, int]:
+    """Longest edge in pixels of each derivative"""
+    return {
+        "thumbnail": settings.IMAGE_THUMBNAIL_MAX_PX,
+        "review": settings.IMAGE_REVIEW_MAX_PX
+    }
+
+
+def _encode_webp(image: Image.Image) -> bytes:
+    buffer = BytesIO()
+    image.save(buffer, format="WEBP", quality=settings.IMAGE_WEBP_QUALITY, method=4)
+    return buffer.getvalue()
+
+
+def _to_web_mode(image: Image.Image) -> Image.Image:
+    if image.mode not in ("RGB", "RGBA"):
+        return image.convert("RGBA" if image.mode in ("LA", "P", "PA") else "RGB")
+    return image
+
+
+def render_derivatives(file_data: bytes) -> Dict[str, bytes]:
+    """
+    Render every derivative of an image (blocking; run in a worker thread)
+
+    Returns:
+        {name: WebP bytes}; images smaller than a derivative are not upscaled
+    """
+    sizes = derivative_sizes()
+    with Image.open(BytesIO(file_data)) as original:
+        # JPEG only: decode at the smallest 1/2, 1/4 or 1/8 scale that still
+        # covers the largest derivative - most of the work for a phone photo
+        largest = max(sizes.values())
+        original.draft("RGB", (largest, largest))
+        image = ImageOps.exif_transpose(original)
+
+    image = _to_web_mode(image)
+
+    derivatives = {}
+    # Largest first, each smaller one resized from the previous
+    for name, size in sorted(sizes.items(), key=lambda item: item[1], reverse=True):
+        image = image.copy()
+        image.thumbnail((size, size), Image.LANCZOS)
+        derivatives[name] = _encode_webp(image)
+    return derivatives
+
+
+def crop_box(bounding_box: Any, width: int, height: int) -> Optional[Tuple[int, int, int, int]]:
+    """
+    Convert a fractional bounding box from the page analysis to a padded pixel box
+
+    Args:
+        bounding_box: {"x", "y", "width", "height"}, fractions of the page
+        width: Page width in pixels
+        height: Page height in pixels
+
+    Returns:
+        (left, top, right, bottom) clamped to the page, or None if the box is
+        missing or malformed
+    """
+    try:
+        x, y = float(bounding_box["x"]), float(bounding_box["y"])
+        w, h = float(bounding_box["width"]), float(bounding_box["height"])
+    except (TypeError, KeyError, ValueError):
+        return None
+    if w <= 0 or h <= 0 or not (0 <= x < 1 and 0 <= y < 1) or x + w > 1.05 or y + h > 1.05:
+        return None
+
+    pad = settings.IMAGE_SNIPPET_PADDING
+    left = max(0, int((x - pad) * width))
+    top = max(0, int((y - pad) * height))
+    right = min(width, int((x + w + pad) * width + 0.5))
+    bottom = min(height, int((y + h + pad) * height + 0.5))
+    if right - left < 8 or bottom - top < 8:
+        return None
+    return left, top, right, bottom
+
+
+def render_snippets(file_data: bytes, bounding_boxes: List[Any]) -> List[Optional[bytes]]:
+    """
+    Crop every question snippet from one decode of the page (blocking; run in a worker thread)
+
+    Returns:
+        WebP bytes per bounding box, None where the box was unusable
+    """
+    with Image.open(BytesIO(file_data)) as original:
+        page = _to_web_mode(ImageOps.exif_transpose(original))
+
+    size = settings.IMAGE_SNIPPET_MAX_PX
+    snippets = []
+    for bounding_box in bounding_boxes:
+        box = crop_box(bounding_box, page.width, page.height)
+        if box is None:
+            snippets.append(None)
+            continue
+        snippet = page.crop(box)
+        snippet.thumbnail((size, size), Image.LANCZOS)
+        snippets.append(_encode_webp(snippet))
+    return snippets
+
+
+async def _store_webp(data: bytes) -> str:
+    return await image_refs.store(data, "webp", "image/webp")
+
+
+async def store_derivatives(file_data: bytes) -> Dict[str, str]:
+    """
+    Render and store the derivatives of an uploaded image
+
+    Each stored derivative holds one image reference that the caller releases
+    (see image_ref_service).
+
+    Args:
+        file_data: Original image bytes
+
+    Returns:
+        {"thumbnail": url, "review": url}, or {} if the image could not be
+        processed (callers fall back to the original)
+    """
+    try:
+        derivatives = await asyncio.to_thread(render_derivatives, file_data)
+    except Exception as e:
+        print(f"⚠️  Failed to create image derivatives: {e}")
+        return {}
+
+    # Keep whichever uploads succeeded (each one holds a reference)
+    urls = await asyncio.gather(*(_store_webp(data) for data in derivatives.values()), return_exceptions=True)
+    for url in urls:
+        if isinstance(url, Exception):
+            print(f"⚠️  Failed to store image derivative: {url}")
+    return {name: url for name, url in zip(derivatives, urls) if not isinstance(url, Exception)}
+
+
+async def store_snippets(file_data: bytes, bounding_boxes: List[Any]) -> List[Optional[str]]:
+    """
+    Crop, compress and store one snippet per question of a page, in one batch
+
+    Each stored snippet holds one image reference that the caller releases.
+
+    Args:
+        file_data: Original page image bytes
+        bounding_boxes: Per question, the bounding_box from analyze_question_paper (or None)
+
+    Returns:
+        Snippet URL per question, None where there is no usable box (callers
+        fall back to the page image)
+    """
+    if not any(bounding_boxes):
+        return [None] * len(bounding_boxes)
+
+    try:
+        snippets = await asyncio.to_thread(render_snippets, file_data, bounding_boxes)
+    except Exception as e:
+        print(f"⚠️  Failed to create question snippets: {e}")
+        return [None] * len(bounding_boxes)
+
+    async def store(data: Optional[bytes]) -> Optional[str]:
+        if data is None:
+            return None
+        try:
+            return await _store_webp(data)
+        except Exception as e:
+            print(f"⚠️  Failed to store question snippet: {e}")
+            return None
+
+    return list(await asyncio.gather(*(store(data) for data in snippets)))
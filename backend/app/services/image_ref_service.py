@@ -0,0 +1,183 @@
+"""
+Image Reference Service
+Content-addressed, reference-counted question images
+
+Images are stored once per content hash (see content_address), so the same
+photo uploaded twice, or the same derivative rendered twice, is written once.
+study_image_refs counts the questions using each stored URL; an object is
+deleted when its last reference is released.
+
+Upload protocol: store() takes one temporary reference (uploading only if the
+object is new), each question created takes its own with acquire(), and the
+temporary references are released at the end, which also cleans up images
+that no question ended up using.
+
+Reference changes and the object writes/deletes they trigger are serialized
+per URL within the process, so a release that deletes an object cannot race
+a store() of the same content.
+"""
+
+import asyncio
+from collections import Counter
+from contextlib import asynccontextmanager
+from typing import Dict, List, Iterable, Optional
+
+from app.services.supabase_db_service import supabase_db
+from app.services.supabase_storage_service import supabase_storage
+from app.services.storage_backend import content_address
+
+
+class ImageReferenceService:
+    """Stores images under content addresses and counts their references"""
+
+    def __init__(self):
+        self._locks: Dict[str, List] = {}  # url -> [lock, callers using it]
+        self.stats = {"stored": 0, "deduplicated": 0, "direct_uploads": 0, "deleted": 0}
+
+    @asynccontextmanager
+    async def _locked(self, urls: Iterable[str]):
+        """Hold the per-URL locks of urls (taken in sorted order to avoid deadlocks)"""
+        entries = []
+        for url in sorted(set(urls)):
+            entry = self._locks.setdefault(url, [asyncio.Lock(), 0])
+            entry[1] += 1
+            entries.append((url, entry))
+        acquired = []
+        try:
+            for _, entry in entries:
+                await entry[0].acquire()
+                acquired.append(entry[0])
+            yield
+        finally:
+            for lock in acquired:
+                lock.release()
+            for url, entry in entries:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    self._locks.pop(url, None)
+
+    async def store(self, file_data: bytes, file_ext: str, content_type: str) -> str:
+        """
+        Store an image under its content address, holding one reference
+
+        The upload is skipped when the object is already stored. The caller
+        must release() the returned URL once questions have acquired theirs.
+
+        Returns:
+            URL of the stored image
+        """
+        path = content_address(file_data, file_ext)
+        url = supabase_storage.object_url(path)
+        async with self._locked([url]):
+            counts = await supabase_db.acquire_image_refs({url: 1})
+            if counts.get(url, 1) > 1:
+                self.stats["deduplicated"] += 1
+                return url
+            try:
+                await supabase_storage.upload_object(path, file_data, content_type)
+            except Exception:
+                await supabase_db.release_image_refs({url: 1})
+                raise
+            self.stats["stored"] += 1
+        return url
+
+    async def adopt(self, path: str, file_data: bytes, content_type: str) -> str:
+        """
+        Hold one reference on an object the client uploaded directly (signed upload)
+
+        Like store(), the caller releases the returned URL once questions have
+        acquired theirs. file_data is the object as read back and verified by
+        the caller; it is only written again if the object was deleted since
+        (its last reference released while the client was finalizing).
+
+        Returns:
+            URL of the stored image
+        """
+        url = supabase_storage.object_url(path)
+        async with self._locked([url]):
+            counts = await supabase_db.acquire_image_refs({url: 1})
+            if counts.get(url, 1) > 1:
+                self.stats["deduplicated"] += 1
+                return url
+            try:
+                if not await supabase_storage.object_exists(path):
+                    await supabase_storage.upload_object(path, file_data, content_type)
+            except Exception:
+                await supabase_db.release_image_refs({url: 1})
+                raise
+            self.stats["direct_uploads"] += 1
+        return url
+
+    async def discard(self, url: str) -> bool:
+        """Delete a stored object unless questions reference it (e.g. a rejected direct upload)"""
+        async with self._locked([url]):
+            return url in await self._delete_unreferenced([url])
+
+    async def _delete_unreferenced(self, urls: List[str]) -> List[str]:
+        """
+        Delete the objects among urls that no question references, in one batch
+
+        Must be called holding the URLs' locks. Raises if the storage delete fails.
+
+        Returns:
+            URLs deleted
+        """
+        if not urls:
+            return []
+        # Taking and dropping a reference leaves referenced URLs unchanged and
+        # reports the unreferenced ones (their rows are removed)
+        counts = {url: 1 for url in urls}
+        await supabase_db.acquire_image_refs(counts)
+        unreferenced = await supabase_db.release_image_refs(counts)
+        self.stats["deleted"] += await supabase_storage.delete_images(unreferenced)
+        return unreferenced
+
+    async def acquire(self, urls: Iterable[Optional[str]]) -> None:
+        """Add one reference per occurrence of each URL (None entries are skipped)"""
+        counts = Counter(url for url in urls if url)
+        if counts:
+            await supabase_db.acquire_image_refs(dict(counts))
+
+    async def release(self, urls: Iterable[Optional[str]]) -> List[str]:
+        """
+        Drop one reference per occurrence of each URL; delete objects left unreferenced
+
+        Returns:
+            URLs of the deleted objects
+        """
+        counts = Counter(url for url in urls if url)
+        if not counts:
+            return []
+
+        async with self._locked(counts):
+            released = await supabase_db.release_image_refs(dict(counts))
+            try:
+                self.stats["deleted"] += await supabase_storage.delete_images(released)
+            except Exception as e:
+                # References are gone; leave the objects to the purge worker
+                print(f"⚠️  Failed to delete {len(released)} image(s), queued for purge: {e}")
+                await supabase_db.enqueue_image_purge(released)
+        return released
+
+    async def release_purged(self, entries: List[Dict]) -> None:
+        """
+        Release the image references of purge queue entries and delete the objects left unreferenced
+
+        Safe to retry: each entry's references are dropped once (release_purge_refs),
+        and objects are only deleted while no question references them.
+
+        Raises:
+            Exception: if the database or the storage delete fails
+        """
+        urls = {url for entry in entries for url in entry.get("image_urls") or []}
+        async with self._locked(urls):
+            unreferenced = await supabase_db.release_purge_refs([entry["id"] for entry in entries])
+            await self._delete_unreferenced(unreferenced)
+
+    def get_stats(self) -> Dict[str, int]:
+        """Get counters: objects stored, uploads skipped as duplicates, direct uploads adopted, objects deleted"""
+        return dict(self.stats)
+
+
+# Create a singleton instance
+image_refs = ImageReferenceService()
@@ -0,0 +1,145 @@
+"""
+Lazy Explanation Service
+Explanations generated on first open instead of at upload (EXPLANATION_MODE=lazy)
+
+Many wrong questions are marked understood without ever being opened. In lazy
+mode an upload saves each question without an explanation and with a pending
+marker in question_metadata["explanation"]:
+    {"source": "pending"}
+(reused explanations are still filled in at upload: they cost nothing).
+GET /questions/{id} generates the explanation on first open, and the next few
+pending questions in the user's review order are generated in the background
+so they are usually ready by the time the student gets to them.
+"""
+
+import asyncio
+from typing import Any, Dict, Optional, Set
+
+from app.config import settings
+from app.services.azure_ai_service import azure_ai_service
+from app.services.explanation_reuse_service import generated_provenance
+from app.services.supabase_db_service import supabase_db
+
+
+def pending_provenance() -> Dict[str, Any]:
+    """Provenance marker for a question whose explanation is generated on first open"""
+    return {"source": "pending"}
+
+
+def is_pending(question: Dict[str, Any]) -> bool:
+    """Whether a question is waiting for its lazily generated explanation"""
+    provenance = (question.get("question_metadata") or {}).get("explanation") or {}
+    return not question.get("explanation") and provenance.get("source") == "pending"
+
+
+class LazyExplanationService:
+    """Generates pending explanations on open and prefetches the next ones"""
+
+    def __init__(self):
+        self._inflight: Dict[int, asyncio.Task] = {}  # Question id -> generation in progress
+        self._prefetches: Set[asyncio.Task] = set()
+        self.stats = {"generated": 0, "prefetched": 0, "failures": 0, "tokens": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return settings.EXPLANATION_MODE == "lazy"
+
+    async def ensure_explanation(self, question: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Generate a pending question's explanation (once, however many callers ask)
+
+        Returns:
+            The question with its explanation (unchanged if it was not pending)
+        """
+        if not is_pending(question):
+            return question
+
+        question_id = question["id"]
+        task = self._inflight.get(question_id)
+        if task is None:
+            task = asyncio.ensure_future(self._generate(question))
+            self._inflight[question_id] = task
+            task.add_done_callback(lambda _: self._inflight.pop(question_id, None))
+        # A client that disconnects does not cancel a generation others may share
+        return await asyncio.shield(task)
+
+    async def _generate(self, question: Dict[str, Any]) -> Dict[str, Any]:
+        # A failed generation raises, leaving the question pending for the next open
+        try:
+            explanation, tokens_used = await azure_ai_service.generate_explanation(
+                question.get("question_text"),
+                question.get("subject"),
+                question.get("grade")
+            )
+        except Exception:
+            self.stats["failures"] += 1
+            raise
+
+        metadata = dict(question.get("question_metadata") or {})
+        metadata["explanation"] = generated_provenance(tokens_used)
+        updated_question = await supabase_db.update_question(
+            question["id"],
+            explanation=explanation,
+            question_metadata=metadata
+        )
+        self.stats["generated"] += 1
+        self.stats["tokens"] += tokens_used.get("total_tokens", 0)
+
+        # Track token usage
+        try:
+            await supabase_db.add_token_usage(
+                user_id=question["user_id"],
+                prompt_tokens=tokens_used.get("prompt_tokens", 0),
+                completion_tokens=tokens_used.get("completion_tokens", 0),
+                total_tokens=tokens_used.get("total_tokens", 0)
+            )
+        except Exception as e:
+            print(f"Warning: Failed to track token usage: {e}")
+
+        # None if the question was deleted meanwhile
+        return updated_question or {**question, "explanation": explanation, "question_metadata": metadata}
+
+    def prefetch_after(self, question: Dict[str, Any]) -> None:
+        """Start generating, in the background, the next pending explanations after an opened question"""
+        if settings.EXPLANATION_PREFETCH_COUNT <= 0:
+            return
+        task = asyncio.ensure_future(self._prefetch(question))
+        self._prefetches.add(task)
+        task.add_done_callback(self._prefetches.discard)
+
+    async def _prefetch(self, opened: Dict[str, Any]) -> None:
+        # Review order is the order of GET /questions/wrong (newest first); understood
+        # questions are skipped as they are not reviewed
+        try:
+            upcoming = await supabase_db.get_pending_explanations_after(
+                opened["user_id"], opened["id"], settings.EXPLANATION_PREFETCH_COUNT
+            )
+        except Exception as e:
+            print(f"⚠️  Explanation prefetch failed: {e}")
+            return
+        if not upcoming:
+            return
+
+        async def prefetch(question: Dict[str, Any]) -> None:
+            try:
+                await self.ensure_explanation(question)
+                self.stats["prefetched"] += 1
+            except Exception as e:
+                print(f"⚠️  Explanation prefetch for question {question['id']} failed: {e}")
+
+        await asyncio.gather(*(prefetch(q) for q in upcoming))
+
+    async def stop(self) -> None:
+        """Cancel background prefetches (pending questions are generated on open later)"""
+        tasks = list(self._prefetches) + list(self._inflight.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Explanations generated on open or prefetched, failures and tokens spent"""
+        return {"mode": settings.EXPLANATION_MODE, **self.stats, "in_flight": len(self._inflight)}
+
+
+# Create a singleton instance
+lazy_explanations = LazyExplanationService()
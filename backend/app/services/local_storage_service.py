@@ -0,0 +1,174 @@
+"""
+Local Storage Service
+Filesystem implementation of StorageBackend
+Images are written under UPLOAD_DIR in content-addressed shard directories
+(ab/cd/<sha256>.ext) and served by the /uploads router (app/routers/uploads.py).
+Used with DB_BACKEND=sqlite, with STORAGE_BACKEND=local, and as the fallback
+when the bucket upload fails
+"""
+
+import asyncio
+import hashlib
+import hmac
+import os
+import tempfile
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional
+from urllib.parse import urlencode
+
+from app.config import settings
+from app.services.storage_backend import StorageBackend, content_digest, safe_relative_path, write_file_atomic
+
+
+class LocalStorageService(StorageBackend):
+    """Service for storing images on the local filesystem"""
+
+    def __init__(self, upload_dir: str = None, url_prefix: str = "/uploads/"):
+        self.upload_dir = upload_dir or settings.UPLOAD_DIR
+        self.url_prefix = url_prefix
+        os.makedirs(self.upload_dir, exist_ok=True)
+        self.enabled = True
+        print(f"✅ Local Storage Service initialized ({self.upload_dir})")
+
+    def _full_path(self, path: str) -> str:
+        """Map an object path to its file, refusing paths outside UPLOAD_DIR"""
+        return os.path.join(self.upload_dir, safe_relative_path(path))
+
+    def _write(self, full_path: str, file_data: bytes) -> None:
+        # Content-addressed files never change, so an existing file is already correct
+        try:
+            if os.path.getsize(full_path) == len(file_data):
+                return
+        except OSError:
+            pass
+        write_file_atomic(full_path, file_data)
+
+    def _read(self, full_path: str) -> bytes:
+        with open(full_path, "rb") as f:
+            return f.read()
+
+    async def upload_object(self, path: str, file_data: bytes, content_type: str) -> str:
+        """
+        Write bytes to a path under UPLOAD_DIR (atomically)
+
+        Returns:
+            URL path of the file (served from /uploads)
+        """
+        await asyncio.to_thread(self._write, self._full_path(path), file_data)
+        return self.object_url(path)
+
+    async def read_object(self, path: str) -> bytes:
+        """Read a file under UPLOAD_DIR"""
+        return await asyncio.to_thread(self._read, self._full_path(path))
+
+    async def delete_object(self, path: str) -> bool:
+        """Delete a file under UPLOAD_DIR"""
+        try:
+            await asyncio.to_thread(os.remove, self._full_path(path))
+            return True
+        except (OSError, ValueError) as e:
+            print(f"❌ Error deleting local image: {e}")
+            return False
+
+    def _remove_files(self, paths: List[str]) -> None:
+        for path in paths:
+            try:
+                os.remove(self._full_path(path))
+            except FileNotFoundError:
+                pass
+
+    async def delete_objects(self, paths: List[str]) -> None:
+        """Delete several files under UPLOAD_DIR in one worker thread"""
+        await asyncio.to_thread(self._remove_files, paths)
+
+    async def object_exists(self, path: str) -> bool:
+        return await asyncio.to_thread(os.path.isfile, self._full_path(path))
+
+    def _upload_signature(self, path: str, content_type: str, expires: int) -> str:
+        message = f"{path}\n{content_type}\n{expires}".encode("utf-8")
+        return hmac.new(settings.SECRET_KEY.encode("utf-8"), message, hashlib.sha256).hexdigest()
+
+    async def create_upload_url(self, path: str, content_type: str, expires_in: int) -> Dict[str, Any]:
+        """
+        Signed upload URL for one object, accepted by PUT /uploads/{path}
+
+        Stands in for the bucket's signed upload URLs: an HMAC (SECRET_KEY) of
+        the path, content type and expiry time.
+        """
+        expires = int(time.time()) + expires_in
+        query = urlencode({
+            "expires": expires,
+            "signature": self._upload_signature(path, content_type, expires)
+        })
+        return {
+            "url": f"{self.object_url(path)}?{query}",
+            "method": "PUT",
+            "headers": {"Content-Type": content_type},
+            "expires_in": expires_in
+        }
+
+    def verify_upload_signature(self, path: str, content_type: str, expires: int, signature: str) -> bool:
+        """Check a signed upload URL from create_upload_url"""
+        if expires < time.time():
+            return False
+        return hmac.compare_digest(self._upload_signature(path, content_type, expires), signature)
+
+    async def receive_upload(self, path: str, chunks: AsyncIterator[bytes], max_size: int) -> None:
+        """
+        Stream a direct upload to disk, atomically
+
+        The content hash is checked against the path while writing, so only
+        the exact bytes the path names can be stored there.
+
+        Raises:
+            ValueError: if the body is too large or does not match the path
+        """
+        full_path = self._full_path(path)
+        if await self.object_exists(path):
+            return  # Content-addressed: already stored with these exact bytes
+
+        expected = content_digest(path)
+        if expected is None:
+            raise ValueError("Direct uploads must use a content-addressed path")
+
+        directory = os.path.dirname(full_path)
+        await asyncio.to_thread(os.makedirs, directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with os.fdopen(fd, "wb") as f:
+                async for chunk in chunks:
+                    size += len(chunk)
+                    if size > max_size:
+                        raise ValueError(f"Upload exceeds {max_size} bytes")
+                    digest.update(chunk)
+                    await asyncio.to_thread(f.write, chunk)
+                await asyncio.to_thread(os.fsync, f.fileno())
+            if digest.hexdigest() != expected:
+                raise ValueError("Uploaded content does not match its sha256")
+            await asyncio.to_thread(os.replace, temp_path, full_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def object_url(self, path: str) -> str:
+        """URL path of a file under UPLOAD_DIR"""
+        return f"{self.url_prefix}{path}"
+
+    def object_path(self, url: str) -> Optional[str]:
+        """Object path of a /uploads URL"""
+        if not url.startswith(self.url_prefix):
+            return None
+        try:
+            return safe_relative_path(url[len(self.url_prefix):])
+        except ValueError:
+            return None
+
+    def local_file(self, path: str) -> Optional[str]:
+        """The file holding the object (it may not exist)"""
+        return self._full_path(path)
+
+
+# Create a singleton instance (also the fallback store when the bucket is unavailable)
+local_storage = LocalStorageService()
@@ -0,0 +1,331 @@
+"""
+Local Vector Service
+SQLite-backed stand-in for SupabaseService (question embeddings + similarity search)
+Embeddings are stored as float32 blobs; search is exact cosine top-K in process,
+from the shared per-user NumPy index once loaded
+Selected together with DB_BACKEND=sqlite
+"""
+
+import json
+import math
+import uuid
+from array import array
+from datetime import datetime
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+
+from app.config import settings
+from app.services.embedding_codec import normalize
+from app.services.embedding_model_service import embedding_models
+from app.services.sqlite_db_service import create_sqlite_connection
+from app.services.vector_index_service import vector_index
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS question_embeddings (
+    id TEXT PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    question_id INTEGER NOT NULL,
+    question_text TEXT NOT NULL,
+    subject TEXT,
+    grade TEXT,
+    embedding BLOB,
+    embedding_model TEXT,
+    metadata TEXT DEFAULT '{}',
+    created_at TEXT,
+    updated_at TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_question_embeddings_user_id ON question_embeddings(user_id);
+CREATE INDEX IF NOT EXISTS idx_question_embeddings_question_id ON question_embeddings(question_id);
+CREATE INDEX IF NOT EXISTS idx_question_embeddings_subject_grade ON question_embeddings(subject, grade);
+"""
+
+MODEL_INDEX = """
+CREATE INDEX IF NOT EXISTS idx_question_embeddings_model_user
+ON question_embeddings(embedding_model, user_id);
+"""
+
+
+def _pack(embedding: List[float]) -> bytes:
+    return array("f", embedding).tobytes()
+
+
+def _unpack(blob: Optional[bytes]) -> array:
+    vector = array("f")
+    if blob:
+        vector.frombytes(blob)
+    return vector
+
+
+def _cosine(a, b) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+class LocalVectorService:
+    """Vector store with the SupabaseService interface, backed by SQLite"""
+
+    def __init__(self):
+        self.db = create_sqlite_connection()
+        self.db.conn.executescript(SCHEMA)
+        self._add_model_column()
+        self.table_name = "question_embeddings"
+        self.enabled = True
+        print("✅ Local Vector Service initialized (SQLite)")
+
+    def _add_model_column(self) -> None:
+        """Tag embeddings stored before model versioning with the configured model"""
+        columns = [row[1] for row in self.db.conn.execute("PRAGMA table_info(question_embeddings)")]
+        if "embedding_model" not in columns:
+            self.db.conn.execute("ALTER TABLE question_embeddings ADD COLUMN embedding_model TEXT")
+        self.db.conn.execute(
+            "UPDATE question_embeddings SET embedding_model = ? WHERE embedding_model IS NULL",
+            (embedding_models.active_tag,)
+        )
+        self.db.conn.executescript(MODEL_INDEX)
+
+    async def create_embedding_table(self):
+        """Schema is created on startup"""
+        pass
+
+    async def store_question_embedding(
+        self,
+        user_id: int,
+        question_id: int,
+        question_text: str,
+        embedding: List[float],
+        subject: str,
+        grade: Optional[str] = None,
+        metadata: Optional[Dict[str, Any]] = None,
+        embedding_model: Optional[str] = None
+    ) -> str:
+        """Store question embedding, tagged with its model (default: the active model)"""
+        embedding_model = embedding_model or embedding_models.active_tag
+        vector_id = str(uuid.uuid4())
+        now = datetime.utcnow().isoformat()
+        await self.db.fetch(
+            """
+            INSERT INTO question_embeddings
+                (id, user_id, question_id, question_text, subject, grade, embedding, embedding_model,
+                 metadata, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (vector_id, user_id, question_id, question_text, subject, grade,
+             _pack(embedding), embedding_model, json.dumps(metadata or {}), now, now)
+        )
+        if embedding_model == embedding_models.active_tag:
+            vector_index.add(user_id, vector_id, embedding, question_id, subject, grade)
+        return vector_id
+
+    async def search_similar_questions(
+        self,
+        user_id: int,
+        query_embedding: List[float],
+        limit: int = 10,
+        subject: Optional[str] = None,
+        grade: Optional[str] = None,
+        embedding_model: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """Exact cosine top-K over the user's embeddings of one model (default: the active model)"""
+        embedding_model = embedding_model or embedding_models.active_tag
+        if embedding_model == embedding_models.active_tag:
+            index = vector_index.get(user_id)
+            if index is not None:
+                return await vector_index.search(index, query_embedding, limit, subject, grade, self._fetch_vectors)
+            vector_index.warm(user_id, self._load_user_vectors)
+
+        conditions = ["user_id = ?", "embedding_model = ?"]
+        params: List[Any] = [user_id, embedding_model]
+        if subject:
+            conditions.append("subject = ?")
+            params.append(subject)
+        if grade:
+            conditions.append("grade = ?")
+            params.append(grade)
+
+        rows = await self.db.fetch(
+            f"SELECT id, question_id, subject, grade, embedding FROM question_embeddings "
+            f"WHERE {' AND '.join(conditions)}",
+            tuple(params)
+        )
+
+        scored = [
+            {
+                "id": row["id"],
+                "question_id": row["question_id"],
+                "subject": row["subject"],
+                "grade": row["grade"],
+                "similarity": _cosine(query_embedding, _unpack(row["embedding"]))
+            }
+            for row in rows
+        ]
+        scored = [s for s in scored if s["similarity"] >= settings.VECTOR_MATCH_THRESHOLD]
+        scored.sort(key=lambda s: s["similarity"], reverse=True)
+        return scored[:limit]
+
+    async def find_nearest_question(
+        self,
+        query_embedding: List[float],
+        subject: str,
+        grade: Optional[str] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Find the closest existing question of any user in the same subject and grade
+        (compared on the active model's vectors)
+
+        Returns:
+            {"question_id", "similarity"} or None if there is no candidate
+        """
+        rows = await self.db.fetch(
+            "SELECT question_id, embedding FROM question_embeddings "
+            "WHERE subject = ? AND grade IS ? AND embedding_model = ?",
+            (subject, grade, embedding_models.active_tag)
+        )
+
+        query = normalize(query_embedding)
+        rows = [row for row in rows if row["embedding"] and len(row["embedding"]) == query.nbytes]
+        if not rows:
+            return None
+
+        matrix = np.frombuffer(b"".join(row["embedding"] for row in rows), dtype=np.float32).reshape(len(rows), -1)
+        norms = np.linalg.norm(matrix, axis=1)
+        scores = (matrix @ query) / np.where(norms > 0, norms, 1)
+        best = int(np.argmax(scores))
+        return {"question_id": rows[best]["question_id"], "similarity": float(scores[best])}
+
+    async def get_embedding_health(self, after_question_id: int = 0, limit: int = 1000) -> List[Dict[str, Any]]:
+        """
+        Page through stored embeddings with their size and whether they are all zeros
+
+        A page holds every embedding of its questions (a question's rows are
+        never split across pages), so the next page starts after the last row's question_id.
+
+        Args:
+            after_question_id: Return embeddings of questions with id > after_question_id
+            limit: Questions per page
+
+        Returns:
+            [{"id", "question_id", "embedding_model", "dims", "is_zero"}, ...] ordered by question_id
+        """
+        rows = await self.db.fetch(
+            "SELECT id, question_id, embedding_model, embedding FROM question_embeddings "
+            "WHERE question_id IN ("
+            "SELECT DISTINCT question_id FROM question_embeddings "
+            "WHERE question_id > ? ORDER BY question_id LIMIT ?"
+            ") ORDER BY question_id",
+            (after_question_id, limit)
+        )
+        health = []
+        for row in rows:
+            vector = _unpack(row["embedding"])
+            health.append({
+                "id": row["id"],
+                "question_id": row["question_id"],
+                "embedding_model": row["embedding_model"],
+                "dims": len(vector),
+                "is_zero": not any(vector)
+            })
+        return health
+
+    async def _load_user_vectors(self, user_id: int) -> List[Dict[str, Any]]:
+        """Fetch all of a user's active-model embeddings for the in-process index"""
+        rows = await self.db.fetch(
+            "SELECT id, question_id, subject, grade, embedding FROM question_embeddings "
+            "WHERE user_id = ? AND embedding_model = ?",
+            (user_id, embedding_models.active_tag)
+        )
+        return [{**row, "embedding": _unpack(row["embedding"])} for row in rows]
+
+    async def _fetch_vectors(self, vector_ids: List[str]) -> Dict[str, Any]:
+        """Fetch full-precision embeddings by id (rescoring quantized index hits)"""
+        rows = await self.db.fetch(
+            f"SELECT id, embedding FROM question_embeddings WHERE id IN ({', '.join('?' * len(vector_ids))})",
+            tuple(vector_ids)
+        )
+        return {row["id"]: _unpack(row["embedding"]) for row in rows}
+
+    async def delete_question_embedding(self, vector_id: str) -> bool:
+        """Delete a question embedding"""
+        try:
+            await self.db.fetch("DELETE FROM question_embeddings WHERE id = ?", (vector_id,))
+            vector_index.remove(vector_id)
+            return True
+        except Exception as e:
+            print(f"Error deleting embedding: {e}")
+            return False
+
+    async def delete_question_embeddings(self, question_id: int) -> bool:
+        """Delete every embedding of a question (all models)"""
+        try:
+            rows = await self.db.fetch("SELECT id FROM question_embeddings WHERE question_id = ?", (question_id,))
+            await self.db.fetch("DELETE FROM question_embeddings WHERE question_id = ?", (question_id,))
+            for row in rows:
+                vector_index.remove(row["id"])
+            return True
+        except Exception as e:
+            print(f"Error deleting embeddings: {e}")
+            return False
+
+    async def delete_embeddings_for_questions(self, question_ids: List[int]) -> int:
+        """
+        Delete every embedding of several questions in one statement (purge worker)
+
+        Raises on failure so the caller can retry.
+
+        Returns:
+            Embedding rows deleted
+        """
+        if not question_ids:
+            return 0
+        rows = await self.db.fetch(
+            f"DELETE FROM question_embeddings WHERE question_id IN ({', '.join('?' * len(question_ids))}) RETURNING id",
+            tuple(question_ids)
+        )
+        for row in rows:
+            vector_index.remove(row["id"])
+        return len(rows)
+
+    async def delete_embeddings_except(self, keep_models: List[str]) -> int:
+        """Delete embeddings of every model not in keep_models; returns rows deleted"""
+        rows = await self.db.fetch(
+            f"DELETE FROM question_embeddings WHERE embedding_model NOT IN ({', '.join('?' * len(keep_models))}) "
+            f"RETURNING id",
+            tuple(keep_models)
+        )
+        return len(rows)
+
+    async def update_question_embedding(
+        self,
+        vector_id: str,
+        question_text: Optional[str] = None,
+        embedding: Optional[List[float]] = None,
+        metadata: Optional[Dict[str, Any]] = None
+    ) -> bool:
+        """Update question embedding"""
+        try:
+            update_data = {}
+
+            if question_text:
+                update_data["question_text"] = question_text
+            if embedding:
+                update_data["embedding"] = _pack(embedding)
+            if metadata:
+                update_data["metadata"] = json.dumps(metadata)
+
+            if not update_data:
+                return True
+
+            update_data["updated_at"] = datetime.utcnow().isoformat()
+            names = sorted(update_data)
+            await self.db.fetch(
+                f"UPDATE question_embeddings SET {', '.join(f'{n} = ?' for n in names)} WHERE id = ?",
+                tuple(update_data[n] for n in names) + (vector_id,)
+            )
+            if embedding:
+                vector_index.update(vector_id, embedding)
+            return True
+        except Exception as e:
+            print(f"Error updating embedding: {e}")
+            return False
@@ -0,0 +1,954 @@
+"""
+Postgres Database Service
+Direct asyncpg backend with the same interface as SupabaseDBService
+Skips the PostgREST HTTP hop: pooled connections, prepared statements
+and real multi-statement transactions
+Selected with DB_BACKEND=postgres (connects to DATABASE_URL)
+"""
+
+import asyncio
+import json
+import uuid
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Optional, List, Dict, Any, Tuple
+
+import asyncpg
+
+from app.config import settings
+from app.services.db_service_base import (
+    DBServiceBase,
+    USER_LIST_COLUMNS,
+    decode_cursor,
+    page_result,
+    user_sort_column
+)
+from app.services.user_version_service import user_versions
+
+# Columns that may be written through the **kwargs update methods
+USER_COLUMNS = {
+    "email", "name", "google_id", "grade", "profile_picture", "is_admin",
+    "total_tokens_used", "prompt_tokens_used", "completion_tokens_used", "last_token_update"
+}
+QUESTION_COLUMNS = {
+    "subject", "grade", "question_text", "image_url", "image_snippet_url",
+    "image_thumbnail_url", "image_review_url",
+    "explanation", "status", "vector_id", "question_metadata"
+}
+UPLOAD_HISTORY_COLUMNS = {
+    "filename", "subject", "questions_extracted", "status", "error_message",
+    "pages_total", "pages_analyzed", "prompt_tokens", "completion_tokens", "total_tokens"
+}
+TIMESTAMP_COLUMNS = {"created_at", "updated_at", "last_token_update"}
+
+# Delete questions matching {where} and queue their embeddings and image
+# references for the purge worker, in one statement
+QUEUE_PURGE_SQL = """
+    WITH gone AS (
+        DELETE FROM study_questions WHERE {where}
+        RETURNING id, user_id, image_url, image_snippet_url, image_thumbnail_url, image_review_url
+    ), queued AS (
+        INSERT INTO study_purge_queue (question_id, user_id, image_urls)
+        SELECT id, user_id, array_remove(ARRAY[image_url, image_snippet_url, image_thumbnail_url, image_review_url], NULL)
+        FROM gone
+    )
+    SELECT id FROM gone
+"""
+
+# Concurrent clicks skip rows another click is serving, so they get different items
+TAKE_PRACTICE_SQL = """
+    WITH taken AS (
+        UPDATE study_practice_questions SET served_count = served_count + 1, last_served_at = now()
+        WHERE id IN (
+            SELECT id FROM study_practice_questions WHERE question_id = $1
+            ORDER BY served_count, last_served_at NULLS FIRST, id LIMIT $2
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING *
+    ), pool AS (
+        -- Counted before the update (same snapshot): unseen drops by the rows served first now
+        SELECT count(*) AS size, count(*) FILTER (WHERE served_count = 0) AS unseen
+        FROM study_practice_questions WHERE question_id = $1
+    )
+    SELECT taken.*, pool.size AS pool_size,
+           pool.unseen - (SELECT count(*) FROM taken WHERE served_count = 1) AS pool_unseen
+    FROM taken, pool
+"""
+
+# Connection owned by the current task's transaction, if any
+_tx_connection: ContextVar[Optional[asyncpg.Connection]] = ContextVar("_tx_connection", default=None)
+
+
+def _row_to_dict(record: asyncpg.Record) -> Dict[str, Any]:
+    """Convert a record to the JSON-shaped dict PostgREST would return"""
+    row = {}
+    for key, value in record.items():
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        elif isinstance(value, uuid.UUID):
+            value = str(value)
+        row[key] = value
+    return row
+
+
+def _coerce(column: str, value: Any) -> Any:
+    """Convert ISO timestamp strings (as used by the PostgREST backend) to datetimes"""
+    if column in TIMESTAMP_COLUMNS and isinstance(value, str):
+        return datetime.fromisoformat(value)
+    return value
+
+
+class PostgresDBService(DBServiceBase):
+    """Database service talking to Postgres directly through an asyncpg pool"""
+
+    def __init__(self, dsn: str):
+        """Configure the pool; connections are opened lazily on first use"""
+        super().__init__()
+        # Accept SQLAlchemy-style URLs such as postgresql+asyncpg://
+        self.dsn = dsn.replace("postgresql+asyncpg://", "postgresql://")
+        self.pool: Optional[asyncpg.Pool] = None
+        self._pool_lock = asyncio.Lock()
+        self.enabled = True
+        print("✅ Postgres Database Service configured (asyncpg)")
+
+    # ==================== CONNECTION HANDLING ====================
+
+    async def _init_connection(self, conn: asyncpg.Connection) -> None:
+        """Decode JSON columns to Python objects, like PostgREST does"""
+        for type_name in ("json", "jsonb"):
+            await conn.set_type_codec(
+                type_name,
+                encoder=json.dumps,
+                decoder=json.loads,
+                schema="pg_catalog"
+            )
+
+    async def _get_pool(self) -> asyncpg.Pool:
+        """Create the connection pool on first use"""
+        if self.pool is None:
+            async with self._pool_lock:
+                if self.pool is None:
+                    # Every method uses constant SQL text, so asyncpg's per-connection
+                    # statement cache serves each query as a prepared statement.
+                    # Set DATABASE_STATEMENT_CACHE_SIZE=0 behind pgbouncer in transaction mode.
+                    self.pool = await asyncpg.create_pool(
+                        self.dsn,
+                        min_size=settings.DATABASE_POOL_MIN_SIZE,
+                        max_size=settings.DATABASE_POOL_MAX_SIZE,
+                        statement_cache_size=settings.DATABASE_STATEMENT_CACHE_SIZE,
+                        init=self._init_connection
+                    )
+        return self.pool
+
+    @asynccontextmanager
+    async def _connection(self):
+        """Yield the current transaction's connection, or one from the pool"""
+        conn = _tx_connection.get()
+        if conn is not None:
+            yield conn
+            return
+
+        pool = await self._get_pool()
+        async with pool.acquire() as conn:
+            yield conn
+
+    @asynccontextmanager
+    async def transaction(self):
+        """
+        Run every database call in the block inside one transaction
+
+        Nested blocks become savepoints. Calls inside the block bypass single-flight
+        so they always see the transaction's own writes.
+        """
+        conn = _tx_connection.get()
+        if conn is not None:
+            async with conn.transaction():
+                yield conn
+            return
+
+        pool = await self._get_pool()
+        async with pool.acquire() as conn:
+            async with conn.transaction():
+                token = _tx_connection.set(conn)
+                try:
+                    yield conn
+                finally:
+                    _tx_connection.reset(token)
+
+    async def close(self) -> None:
+        """Close the connection pool"""
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+
+    async def _fetch(self, sql: str, *args) -> List[Dict[str, Any]]:
+        async with self._connection() as conn:
+            records = await conn.fetch(sql, *args)
+        return [_row_to_dict(r) for r in records]
+
+    async def _read(self, key: tuple, sql: str, *args) -> List[Dict[str, Any]]:
+        """Run a read, coalescing identical concurrent reads outside transactions"""
+        if _tx_connection.get() is not None:
+            return await self._fetch(sql, *args)
+        return await self._singleflight(key, lambda: self._fetch(sql, *args))
+
+    @staticmethod
+    def _assignments(columns: set, values: Dict[str, Any], first_param: int) -> tuple:
+        """Build a SET clause for whitelisted columns; returns (clause, params)"""
+        unknown = set(values) - columns - {"updated_at"}
+        if unknown:
+            raise ValueError(f"Unknown columns: {', '.join(sorted(unknown))}")
+
+        names = sorted(k for k in values if k != "updated_at")
+        clause = [f"{name} = ${i}" for i, name in enumerate(names, start=first_param)]
+        return clause, [_coerce(name, values[name]) for name in names]
+
+    # ==================== USER OPERATIONS ====================
+
+    async def create_user(self, email: str, name: str, google_id: str,
+                         profile_picture: Optional[str] = None,
+                         grade: Optional[str] = None,
+                         is_admin: bool = False) -> Dict[str, Any]:
+        """Create a new user"""
+        rows = await self._fetch(
+            """
+            INSERT INTO study_users (email, name, google_id, profile_picture, grade, is_admin, created_at, updated_at)
+            VALUES ($1, $2, $3, $4, $5, $6, now(), now())
+            RETURNING *
+            """,
+            email, name, google_id, profile_picture, grade, is_admin
+        )
+        if rows:
+            user_versions.bump(rows[0]["id"])  # Lookups by email / Google ID must see the new user
+        return rows[0] if rows else None
+
+    async def get_user_by_id(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """Get user by ID"""
+        key = ("get_user_by_id", user_id, user_versions.get_version(user_id)[0])
+        rows = await self._read(key, "SELECT * FROM study_users WHERE id = $1", user_id)
+        return rows[0] if rows else None
+
+    async def get_user_by_email(self, email: str) -> Optional[Dict[str, Any]]:
+        """Get user by email"""
+        key = ("get_user_by_email", email, user_versions.get_write_count())
+        rows = await self._read(key, "SELECT * FROM study_users WHERE email = $1", email)
+        return rows[0] if rows else None
+
+    async def get_user_by_google_id(self, google_id: str) -> Optional[Dict[str, Any]]:
+        """Get user by Google ID"""
+        key = ("get_user_by_google_id", google_id, user_versions.get_write_count())
+        rows = await self._read(key, "SELECT * FROM study_users WHERE google_id = $1", google_id)
+        return rows[0] if rows else None
+
+    async def update_user(self, user_id: int, **kwargs) -> Dict[str, Any]:
+        """Update user fields"""
+        clause, params = self._assignments(USER_COLUMNS, kwargs, first_param=2)
+        clause.append("updated_at = now()")
+
+        rows = await self._fetch(
+            f"UPDATE study_users SET {', '.join(clause)} WHERE id = $1 RETURNING *",
+            user_id, *params
+        )
+
+        user_versions.bump(user_id)
+        return rows[0] if rows else None
+
+    async def add_token_usage(self, user_id: int, prompt_tokens: int,
+                             completion_tokens: int, total_tokens: int) -> Dict[str, Any]:
+        """
+        Add token usage to user's total
+
+        Increments in a single statement, so concurrent uploads never lose updates.
+        """
+        rows = await self._fetch(
+            """
+            UPDATE study_users SET
+                total_tokens_used = COALESCE(total_tokens_used, 0) + $2,
+                prompt_tokens_used = COALESCE(prompt_tokens_used, 0) + $3,
+                completion_tokens_used = COALESCE(completion_tokens_used, 0) + $4,
+                last_token_update = now(),
+                updated_at = now()
+            WHERE id = $1
+            RETURNING *
+            """,
+            user_id, total_tokens, prompt_tokens, completion_tokens
+        )
+        if not rows:
+            raise ValueError(f"User {user_id} not found")
+
+        user_versions.bump(user_id)
+        return rows[0]
+
+    async def get_all_users_token_usage(self, limit: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Get system-wide token usage across all users
+
+        Args:
+            limit: Only return the top-K users by usage (all users if None)
+
+        Returns:
+            Dict with total_tokens, total_prompt_tokens, total_completion_tokens,
+            total_users and users (highest usage first)
+        """
+        totals = await self._fetch(
+            """
+            SELECT count(*) AS total_users,
+                   COALESCE(sum(total_tokens_used), 0) AS total_tokens,
+                   COALESCE(sum(prompt_tokens_used), 0) AS total_prompt_tokens,
+                   COALESCE(sum(completion_tokens_used), 0) AS total_completion_tokens
+            FROM study_users
+            """
+        )
+        users_data = await self._fetch(
+            """
+            SELECT id, email, name,
+                   COALESCE(total_tokens_used, 0) AS total_tokens_used,
+                   COALESCE(prompt_tokens_used, 0) AS prompt_tokens_used,
+                   COALESCE(completion_tokens_used, 0) AS completion_tokens_used,
+                   last_token_update
+            FROM study_users
+            ORDER BY total_tokens_used DESC, id DESC
+            LIMIT $1
+            """,
+            limit
+        )
+
+        users_list = [
+            {
+                'user_id': user['id'],
+                'email': user['email'],
+                'name': user['name'],
+                'total_tokens_used': user['total_tokens_used'],
+                'prompt_tokens_used': user['prompt_tokens_used'],
+                'completion_tokens_used': user['completion_tokens_used'],
+                'last_token_update': user['last_token_update']
+            }
+            for user in users_data
+        ]
+
+        return {
+            'total_tokens': totals[0]['total_tokens'],
+            'total_prompt_tokens': totals[0]['total_prompt_tokens'],
+            'total_completion_tokens': totals[0]['total_completion_tokens'],
+            'total_users': totals[0]['total_users'],
+            'users': users_list
+        }
+
+    async def delete_user(self, user_id: int) -> bool:
+        """
+        Delete user together with their questions and upload history
+
+        The questions' embeddings and images are queued for the purge worker.
+        """
+        async with self.transaction():
+            await self._fetch("DELETE FROM study_upload_history WHERE user_id = $1", user_id)
+            await self._fetch(QUEUE_PURGE_SQL.format(where="user_id = $1"), user_id)
+            rows = await self._fetch("DELETE FROM study_users WHERE id = $1 RETURNING id", user_id)
+
+        user_versions.bump(user_id)
+        return len(rows) > 0
+
+    async def get_all_users(self) -> List[Dict[str, Any]]:
+        """Get all users (admin only)"""
+        return await self._fetch(
+            "SELECT id, email, name, grade, is_admin, created_at FROM study_users ORDER BY created_at DESC"
+        )
+
+    async def get_users_page(
+        self,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        sort: str = "created_at",
+        search: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Get one page of users (admin only), sorted and filtered server-side
+
+        Args:
+            limit: Page size
+            cursor: next_cursor from the previous page
+            sort: "created_at" (newest first) or "tokens" (highest usage first)
+            search: Case-insensitive email or name prefix
+
+        Returns:
+            Dict with users and next_cursor (None on the last page)
+        """
+        column = user_sort_column(sort)
+        conditions = []
+        params: List[Any] = []
+
+        if search:
+            escaped = search.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            params.append(escaped + "%")
+            conditions.append(f"(email ILIKE ${len(params)} OR name ILIKE ${len(params)})")
+
+        if cursor:
+            value, last_id = decode_cursor(cursor)
+            params.extend([_coerce(column, value), last_id])
+            conditions.append(f"({column}, id) < (${len(params) - 1}, ${len(params)})")
+
+        params.append(limit + 1)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        rows = await self._fetch(
+            f"SELECT {USER_LIST_COLUMNS} FROM study_users {where} "
+            f"ORDER BY {column} DESC, id DESC LIMIT ${len(params)}",
+            *params
+        )
+        return page_result(rows, limit, column)
+
+    # ==================== QUESTION OPERATIONS ====================
+
+    async def create_question(
+        self,
+        user_id: int,
+        subject: str,
+        question_text: str,
+        grade: Optional[str] = None,
+        image_url: Optional[str] = None,
+        image_snippet_url: Optional[str] = None,
+        image_thumbnail_url: Optional[str] = None,
+        image_review_url: Optional[str] = None,
+        explanation: Optional[str] = None,
+        status: str = "pending",
+        vector_id: Optional[str] = None,
+        question_metadata: Optional[Dict] = None
+    ) -> Dict[str, Any]:
+        """Create a new question"""
+        rows = await self._fetch(
+            """
+            INSERT INTO study_questions (
+                user_id, subject, question_text, grade, image_url, image_snippet_url,
+                image_thumbnail_url, image_review_url,
+                explanation, status, vector_id, question_metadata, created_at, updated_at
+            )
+            VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, now(), now())
+            RETURNING *
+            """,
+            user_id, subject, question_text, grade, image_url, image_snippet_url,
+            image_thumbnail_url, image_review_url,
+            explanation, status, vector_id, question_metadata or {}
+        )
+
+        user_versions.bump(user_id)
+        return rows[0] if rows else None
+
+    async def get_question_by_id(self, question_id: int) -> Optional[Dict[str, Any]]:
+        """Get question by ID"""
+        key = ("get_question_by_id", question_id, user_versions.get_write_count())
+        rows = await self._read(key, "SELECT * FROM study_questions WHERE id = $1", question_id)
+        return rows[0] if rows else None
+
+    async def get_questions_by_ids(
+        self,
+        question_ids: List[int],
+        user_id: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Get several questions in one round trip
+
+        Args:
+            question_ids: IDs to fetch; the result keeps this order (e.g. search ranking)
+            user_id: If given, only questions owned by this user are returned
+
+        Returns:
+            Questions found, ordered like question_ids
+        """
+        ids = list(dict.fromkeys(question_ids))
+        if not ids:
+            return []
+
+        if user_id is not None:
+            sql = "SELECT * FROM study_questions WHERE id = ANY($1::int[]) AND user_id = $2"
+            params = [ids, user_id]
+        else:
+            sql = "SELECT * FROM study_questions WHERE id = ANY($1::int[])"
+            params = [ids]
+
+        key = ("get_questions_by_ids", tuple(ids), user_id,
+               user_versions.get_version(user_id)[0] if user_id is not None else user_versions.get_write_count())
+        rows = await self._read(key, sql, *params)
+        return self._order_by_ids(rows, ids)
+
+    async def get_questions_by_user(
+        self,
+        user_id: int,
+        status: Optional[str] = None,
+        subject: Optional[str] = None,
+        grade: Optional[str] = None,
+        limit: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """Get all questions for a user with optional filters"""
+        # One statement text per filter combination keeps every variant cacheable
+        conditions = ["user_id = $1"]
+        params: List[Any] = [user_id]
+        for column, value in (("status", status), ("subject", subject), ("grade", grade)):
+            if value:
+                params.append(value)
+                conditions.append(f"{column} = ${len(params)}")
+
+        sql = f"SELECT * FROM study_questions WHERE {' AND '.join(conditions)} ORDER BY created_at DESC"
+        if limit:
+            params.append(limit)
+            sql += f" LIMIT ${len(params)}"
+
+        key = ("get_questions_by_user", user_id, status, subject, grade, limit,
+               user_versions.get_version(user_id)[0])
+        return await self._read(key, sql, *params)
+
+    async def get_pending_explanations_after(
+        self,
+        user_id: int,
+        after_question_id: int,
+        limit: int
+    ) -> List[Dict[str, Any]]:
+        """
+        Next questions waiting for a lazily generated explanation, in review order
+        (GET /questions/wrong: newest first) after a given question
+
+        Args:
+            user_id: Owner of the questions
+            after_question_id: The question the student opened
+            limit: Largest number of questions returned
+
+        Returns:
+            Pending questions not marked understood, older than the opened one
+        """
+        return await self._fetch(
+            """
+            SELECT * FROM study_questions
+            WHERE user_id = $1 AND explanation IS NULL AND status <> 'understood'
+              AND question_metadata->'explanation'->>'source' = 'pending'
+              AND (created_at, id) < (SELECT created_at, id FROM study_questions WHERE id = $2)
+            ORDER BY created_at DESC, id DESC
+            LIMIT $3
+            """,
+            user_id, after_question_id, limit
+        )
+
+    async def update_question(self, question_id: int, **kwargs) -> Dict[str, Any]:
+        """Update question fields"""
+        clause, params = self._assignments(QUESTION_COLUMNS, kwargs, first_param=2)
+        clause.append("updated_at = now()")
+
+        rows = await self._fetch(
+            f"UPDATE study_questions SET {', '.join(clause)} WHERE id = $1 RETURNING *",
+            question_id, *params
+        )
+
+        self._bump_owners(rows)
+        return rows[0] if rows else None
+
+    async def update_questions(
+        self,
+        user_id: int,
+        question_ids: List[int],
+        full_rows: bool = True,
+        explanation_provenance: Optional[Dict[str, Any]] = None,
+        **kwargs
+    ) -> List[Dict[str, Any]]:
+        """
+        Update the same fields on several of a user's questions in one statement
+
+        Ownership is part of the statement's filter, so no per-question lookup is needed.
+
+        Args:
+            user_id: Owner; questions of other users are not touched
+            question_ids: Questions to update
+            full_rows: Return whole rows (False: only id and user_id)
+            explanation_provenance: Set as question_metadata["explanation"] of every
+                updated row in the same statement (the rest of its metadata is kept)
+            **kwargs: Columns to set
+
+        Returns:
+            Updated rows (IDs not found or not owned are absent)
+        """
+        clause, params = self._assignments(QUESTION_COLUMNS, kwargs, first_param=3)
+        if not question_ids:
+            return []
+        if explanation_provenance is not None:
+            clause.append(
+                f"question_metadata = jsonb_set(COALESCE(question_metadata, '{{}}'::jsonb), "
+                f"'{{explanation}}', ${len(params) + 3}::jsonb)"
+            )
+            params.append(explanation_provenance)
+        clause.append("updated_at = now()")
+
+        rows = await self._fetch(
+            f"UPDATE study_questions SET {', '.join(clause)} "
+            f"WHERE user_id = $1 AND id = ANY($2::int[]) "
+            f"RETURNING {'*' if full_rows else 'id, user_id'}",
+            user_id, list(question_ids), *params
+        )
+
+        if rows:
+            user_versions.bump(user_id)
+        return rows
+
+    async def delete_question(self, question_id: int) -> bool:
+        """Delete question"""
+        rows = await self._fetch(
+            "DELETE FROM study_questions WHERE id = $1 RETURNING id, user_id", question_id
+        )
+
+        self._bump_owners(rows)
+        return len(rows) > 0
+
+    async def delete_questions(self, user_id: int, question_ids: List[int]) -> List[int]:
+        """
+        Delete several of a user's questions in one statement
+
+        Their embeddings and image references are queued for the purge worker
+        in the same statement, so the rows disappear immediately and nothing is
+        left orphaned.
+
+        Returns:
+            IDs deleted (IDs not found or not owned by the user are skipped)
+        """
+        rows = await self._fetch(
+            QUEUE_PURGE_SQL.format(where="user_id = $1 AND id = ANY($2::int[])"),
+            user_id, list(question_ids)
+        )
+
+        if rows:
+            user_versions.bump(user_id)
+        return [row["id"] for row in rows]
+
+    async def count_questions_by_user(self, user_id: int, status: Optional[str] = None) -> int:
+        """Count questions for a user"""
+        if status:
+            sql, params = "SELECT count(*) AS n FROM study_questions WHERE user_id = $1 AND status = $2", [user_id, status]
+        else:
+            sql, params = "SELECT count(*) AS n FROM study_questions WHERE user_id = $1", [user_id]
+
+        key = ("count_questions_by_user", user_id, status, user_versions.get_version(user_id)[0])
+        rows = await self._read(key, sql, *params)
+        return rows[0]["n"] if rows else 0
+
+    async def search_question_ids(self, user_id: int, query: str, limit: int = 20) -> List[int]:
+        """
+        Full-text search over the user's question text
+
+        Any query term may match; questions matching more (and rarer) terms rank higher.
+
+        Returns:
+            Matching question IDs, best match first
+        """
+        # Same query as the search_question_ids SQL function (migrations/add_question_fulltext_search.sql)
+        sql = """
+            WITH q AS (
+                SELECT nullif(replace(plainto_tsquery('simple', $2)::text, ' & ', ' | '), '')::tsquery AS query
+            )
+            SELECT s.id, ts_rank_cd(to_tsvector('simple', s.question_text), q.query) AS rank
+            FROM study_questions s, q
+            WHERE s.user_id = $1
+              AND to_tsvector('simple', s.question_text) @@ q.query
+            ORDER BY rank DESC, s.id DESC
+            LIMIT $3
+        """
+
+        key = ("search_question_ids", user_id, query, limit, user_versions.get_version(user_id)[0])
+        rows = await self._read(key, sql, user_id, query, limit)
+        return [row["id"] for row in rows]
+
+    async def get_questions_batch(self, after_id: int = 0, limit: int = 500) -> List[Dict[str, Any]]:
+        """
+        Page through all users' questions in id order (maintenance jobs)
+
+        Args:
+            after_id: Return questions with id > after_id
+            limit: Page size
+
+        Returns:
+            Questions (id, user_id, subject, grade, question_text, vector_id), ascending id
+        """
+        return await self._fetch(
+            "SELECT id, user_id, subject, grade, question_text, vector_id FROM study_questions WHERE id > $1 ORDER BY id LIMIT $2",
+            after_id, limit
+        )
+
+    # ==================== IMAGE REFERENCES ====================
+
+    async def acquire_image_refs(self, counts: Dict[str, int]) -> Dict[str, int]:
+        """
+        Add references to stored images
+
+        Args:
+            counts: {image_url: references to add}
+
+        Returns:
+            {image_url: reference count after adding}; a count equal to the
+            number added means the image was not stored before
+        """
+        urls = list(counts)
+        rows = await self._fetch(
+            """
+            INSERT INTO study_image_refs (url, ref_count, created_at)
+            SELECT url, n, NOW() FROM unnest($1::text[], $2::int[]) AS added(url, n)
+            ON CONFLICT (url) DO UPDATE SET ref_count = study_image_refs.ref_count + EXCLUDED.ref_count
+            RETURNING url, ref_count
+            """,
+            urls, [counts[url] for url in urls]
+        )
+        return {row["url"]: row["ref_count"] for row in rows}
+
+    async def release_image_refs(self, counts: Dict[str, int]) -> List[str]:
+        """
+        Drop references to stored images
+
+        Args:
+            counts: {image_url: references to drop}
+
+        Returns:
+            URLs whose last reference went (their rows are deleted; the caller
+            deletes the objects). URLs without a reference row are ignored
+        """
+        urls = list(counts)
+        async with self.transaction():
+            updated = await self._fetch(
+                """
+                UPDATE study_image_refs r SET ref_count = r.ref_count - dropped.n
+                FROM unnest($1::text[], $2::int[]) AS dropped(url, n)
+                WHERE r.url = dropped.url
+                RETURNING r.url, r.ref_count
+                """,
+                urls, [counts[url] for url in urls]
+            )
+            rows = await self._fetch(
+                "DELETE FROM study_image_refs WHERE url = ANY($1::text[]) AND ref_count <= 0 RETURNING url",
+                [row["url"] for row in updated if row["ref_count"] <= 0]
+            )
+        return [row["url"] for row in rows]
+
+    # ==================== PURGE QUEUE ====================
+
+    async def enqueue_image_purge(self, image_urls: List[str]) -> None:
+        """Queue unreferenced images whose deletion failed, for the purge worker to retry"""
+        await self._fetch(
+            "INSERT INTO study_purge_queue (image_urls, refs_released) VALUES ($1::text[], TRUE)",
+            list(image_urls)
+        )
+
+    async def get_purge_batch(self, limit: int) -> List[Dict[str, Any]]:
+        """Queue entries due for an attempt, oldest first"""
+        return await self._fetch(
+            """
+            SELECT id, question_id, user_id, image_urls, refs_released, attempts
+            FROM study_purge_queue WHERE next_attempt_at <= NOW() ORDER BY id LIMIT $1
+            """,
+            limit
+        )
+
+    async def release_purge_refs(self, entry_ids: List[int]) -> List[str]:
+        """
+        Drop the image references of queue entries, once per entry
+
+        Each entry is left listing only its images whose last reference went,
+        so a retried entry never drops references twice.
+
+        Returns:
+            Images of the entries left unreferenced (the caller deletes them)
+        """
+        async with self.transaction():
+            await self._fetch(
+                """
+                UPDATE study_image_refs r SET ref_count = r.ref_count - dropped.n
+                FROM (
+                    SELECT u AS url, count(*) AS n
+                    FROM study_purge_queue q, unnest(q.image_urls) AS u
+                    WHERE q.id = ANY($1::int[]) AND NOT q.refs_released
+                    GROUP BY u
+                ) dropped
+                WHERE r.url = dropped.url
+                """,
+                entry_ids
+            )
+            await self._fetch(
+                """
+                UPDATE study_purge_queue q
+                SET refs_released = TRUE,
+                    image_urls = ARRAY(
+                        SELECT u FROM unnest(q.image_urls) AS u
+                        WHERE EXISTS (SELECT 1 FROM study_image_refs r WHERE r.url = u AND r.ref_count <= 0)
+                    )
+                WHERE q.id = ANY($1::int[]) AND NOT q.refs_released
+                """,
+                entry_ids
+            )
+            await self._fetch(
+                """
+                DELETE FROM study_image_refs
+                WHERE ref_count <= 0
+                  AND url IN (SELECT unnest(image_urls) FROM study_purge_queue WHERE id = ANY($1::int[]))
+                """,
+                entry_ids
+            )
+            rows = await self._fetch(
+                "SELECT DISTINCT unnest(image_urls) AS url FROM study_purge_queue WHERE id = ANY($1::int[])",
+                entry_ids
+            )
+        return [row["url"] for row in rows]
+
+    async def finish_purge(self, entry_ids: List[int]) -> None:
+        """Remove completed entries from the queue"""
+        await self._fetch("DELETE FROM study_purge_queue WHERE id = ANY($1::int[])", entry_ids)
+
+    async def retry_purge(self, entry_ids: List[int], error: str, base_seconds: int, max_seconds: int) -> None:
+        """Schedule another attempt with exponential backoff (base * 2^attempts, capped)"""
+        await self._fetch(
+            """
+            UPDATE study_purge_queue
+            SET attempts = attempts + 1,
+                last_error = $2,
+                next_attempt_at = NOW() + LEAST($4, $3 * power(2, LEAST(attempts, 20))) * interval '1 second'
+            WHERE id = ANY($1::int[])
+            """,
+            entry_ids, error, base_seconds, max_seconds
+        )
+
+    async def get_purge_stats(self) -> Dict[str, int]:
+        """Queue length and entries that have failed at least once"""
+        rows = await self._fetch(
+            "SELECT count(*) AS queued, count(*) FILTER (WHERE attempts > 0) AS retrying FROM study_purge_queue"
+        )
+        return rows[0]
+
+    # ==================== PRACTICE POOLS ====================
+
+    async def add_practice_questions(self, question_id: int, practice: List[Dict[str, str]]) -> int:
+        """
+        Add generated practice questions to a question's pool, skipping ones already in it
+
+        Args:
+            question_id: Question the practice questions are for
+            practice: [{"question_text", "text_key"}]; text_key (normalized text) is unique per pool
+
+        Returns:
+            Number of practice questions added
+        """
+        if not practice:
+            return 0
+        rows = await self._fetch(
+            """
+            INSERT INTO study_practice_questions (question_id, question_text, text_key)
+            SELECT $1, p.question_text, p.text_key
+            FROM unnest($2::text[], $3::text[]) AS p(question_text, text_key)
+            ON CONFLICT (question_id, text_key) DO NOTHING
+            RETURNING id
+            """,
+            question_id,
+            [item["question_text"] for item in practice],
+            [item["text_key"] for item in practice]
+        )
+        return len(rows)
+
+    async def get_practice_questions(self, question_id: int) -> List[Dict[str, Any]]:
+        """A question's whole practice pool, oldest first"""
+        return await self._fetch(
+            "SELECT * FROM study_practice_questions WHERE question_id = $1 ORDER BY id", question_id
+        )
+
+    async def count_practice_questions(self, question_id: int) -> int:
+        """Size of a question's practice pool"""
+        rows = await self._fetch(
+            "SELECT count(*) AS n FROM study_practice_questions WHERE question_id = $1", question_id
+        )
+        return rows[0]["n"]
+
+    async def take_practice_questions(self, question_id: int, limit: int) -> Tuple[List[Dict[str, Any]], Dict[str, int]]:
+        """
+        Serve practice questions from a pool, least served first, counting them as served
+
+        Returns:
+            Tuple of (up to limit practice questions, the pool's unseen ones first;
+            {"size", "unseen"} of the pool after this take)
+        """
+        rows = await self._fetch(TAKE_PRACTICE_SQL, question_id, limit)
+        return self._split_pool_counts(rows)
+
+    # ==================== APP CONFIG ====================
+
+    async def get_app_config(self, key: str) -> Optional[Any]:
+        """Get a JSON config value shared by all app processes (None if unset)"""
+        rows = await self._fetch("SELECT value FROM study_app_config WHERE key = $1", key)
+        return rows[0]["value"] if rows else None
+
+    async def set_app_config(self, key: str, value: Any) -> None:
+        """Set a JSON config value in a single-row write"""
+        await self._fetch(
+            """
+            INSERT INTO study_app_config (key, value, updated_at) VALUES ($1, $2, NOW())
+            ON CONFLICT (key) DO UPDATE SET value = EXCLUDED.value, updated_at = EXCLUDED.updated_at
+            """,
+            key, value
+        )
+
+    # ==================== UPLOAD HISTORY OPERATIONS ====================
+
+    async def create_upload_history(
+        self,
+        user_id: int,
+        filename: str,
+        subject: Optional[str] = None,
+        questions_extracted: int = 0,
+        status: str = "processing",
+        error_message: Optional[str] = None,
+        pages_total: int = 1
+    ) -> Dict[str, Any]:
+        """Create upload history record"""
+        rows = await self._fetch(
+            """
+            INSERT INTO study_upload_history
+                (user_id, filename, subject, questions_extracted, status, error_message, pages_total, created_at)
+            VALUES ($1, $2, $3, $4, $5, $6, $7, now())
+            RETURNING *
+            """,
+            user_id, filename, subject, questions_extracted, status, error_message, pages_total
+        )
+
+        user_versions.bump(user_id)
+        return rows[0] if rows else None
+
+    async def get_upload_history_by_id(self, upload_id: int) -> Optional[Dict[str, Any]]:
+        """Get upload history by ID"""
+        rows = await self._fetch("SELECT * FROM study_upload_history WHERE id = $1", upload_id)
+        return rows[0] if rows else None
+
+    async def get_upload_history_by_user(
+        self,
+        user_id: int,
+        limit: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """Get upload history for a user"""
+        if limit:
+            sql, params = ("SELECT * FROM study_upload_history WHERE user_id = $1 "
+                           "ORDER BY created_at DESC LIMIT $2"), [user_id, limit]
+        else:
+            sql, params = ("SELECT * FROM study_upload_history WHERE user_id = $1 "
+                           "ORDER BY created_at DESC"), [user_id]
+
+        key = ("get_upload_history_by_user", user_id, limit, user_versions.get_version(user_id)[0])
+        return await self._read(key, sql, *params)
+
+    async def update_upload_history(self, upload_id: int, **kwargs) -> Dict[str, Any]:
+        """Update upload history fields"""
+        clause, params = self._assignments(UPLOAD_HISTORY_COLUMNS, kwargs, first_param=2)
+        if not clause:
+            return await self.get_upload_history_by_id(upload_id)
+
+        rows = await self._fetch(
+            f"UPDATE study_upload_history SET {', '.join(clause)} WHERE id = $1 RETURNING *",
+            upload_id, *params
+        )
+
+        self._bump_owners(rows)
+        return rows[0] if rows else None
+
+    async def delete_upload_history(self, upload_id: int) -> bool:
+        """Delete upload history"""
+        rows = await self._fetch(
+            "DELETE FROM study_upload_history WHERE id = $1 RETURNING id, user_id", upload_id
+        )
+
+        self._bump_owners(rows)
+        return len(rows) > 0
@@ -0,0 +1,182 @@
+"""
+Practice Pool Service
+Stored pools of practice questions behind POST /questions/{id}/similar
+
+Each wrong question gets a pool of practice questions, generated in batches of
+PRACTICE_POOL_BATCH_SIZE (one completion, told which questions the pool already
+has) and kept free of duplicates by their normalized text. /similar serves the
+least-served questions of the pool, so repeat clicks show new ones, and refills
+the pool in the background when fewer than PRACTICE_POOL_LOW_WATER unseen
+questions remain. The first click on a question fills its pool while it waits;
+with PRACTICE_POOL_WARM_ON_OPEN, opening an unresolved question
+(GET /questions/{id}) fills it in the background beforehand, at the cost of a
+completion for questions that are never practised. Pools stop growing at PRACTICE_POOL_MAX_SIZE; after
+that, clicks cycle through them.
+"""
+
+import asyncio
+import re
+from typing import Any, Dict, List, Set
+
+from app.config import settings
+from app.services.azure_ai_service import azure_ai_service
+from app.services.supabase_db_service import supabase_db
+
+
+def practice_text_key(text: str) -> str:
+    """Normalized practice question text (lowercase words), unique within a pool"""
+    return " ".join(re.findall(r"\w+", text.lower()))
+
+
+# Opened questions remembered as warmed (pool checked), before the set is reset
+WARMED_MAX = 10_000
+
+
+class PracticePoolService:
+    """Serves practice questions from stored pools and keeps the pools filled"""
+
+    def __init__(self):
+        self._fills: Dict[int, asyncio.Task] = {}  # Question id -> generation in progress
+        self._background: Set[asyncio.Task] = set()
+        self._warmed: Set[int] = set()  # Opened questions whose pool was checked
+        self.stats = {
+            "served": 0, "warm_fills": 0, "cold_fills": 0, "refills": 0, "generated": 0,
+            "duplicates": 0, "failures": 0, "tokens": 0,
+            # Tokens by what started the fill (a click joining a warm fill adds to warm_fill_tokens)
+            "warm_fill_tokens": 0, "cold_fill_tokens": 0, "refill_tokens": 0
+        }
+
+    def warm(self, question: Dict[str, Any]) -> None:
+        """Start filling an opened, unresolved question's empty pool in the background (once per question)"""
+        if not settings.PRACTICE_POOL_WARM_ON_OPEN or question["id"] in self._warmed:
+            return
+        if question.get("status") == "understood":
+            return
+        if len(self._warmed) >= WARMED_MAX:
+            self._warmed.clear()
+        self._warmed.add(question["id"])
+        self._start(self._warm(question))
+
+    async def _warm(self, question: Dict[str, Any]) -> None:
+        try:
+            if await supabase_db.count_practice_questions(question["id"]):
+                return
+        except Exception as e:
+            print(f"⚠️  Practice pool check for question {question['id']} failed: {e}")
+            self._warmed.discard(question["id"])
+            return
+        self.stats["warm_fills"] += 1
+        await self._fill_quietly(question, "warm_fill")
+
+    def _start(self, coroutine) -> None:
+        task = asyncio.ensure_future(coroutine)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def take(self, question: Dict[str, Any], count: int) -> List[str]:
+        """
+        Practice questions for one click on /similar
+
+        Served from the question's pool (least served first). An empty pool is
+        filled while the caller waits (joining a fill started on open); a pool
+        running low is refilled in the background.
+        """
+        served, pool = await supabase_db.take_practice_questions(question["id"], count)
+        if len(served) < count:
+            # Clicked before the first fill finished (or a pool too small to serve a full set)
+            self.stats["cold_fills"] += 1
+            await self.fill(question, "cold_fill")
+            more, pool = await supabase_db.take_practice_questions(question["id"], count - len(served))
+            # A pool smaller than count serves its least-served rows again: those just taken
+            served_ids = {row["id"] for row in served}
+            served += [row for row in more if row["id"] not in served_ids]
+
+        self.stats["served"] += len(served)
+        self._refill_if_low(question, pool)
+        return [row["question_text"] for row in served]
+
+    def _refill_if_low(self, question: Dict[str, Any], pool: Dict[str, int]) -> None:
+        if pool["unseen"] < settings.PRACTICE_POOL_LOW_WATER and pool["size"] < settings.PRACTICE_POOL_MAX_SIZE:
+            self.stats["refills"] += 1
+            self._start(self._fill_quietly(question, "refill"))
+
+    async def _fill_quietly(self, question: Dict[str, Any], kind: str) -> None:
+        try:
+            await self.fill(question, kind)
+        except Exception as e:
+            print(f"⚠️  Practice pool fill for question {question['id']} failed: {e}")
+
+    async def fill(self, question: Dict[str, Any], kind: str = "cold_fill") -> int:
+        """
+        Generate one batch of practice questions into a question's pool
+        (once at a time per question, however many callers ask)
+
+        Args:
+            question: Question whose pool is filled
+            kind: What started the fill ("warm_fill", "cold_fill" or "refill"),
+                for the token stats
+
+        Returns:
+            Number of practice questions added
+        """
+        question_id = question["id"]
+        task = self._fills.get(question_id)
+        if task is None:
+            task = asyncio.ensure_future(self._fill(question, kind))
+            self._fills[question_id] = task
+            task.add_done_callback(lambda _: self._fills.pop(question_id, None))
+        # A client that disconnects does not cancel a fill others may share
+        return await asyncio.shield(task)
+
+    async def _fill(self, question: Dict[str, Any], kind: str) -> int:
+        existing = await supabase_db.get_practice_questions(question["id"])
+        try:
+            generated, tokens_used = await azure_ai_service.generate_similar_questions(
+                question.get("question_text"),
+                question.get("subject"),
+                question.get("grade"),
+                count=settings.PRACTICE_POOL_BATCH_SIZE,
+                exclude=[row["question_text"] for row in existing]
+            )
+        except Exception:
+            self.stats["failures"] += 1
+            raise
+
+        practice = {}
+        for text in generated:
+            practice.setdefault(practice_text_key(text), text)
+        added = await supabase_db.add_practice_questions(
+            question["id"],
+            [{"question_text": text, "text_key": key} for key, text in practice.items() if key]
+        )
+        self.stats["generated"] += added
+        self.stats["duplicates"] += len(generated) - added
+        self.stats["tokens"] += tokens_used.get("total_tokens", 0)
+        self.stats[f"{kind}_tokens"] += tokens_used.get("total_tokens", 0)
+
+        # Track token usage for the question's owner
+        try:
+            await supabase_db.add_token_usage(
+                user_id=question["user_id"],
+                prompt_tokens=tokens_used.get("prompt_tokens", 0),
+                completion_tokens=tokens_used.get("completion_tokens", 0),
+                total_tokens=tokens_used.get("total_tokens", 0)
+            )
+        except Exception as e:
+            print(f"Warning: Failed to track token usage: {e}")
+        return added
+
+    async def stop(self) -> None:
+        """Cancel background refills (pools refill on a later click)"""
+        tasks = list(self._background) + list(self._fills.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Practice questions served and generated, fills (on open, on click, refills), duplicates dropped and tokens spent (in total and per fill kind)"""
+        return {**self.stats, "filling": len(self._fills)}
+
+
+# Create a singleton instance
+practice_pools = PracticePoolService()
@@ -0,0 +1,119 @@
+"""
+Purge Service
+Background removal of the embeddings and images of deleted questions
+
+Deleting questions (or a user) removes the rows and, in the same statement,
+queues their embeddings and image references in study_purge_queue, so the
+request returns without touching the vector store or the bucket. This worker
+drains the queue in batches: one embeddings delete and one storage remove per
+batch. Failed batches are retried with exponential backoff; entries stay in
+the queue until they succeed.
+"""
+
+import asyncio
+from typing import Any, Dict, List, Optional
+
+from app.config import settings
+from app.services.image_ref_service import image_refs
+from app.services.supabase_db_service import supabase_db
+from app.services.supabase_service import supabase_service
+
+
+class PurgeWorker:
+    """Drains the purge queue in the background of the app process"""
+
+    def __init__(self):
+        self.task: Optional[asyncio.Task] = None
+        self._wake = asyncio.Event()
+        self.stats = {"batches": 0, "purged": 0, "embeddings_deleted": 0, "failures": 0}
+        self.last_error: Optional[str] = None
+
+    @property
+    def running(self) -> bool:
+        return self.task is not None and not self.task.done()
+
+    def start(self) -> None:
+        """Start the worker loop (no-op if running)"""
+        if not self.running:
+            self.task = asyncio.ensure_future(self._run())
+
+    async def stop(self) -> None:
+        """Stop the worker; queued entries are picked up after the next start"""
+        if not self.running:
+            return
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+
+    def notify(self) -> None:
+        """Wake the worker after queueing deletions"""
+        self._wake.set()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                while await self.purge_batch():
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Reading the queue failed (database unavailable); try again next round
+                self.last_error = str(e)
+                print(f"❌ Purge worker error: {e}")
+
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=settings.PURGE_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    async def purge_batch(self) -> int:
+        """
+        Purge one batch of due queue entries
+
+        Returns:
+            Number of entries attempted (0 when nothing is due)
+        """
+        entries = await supabase_db.get_purge_batch(settings.PURGE_BATCH_SIZE)
+        if not entries:
+            return 0
+
+        entry_ids = [entry["id"] for entry in entries]
+        try:
+            await self._purge(entries)
+        except Exception as e:
+            self.stats["failures"] += 1
+            self.last_error = str(e)
+            print(f"⚠️  Purge of {len(entries)} deletion(s) failed, will retry: {e}")
+            await supabase_db.retry_purge(
+                entry_ids,
+                str(e)[:500],
+                settings.PURGE_RETRY_BASE_SECONDS,
+                settings.PURGE_RETRY_MAX_SECONDS
+            )
+        else:
+            await supabase_db.finish_purge(entry_ids)
+            self.stats["batches"] += 1
+            self.stats["purged"] += len(entries)
+        return len(entries)
+
+    async def _purge(self, entries: List[Dict[str, Any]]) -> None:
+        # Every step is idempotent, so a failed batch is simply retried whole
+        question_ids = [entry["question_id"] for entry in entries if entry.get("question_id") is not None]
+        if question_ids:
+            self.stats["embeddings_deleted"] += await supabase_service.delete_embeddings_for_questions(question_ids)
+        await image_refs.release_purged(entries)
+
+    async def get_stats(self) -> Dict[str, Any]:
+        """Worker counters and the queue's length"""
+        try:
+            queue = await supabase_db.get_purge_stats()
+        except Exception as e:
+            queue = {"error": str(e)}
+        return {"running": self.running, **self.stats, "last_error": self.last_error, "queue": queue}
+
+
+# Create a singleton instance
+purge_worker = PurgeWorker()
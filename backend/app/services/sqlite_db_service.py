@@ -0,0 +1,1092 @@
+"""
+SQLite Database Service
+Embedded backend with the same interface as SupabaseDBService
+For offline development, CI and reproducible benchmarks - no network needed
+Selected with DB_BACKEND=sqlite (database file taken from DATABASE_URL)
+"""
+
+import asyncio
+import json
+import re
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Optional, List, Dict, Any, Tuple, Callable
+
+from app.config import settings
+from app.services.db_service_base import (
+    DBServiceBase,
+    USER_LIST_COLUMNS,
+    decode_cursor,
+    page_result,
+    user_sort_column
+)
+from app.services.user_version_service import user_versions
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS study_users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    email TEXT UNIQUE NOT NULL,
+    name TEXT NOT NULL,
+    google_id TEXT UNIQUE,
+    grade TEXT,
+    profile_picture TEXT,
+    is_admin INTEGER DEFAULT 0,
+    total_tokens_used INTEGER DEFAULT 0,
+    prompt_tokens_used INTEGER DEFAULT 0,
+    completion_tokens_used INTEGER DEFAULT 0,
+    last_token_update TEXT,
+    created_at TEXT,
+    updated_at TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_study_users_created_at_id ON study_users(created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_study_users_tokens_id ON study_users(total_tokens_used DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_study_users_email_nocase ON study_users(email COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS idx_study_users_name_nocase ON study_users(name COLLATE NOCASE);
+
+CREATE TABLE IF NOT EXISTS study_questions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL REFERENCES study_users(id) ON DELETE CASCADE,
+    subject TEXT NOT NULL,
+    grade TEXT,
+    question_text TEXT NOT NULL,
+    image_url TEXT,
+    image_snippet_url TEXT,
+    image_thumbnail_url TEXT,
+    image_review_url TEXT,
+    explanation TEXT,
+    status TEXT DEFAULT 'pending',
+    vector_id TEXT,
+    question_metadata TEXT DEFAULT '{}',
+    created_at TEXT,
+    updated_at TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_study_questions_user_id ON study_questions(user_id, created_at);
+
+-- Full-text index over question text (BM25-ranked), kept in sync by triggers
+CREATE VIRTUAL TABLE IF NOT EXISTS study_questions_fts USING fts5(
+    question_text, content='study_questions', content_rowid='id'
+);
+
+CREATE TRIGGER IF NOT EXISTS study_questions_fts_insert AFTER INSERT ON study_questions BEGIN
+    INSERT INTO study_questions_fts(rowid, question_text) VALUES (new.id, new.question_text);
+END;
+
+CREATE TRIGGER IF NOT EXISTS study_questions_fts_delete AFTER DELETE ON study_questions BEGIN
+    INSERT INTO study_questions_fts(study_questions_fts, rowid, question_text) VALUES ('delete', old.id, old.question_text);
+END;
+
+CREATE TRIGGER IF NOT EXISTS study_questions_fts_update AFTER UPDATE OF question_text ON study_questions BEGIN
+    INSERT INTO study_questions_fts(study_questions_fts, rowid, question_text) VALUES ('delete', old.id, old.question_text);
+    INSERT INTO study_questions_fts(rowid, question_text) VALUES (new.id, new.question_text);
+END;
+
+CREATE TABLE IF NOT EXISTS study_upload_history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL REFERENCES study_users(id) ON DELETE CASCADE,
+    filename TEXT NOT NULL,
+    subject TEXT,
+    questions_extracted INTEGER DEFAULT 0,
+    status TEXT DEFAULT 'processing',
+    error_message TEXT,
+    pages_total INTEGER DEFAULT 1,
+    pages_analyzed INTEGER DEFAULT 0,
+    prompt_tokens INTEGER DEFAULT 0,
+    completion_tokens INTEGER DEFAULT 0,
+    total_tokens INTEGER DEFAULT 0,
+    created_at TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_study_upload_history_user_id ON study_upload_history(user_id, created_at);
+
+-- Reference counts of content-addressed images (one per question using the image)
+CREATE TABLE IF NOT EXISTS study_image_refs (
+    url TEXT PRIMARY KEY,
+    ref_count INTEGER NOT NULL DEFAULT 0,
+    created_at TEXT
+);
+
+-- Deleted questions whose embeddings and images the purge worker has yet to remove
+CREATE TABLE IF NOT EXISTS study_purge_queue (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    question_id INTEGER,
+    user_id INTEGER,
+    image_urls TEXT NOT NULL DEFAULT '[]',
+    refs_released INTEGER NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at TEXT,
+    last_error TEXT,
+    created_at TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_study_purge_queue_due ON study_purge_queue(next_attempt_at, id);
+
+-- Practice questions generated for a wrong question (POST /questions/{id}/similar)
+CREATE TABLE IF NOT EXISTS study_practice_questions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    question_id INTEGER NOT NULL REFERENCES study_questions(id) ON DELETE CASCADE,
+    question_text TEXT NOT NULL,
+    text_key TEXT NOT NULL,
+    served_count INTEGER NOT NULL DEFAULT 0,
+    last_served_at TEXT,
+    created_at TEXT,
+    UNIQUE (question_id, text_key)
+);
+
+CREATE TABLE IF NOT EXISTS study_app_config (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    updated_at TEXT
+);
+"""
+
+# Every image URL a question references (for reference counting)
+IMAGE_URLS_SQL = " UNION ALL ".join(
+    f"SELECT {column} AS url FROM study_questions"
+    for column in ("image_url", "image_snippet_url", "image_thumbnail_url", "image_review_url")
+)
+
+# Queue the embeddings and image references of the questions matching {where}
+# for the purge worker (run in the same transaction as their DELETE)
+QUEUE_PURGE_SQL = """
+    INSERT INTO study_purge_queue (question_id, user_id, image_urls, next_attempt_at, created_at)
+    SELECT id, user_id,
+           (SELECT json_group_array(value)
+            FROM json_each(json_array(image_url, image_snippet_url, image_thumbnail_url, image_review_url))
+            WHERE value IS NOT NULL),
+           ?, ?
+    FROM study_questions WHERE {where}
+"""
+
+# Image URLs of the purge queue entries with the given ids ({ids}: placeholders)
+PURGE_URLS_SQL = "SELECT j.value AS url FROM study_purge_queue q, json_each(q.image_urls) j WHERE q.id IN ({ids})"
+
+# Columns that may be written through the **kwargs update methods
+USER_COLUMNS = {
+    "email", "name", "google_id", "grade", "profile_picture", "is_admin",
+    "total_tokens_used", "prompt_tokens_used", "completion_tokens_used", "last_token_update",
+    "updated_at"
+}
+QUESTION_COLUMNS = {
+    "subject", "grade", "question_text", "image_url", "image_snippet_url",
+    "image_thumbnail_url", "image_review_url",
+    "explanation", "status", "vector_id", "question_metadata", "updated_at"
+}
+UPLOAD_HISTORY_COLUMNS = {
+    "filename", "subject", "questions_extracted", "status", "error_message",
+    "pages_total", "pages_analyzed", "prompt_tokens", "completion_tokens", "total_tokens"
+}
+# Columns introduced after the first release, added to older database files on open
+ADDED_COLUMNS = {
+    "study_questions": [("image_thumbnail_url", "TEXT"), ("image_review_url", "TEXT")],
+    "study_upload_history": [
+        ("pages_total", "INTEGER DEFAULT 1"),
+        ("pages_analyzed", "INTEGER DEFAULT 0"),
+        ("prompt_tokens", "INTEGER DEFAULT 0"),
+        ("completion_tokens", "INTEGER DEFAULT 0"),
+        ("total_tokens", "INTEGER DEFAULT 0"),
+    ],
+}
+JSON_COLUMNS = {"question_metadata", "metadata", "image_urls"}
+BOOL_COLUMNS = {"is_admin", "refs_released"}
+
+
+def sqlite_path_from_url(database_url: str) -> str:
+    """Extract the file path from sqlite:///path or sqlite+aiosqlite:///path URLs"""
+    if not database_url.startswith("sqlite"):
+        raise ValueError(f"DB_BACKEND=sqlite needs a sqlite:/// DATABASE_URL, got: {database_url}")
+    return database_url.split(":///", 1)[1] or ":memory:"
+
+
+class SQLiteConnection:
+    """One shared sqlite3 connection, used from worker threads one call at a time"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self._lock = threading.Lock()
+
+    def _call(self, fn: Callable[[sqlite3.Connection], Any]) -> Any:
+        with self._lock:
+            return fn(self.conn)
+
+    async def run(self, fn: Callable[[sqlite3.Connection], Any]) -> Any:
+        """Run fn(conn) in a worker thread"""
+        return await asyncio.to_thread(self._call, fn)
+
+    async def fetch(self, sql: str, params: tuple = ()) -> List[sqlite3.Row]:
+        return await self.run(lambda conn: conn.execute(sql, params).fetchall())
+
+    async def execute_script(self, statements: List[tuple]) -> List[List[sqlite3.Row]]:
+        """Run several (sql, params) statements in one transaction"""
+        def _script(conn: sqlite3.Connection):
+            results = []
+            conn.execute("BEGIN")
+            try:
+                for sql, params in statements:
+                    results.append(conn.execute(sql, params).fetchall())
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            return results
+
+        return await self.run(_script)
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+def _row_to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+    """Convert a row to the JSON-shaped dict PostgREST would return"""
+    data = dict(row)
+    for key in JSON_COLUMNS & data.keys():
+        if isinstance(data[key], str):
+            data[key] = json.loads(data[key])
+    for key in BOOL_COLUMNS & data.keys():
+        if data[key] is not None:
+            data[key] = bool(data[key])
+    return data
+
+
+def _encode(column: str, value: Any) -> Any:
+    if column in JSON_COLUMNS and value is not None:
+        return json.dumps(value)
+    return value
+
+
+class SQLiteDBService(DBServiceBase):
+    """Database service backed by a local SQLite file"""
+
+    def __init__(self, path: str):
+        """Open the database file and create the schema if needed"""
+        super().__init__()
+        self.db = SQLiteConnection(path)
+        self.db.conn.executescript(SCHEMA)
+        self._add_missing_columns()
+        self._backfill_fulltext_index()
+        self._backfill_image_refs()
+        self.enabled = True
+        print(f"✅ SQLite Database Service initialized ({path})")
+
+    def _add_missing_columns(self) -> None:
+        """Add columns introduced after a database file was created"""
+        conn = self.db.conn
+        for table, columns in ADDED_COLUMNS.items():
+            existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+            for column, definition in columns:
+                if column not in existing:
+                    conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+    def _backfill_image_refs(self) -> None:
+        """Count references to images stored before reference counting existed"""
+        conn = self.db.conn
+        if conn.execute("SELECT count(*) FROM study_image_refs").fetchone()[0]:
+            return
+        conn.execute(f"""
+            INSERT INTO study_image_refs (url, ref_count, created_at)
+            SELECT url, count(*), ? FROM ({IMAGE_URLS_SQL}) WHERE url IS NOT NULL GROUP BY url
+        """, (datetime.utcnow().isoformat(),))
+
+    def _backfill_fulltext_index(self) -> None:
+        """Index questions written before the full-text table existed"""
+        conn = self.db.conn
+        indexed = conn.execute("SELECT count(*) FROM study_questions_fts_docsize").fetchone()[0]
+        total = conn.execute("SELECT count(*) FROM study_questions").fetchone()[0]
+        if indexed != total:
+            conn.execute("INSERT INTO study_questions_fts(study_questions_fts) VALUES ('rebuild')")
+
+    async def close(self) -> None:
+        self.db.close()
+
+    async def _fetch(self, sql: str, params: tuple = ()) -> List[Dict[str, Any]]:
+        rows = await self.db.fetch(sql, params)
+        return [_row_to_dict(r) for r in rows]
+
+    async def _read(self, key: tuple, sql: str, params: tuple = ()) -> List[Dict[str, Any]]:
+        return await self._singleflight(key, lambda: self._fetch(sql, params))
+
+    async def _insert(self, table: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        columns = list(data)
+        placeholders = ", ".join("?" for _ in columns)
+        rows = await self._fetch(
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders}) RETURNING *",
+            tuple(_encode(c, data[c]) for c in columns)
+        )
+        return rows[0] if rows else None
+
+    async def _update(self, table: str, columns: set, row_id: int, values: Dict[str, Any]) -> List[Dict[str, Any]]:
+        unknown = set(values) - columns
+        if unknown:
+            raise ValueError(f"Unknown columns: {', '.join(sorted(unknown))}")
+        if not values:
+            return await self._fetch(f"SELECT * FROM {table} WHERE id = ?", (row_id,))
+
+        names = sorted(values)
+        assignments = ", ".join(f"{name} = ?" for name in names)
+        return await self._fetch(
+            f"UPDATE {table} SET {assignments} WHERE id = ? RETURNING *",
+            tuple(_encode(n, values[n]) for n in names) + (row_id,)
+        )
+
+    # ==================== USER OPERATIONS ====================
+
+    async def create_user(self, email: str, name: str, google_id: str,
+                         profile_picture: Optional[str] = None,
+                         grade: Optional[str] = None,
+                         is_admin: bool = False) -> Dict[str, Any]:
+        """Create a new user"""
+        user = await self._insert("study_users", {
+            "email": email,
+            "name": name,
+            "google_id": google_id,
+            "profile_picture": profile_picture,
+            "grade": grade,
+            "is_admin": is_admin,
+            "created_at": datetime.utcnow().isoformat(),
+            "updated_at": datetime.utcnow().isoformat()
+        })
+        if user:
+            user_versions.bump(user["id"])  # Lookups by email / Google ID must see the new user
+        return user
+
+    async def get_user_by_id(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """Get user by ID"""
+        key = ("get_user_by_id", user_id, user_versions.get_version(user_id)[0])
+        rows = await self._read(key, "SELECT * FROM study_users WHERE id = ?", (user_id,))
+        return rows[0] if rows else None
+
+    async def get_user_by_email(self, email: str) -> Optional[Dict[str, Any]]:
+        """Get user by email"""
+        key = ("get_user_by_email", email, user_versions.get_write_count())
+        rows = await self._read(key, "SELECT * FROM study_users WHERE email = ?", (email,))
+        return rows[0] if rows else None
+
+    async def get_user_by_google_id(self, google_id: str) -> Optional[Dict[str, Any]]:
+        """Get user by Google ID"""
+        key = ("get_user_by_google_id", google_id, user_versions.get_write_count())
+        rows = await self._read(key, "SELECT * FROM study_users WHERE google_id = ?", (google_id,))
+        return rows[0] if rows else None
+
+    async def update_user(self, user_id: int, **kwargs) -> Dict[str, Any]:
+        """Update user fields"""
+        kwargs['updated_at'] = datetime.utcnow().isoformat()
+        rows = await self._update("study_users", USER_COLUMNS, user_id, kwargs)
+
+        user_versions.bump(user_id)
+        return rows[0] if rows else None
+
+    async def add_token_usage(self, user_id: int, prompt_tokens: int,
+                             completion_tokens: int, total_tokens: int) -> Dict[str, Any]:
+        """Add token usage to user's total (single atomic increment)"""
+        now = datetime.utcnow().isoformat()
+        rows = await self._fetch(
+            """
+            UPDATE study_users SET
+                total_tokens_used = COALESCE(total_tokens_used, 0) + ?,
+                prompt_tokens_used = COALESCE(prompt_tokens_used, 0) + ?,
+                completion_tokens_used = COALESCE(completion_tokens_used, 0) + ?,
+                last_token_update = ?,
+                updated_at = ?
+            WHERE id = ?
+            RETURNING *
+            """,
+            (total_tokens, prompt_tokens, completion_tokens, now, now, user_id)
+        )
+        if not rows:
+            raise ValueError(f"User {user_id} not found")
+
+        user_versions.bump(user_id)
+        return rows[0]
+
+    async def get_all_users_token_usage(self, limit: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Get system-wide token usage across all users
+
+        Args:
+            limit: Only return the top-K users by usage (all users if None)
+
+        Returns:
+            Dict with total_tokens, total_prompt_tokens, total_completion_tokens,
+            total_users and users (highest usage first)
+        """
+        totals = await self._fetch(
+            """
+            SELECT count(*) AS total_users,
+                   COALESCE(sum(total_tokens_used), 0) AS total_tokens,
+                   COALESCE(sum(prompt_tokens_used), 0) AS total_prompt_tokens,
+                   COALESCE(sum(completion_tokens_used), 0) AS total_completion_tokens
+            FROM study_users
+            """
+        )
+        users_data = await self._fetch(
+            """
+            SELECT id, email, name,
+                   COALESCE(total_tokens_used, 0) AS total_tokens_used,
+                   COALESCE(prompt_tokens_used, 0) AS prompt_tokens_used,
+                   COALESCE(completion_tokens_used, 0) AS completion_tokens_used,
+                   last_token_update
+            FROM study_users
+            ORDER BY total_tokens_used DESC, id DESC
+            LIMIT ?
+            """,
+            (limit if limit else -1,)
+        )
+
+        users_list = [
+            {
+                'user_id': user['id'],
+                'email': user['email'],
+                'name': user['name'],
+                'total_tokens_used': user['total_tokens_used'],
+                'prompt_tokens_used': user['prompt_tokens_used'],
+                'completion_tokens_used': user['completion_tokens_used'],
+                'last_token_update': user['last_token_update']
+            }
+            for user in users_data
+        ]
+
+        return {
+            'total_tokens': totals[0]['total_tokens'],
+            'total_prompt_tokens': totals[0]['total_prompt_tokens'],
+            'total_completion_tokens': totals[0]['total_completion_tokens'],
+            'total_users': totals[0]['total_users'],
+            'users': users_list
+        }
+
+    async def delete_user(self, user_id: int) -> bool:
+        """
+        Delete user together with their questions and upload history
+
+        The questions' embeddings and images are queued for the purge worker.
+        """
+        now = datetime.utcnow().isoformat()
+        results = await self.db.execute_script([
+            ("DELETE FROM study_upload_history WHERE user_id = ?", (user_id,)),
+            (QUEUE_PURGE_SQL.format(where="user_id = ?"), (now, now, user_id)),
+            ("DELETE FROM study_questions WHERE user_id = ?", (user_id,)),
+            ("DELETE FROM study_users WHERE id = ? RETURNING id", (user_id,)),
+        ])
+
+        user_versions.bump(user_id)
+        return len(results[-1]) > 0
+
+    async def get_all_users(self) -> List[Dict[str, Any]]:
+        """Get all users (admin only)"""
+        return await self._fetch(
+            "SELECT id, email, name, grade, is_admin, created_at FROM study_users ORDER BY created_at DESC"
+        )
+
+    async def get_users_page(
+        self,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        sort: str = "created_at",
+        search: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Get one page of users (admin only), sorted and filtered server-side
+
+        Args:
+            limit: Page size
+            cursor: next_cursor from the previous page
+            sort: "created_at" (newest first) or "tokens" (highest usage first)
+            search: Case-insensitive email or name prefix
+
+        Returns:
+            Dict with users and next_cursor (None on the last page)
+        """
+        column = user_sort_column(sort)
+        conditions = []
+        params: List[Any] = []
+
+        if search:
+            escaped = search.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            conditions.append("(email LIKE ? ESCAPE '\\' OR name LIKE ? ESCAPE '\\')")
+            params.extend([escaped + "%", escaped + "%"])
+
+        if cursor:
+            value, last_id = decode_cursor(cursor)
+            conditions.append(f"({column}, id) < (?, ?)")
+            params.extend([value, last_id])
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        rows = await self._fetch(
+            f"SELECT {USER_LIST_COLUMNS} FROM study_users {where} "
+            f"ORDER BY {column} DESC, id DESC LIMIT ?",
+            tuple(params) + (limit + 1,)
+        )
+        return page_result(rows, limit, column)
+
+    # ==================== QUESTION OPERATIONS ====================
+
+    async def create_question(
+        self,
+        user_id: int,
+        subject: str,
+        question_text: str,
+        grade: Optional[str] = None,
+        image_url: Optional[str] = None,
+        image_snippet_url: Optional[str] = None,
+        image_thumbnail_url: Optional[str] = None,
+        image_review_url: Optional[str] = None,
+        explanation: Optional[str] = None,
+        status: str = "pending",
+        vector_id: Optional[str] = None,
+        question_metadata: Optional[Dict] = None
+    ) -> Dict[str, Any]:
+        """Create a new question"""
+        question = await self._insert("study_questions", {
+            "user_id": user_id,
+            "subject": subject,
+            "question_text": question_text,
+            "grade": grade,
+            "image_url": image_url,
+            "image_snippet_url": image_snippet_url,
+            "image_thumbnail_url": image_thumbnail_url,
+            "image_review_url": image_review_url,
+            "explanation": explanation,
+            "status": status,
+            "vector_id": vector_id,
+            "question_metadata": question_metadata or {},
+            "created_at": datetime.utcnow().isoformat(),
+            "updated_at": datetime.utcnow().isoformat()
+        })
+
+        user_versions.bump(user_id)
+        return question
+
+    async def get_question_by_id(self, question_id: int) -> Optional[Dict[str, Any]]:
+        """Get question by ID"""
+        key = ("get_question_by_id", question_id, user_versions.get_write_count())
+        rows = await self._read(key, "SELECT * FROM study_questions WHERE id = ?", (question_id,))
+        return rows[0] if rows else None
+
+    async def get_questions_by_ids(
+        self,
+        question_ids: List[int],
+        user_id: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Get several questions in one query
+
+        Args:
+            question_ids: IDs to fetch; the result keeps this order (e.g. search ranking)
+            user_id: If given, only questions owned by this user are returned
+
+        Returns:
+            Questions found, ordered like question_ids
+        """
+        ids = list(dict.fromkeys(question_ids))
+        if not ids:
+            return []
+
+        sql = f"SELECT * FROM study_questions WHERE id IN ({', '.join('?' for _ in ids)})"
+        params = tuple(ids)
+        if user_id is not None:
+            sql += " AND user_id = ?"
+            params += (user_id,)
+
+        key = ("get_questions_by_ids", tuple(ids), user_id,
+               user_versions.get_version(user_id)[0] if user_id is not None else user_versions.get_write_count())
+        rows = await self._read(key, sql, params)
+        return self._order_by_ids(rows, ids)
+
+    async def get_questions_by_user(
+        self,
+        user_id: int,
+        status: Optional[str] = None,
+        subject: Optional[str] = None,
+        grade: Optional[str] = None,
+        limit: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """Get all questions for a user with optional filters"""
+        conditions = ["user_id = ?"]
+        params: List[Any] = [user_id]
+        for column, value in (("status", status), ("subject", subject), ("grade", grade)):
+            if value:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+
+        sql = f"SELECT * FROM study_questions WHERE {' AND '.join(conditions)} ORDER BY created_at DESC, id DESC"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+
+        key = ("get_questions_by_user", user_id, status, subject, grade, limit,
+               user_versions.get_version(user_id)[0])
+        return await self._read(key, sql, tuple(params))
+
+    async def get_pending_explanations_after(
+        self,
+        user_id: int,
+        after_question_id: int,
+        limit: int
+    ) -> List[Dict[str, Any]]:
+        """
+        Next questions waiting for a lazily generated explanation, in review order
+        (GET /questions/wrong: newest first) after a given question
+
+        Args:
+            user_id: Owner of the questions
+            after_question_id: The question the student opened
+            limit: Largest number of questions returned
+
+        Returns:
+            Pending questions not marked understood, older than the opened one
+        """
+        return await self._fetch(
+            """
+            SELECT * FROM study_questions
+            WHERE user_id = ? AND explanation IS NULL AND status != 'understood'
+              AND json_extract(question_metadata, '$.explanation.source') = 'pending'
+              AND (created_at, id) < (SELECT created_at, id FROM study_questions WHERE id = ?)
+            ORDER BY created_at DESC, id DESC
+            LIMIT ?
+            """,
+            (user_id, after_question_id, limit)
+        )
+
+    async def update_question(self, question_id: int, **kwargs) -> Dict[str, Any]:
+        """Update question fields"""
+        kwargs['updated_at'] = datetime.utcnow().isoformat()
+        rows = await self._update("study_questions", QUESTION_COLUMNS, question_id, kwargs)
+
+        self._bump_owners(rows)
+        return rows[0] if rows else None
+
+    async def update_questions(
+        self,
+        user_id: int,
+        question_ids: List[int],
+        full_rows: bool = True,
+        explanation_provenance: Optional[Dict[str, Any]] = None,
+        **kwargs
+    ) -> List[Dict[str, Any]]:
+        """
+        Update the same fields on several of a user's questions in one statement
+
+        Ownership is part of the statement's filter, so no per-question lookup is needed.
+
+        Args:
+            user_id: Owner; questions of other users are not touched
+            question_ids: Questions to update
+            full_rows: Return whole rows (False: only id and user_id)
+            explanation_provenance: Set as question_metadata["explanation"] of every
+                updated row in the same statement (the rest of its metadata is kept)
+            **kwargs: Columns to set
+
+        Returns:
+            Updated rows (IDs not found or not owned are absent)
+        """
+        ids = list(dict.fromkeys(question_ids))
+        unknown = set(kwargs) - QUESTION_COLUMNS
+        if unknown:
+            raise ValueError(f"Unknown columns: {', '.join(sorted(unknown))}")
+        if not ids:
+            return []
+
+        kwargs['updated_at'] = datetime.utcnow().isoformat()
+        names = sorted(kwargs)
+        clause = [f'{name} = ?' for name in names]
+        params = tuple(_encode(n, kwargs[n]) for n in names)
+        if explanation_provenance is not None:
+            clause.append(
+                "question_metadata = json_set(COALESCE(question_metadata, '{}'), '$.explanation', json(?))"
+            )
+            params += (json.dumps(explanation_provenance),)
+        rows = await self._fetch(
+            f"UPDATE study_questions SET {', '.join(clause)} "
+            f"WHERE user_id = ? AND id IN ({', '.join('?' for _ in ids)}) "
+            f"RETURNING {'*' if full_rows else 'id, user_id'}",
+            params + (user_id, *ids)
+        )
+
+        if rows:
+            user_versions.bump(user_id)
+        return rows
+
+    async def delete_question(self, question_id: int) -> bool:
+        """Delete question"""
+        rows = await self._fetch(
+            "DELETE FROM study_questions WHERE id = ? RETURNING id, user_id", (question_id,)
+        )
+
+        self._bump_owners(rows)
+        return len(rows) > 0
+
+    async def delete_questions(self, user_id: int, question_ids: List[int]) -> List[int]:
+        """
+        Delete several of a user's questions in one transaction
+
+        Their embeddings and image references are queued for the purge worker
+        in the same transaction, so the rows disappear immediately and nothing
+        is left orphaned.
+
+        Returns:
+            IDs deleted (IDs not found or not owned by the user are skipped)
+        """
+        ids = list(dict.fromkeys(question_ids))
+        if not ids:
+            return []
+
+        now = datetime.utcnow().isoformat()
+        where = f"user_id = ? AND id IN ({', '.join('?' for _ in ids)})"
+        results = await self.db.execute_script([
+            (QUEUE_PURGE_SQL.format(where=where), (now, now, user_id, *ids)),
+            (f"DELETE FROM study_questions WHERE {where} RETURNING id", (user_id, *ids)),
+        ])
+
+        deleted = [row["id"] for row in results[-1]]
+        if deleted:
+            user_versions.bump(user_id)
+        return deleted
+
+    async def count_questions_by_user(self, user_id: int, status: Optional[str] = None) -> int:
+        """Count questions for a user"""
+        if status:
+            sql, params = "SELECT count(*) AS n FROM study_questions WHERE user_id = ? AND status = ?", (user_id, status)
+        else:
+            sql, params = "SELECT count(*) AS n FROM study_questions WHERE user_id = ?", (user_id,)
+
+        key = ("count_questions_by_user", user_id, status, user_versions.get_version(user_id)[0])
+        rows = await self._read(key, sql, params)
+        return rows[0]["n"] if rows else 0
+
+    async def search_question_ids(self, user_id: int, query: str, limit: int = 20) -> List[int]:
+        """
+        Full-text search over the user's question text
+
+        Any query term may match; questions matching more (and rarer) terms rank higher.
+
+        Returns:
+            Matching question IDs, best match first
+        """
+        # Quote every term so user input can't inject FTS5 syntax (NEAR, *, column filters)
+        terms = re.findall(r"\w+", query)
+        if not terms:
+            return []
+        match = " OR ".join('"' + term + '"' for term in terms)
+
+        sql = """
+            SELECT q.id
+            FROM study_questions_fts
+            JOIN study_questions q ON q.id = study_questions_fts.rowid
+            WHERE study_questions_fts MATCH ? AND q.user_id = ?
+            ORDER BY bm25(study_questions_fts), q.id DESC
+            LIMIT ?
+        """
+
+        key = ("search_question_ids", user_id, query, limit, user_versions.get_version(user_id)[0])
+        rows = await self._read(key, sql, (match, user_id, limit))
+        return [row["id"] for row in rows]
+
+    async def get_questions_batch(self, after_id: int = 0, limit: int = 500) -> List[Dict[str, Any]]:
+        """
+        Page through all users' questions in id order (maintenance jobs)
+
+        Args:
+            after_id: Return questions with id > after_id
+            limit: Page size
+
+        Returns:
+            Questions (id, user_id, subject, grade, question_text, vector_id), ascending id
+        """
+        return await self._fetch(
+            "SELECT id, user_id, subject, grade, question_text, vector_id FROM study_questions WHERE id > ? ORDER BY id LIMIT ?",
+            (after_id, limit)
+        )
+
+    # ==================== IMAGE REFERENCES ====================
+
+    async def acquire_image_refs(self, counts: Dict[str, int]) -> Dict[str, int]:
+        """
+        Add references to stored images
+
+        Args:
+            counts: {image_url: references to add}
+
+        Returns:
+            {image_url: reference count after adding}; a count equal to the
+            number added means the image was not stored before
+        """
+        now = datetime.utcnow().isoformat()
+        results = await self.db.execute_script([
+            (
+                """
+                INSERT INTO study_image_refs (url, ref_count, created_at) VALUES (?, ?, ?)
+                ON CONFLICT (url) DO UPDATE SET ref_count = ref_count + excluded.ref_count
+                RETURNING url, ref_count
+                """,
+                (url, n, now)
+            )
+            for url, n in counts.items()
+        ])
+        return {rows[0]["url"]: rows[0]["ref_count"] for rows in results}
+
+    async def release_image_refs(self, counts: Dict[str, int]) -> List[str]:
+        """
+        Drop references to stored images
+
+        Args:
+            counts: {image_url: references to drop}
+
+        Returns:
+            URLs whose last reference went (their rows are deleted; the caller
+            deletes the objects). URLs without a reference row are ignored
+        """
+        statements = [
+            ("UPDATE study_image_refs SET ref_count = ref_count - ? WHERE url = ?", (n, url))
+            for url, n in counts.items()
+        ]
+        statements += [
+            ("DELETE FROM study_image_refs WHERE url = ? AND ref_count <= 0 RETURNING url", (url,))
+            for url in counts
+        ]
+        results = await self.db.execute_script(statements)
+        return [rows[0]["url"] for rows in results[len(counts):] if rows]
+
+    # ==================== PURGE QUEUE ====================
+
+    async def enqueue_image_purge(self, image_urls: List[str]) -> None:
+        """Queue unreferenced images whose deletion failed, for the purge worker to retry"""
+        now = datetime.utcnow().isoformat()
+        await self._fetch(
+            "INSERT INTO study_purge_queue (image_urls, refs_released, next_attempt_at, created_at) VALUES (?, 1, ?, ?)",
+            (json.dumps(list(image_urls)), now, now)
+        )
+
+    async def get_purge_batch(self, limit: int) -> List[Dict[str, Any]]:
+        """Queue entries due for an attempt, oldest first"""
+        return await self._fetch(
+            """
+            SELECT id, question_id, user_id, image_urls, refs_released, attempts
+            FROM study_purge_queue WHERE next_attempt_at <= ? ORDER BY id LIMIT ?
+            """,
+            (datetime.utcnow().isoformat(), limit)
+        )
+
+    async def release_purge_refs(self, entry_ids: List[int]) -> List[str]:
+        """
+        Drop the image references of queue entries, once per entry
+
+        Each entry is left listing only its images whose last reference went,
+        so a retried entry never drops references twice.
+
+        Returns:
+            Images of the entries left unreferenced (the caller deletes them)
+        """
+        ids = ", ".join("?" for _ in entry_ids)
+        pending = PURGE_URLS_SQL.format(ids=ids) + " AND q.refs_released = 0"
+        results = await self.db.execute_script([
+            (
+                f"""
+                UPDATE study_image_refs
+                SET ref_count = ref_count - (SELECT count(*) FROM ({pending}) p WHERE p.url = study_image_refs.url)
+                WHERE url IN ({pending})
+                """,
+                (*entry_ids, *entry_ids)
+            ),
+            (
+                f"""
+                UPDATE study_purge_queue
+                SET refs_released = 1,
+                    image_urls = (
+                        SELECT json_group_array(j.value) FROM json_each(study_purge_queue.image_urls) j
+                        WHERE j.value IN (SELECT url FROM study_image_refs WHERE ref_count <= 0)
+                    )
+                WHERE id IN ({ids}) AND refs_released = 0
+                """,
+                tuple(entry_ids)
+            ),
+            (
+                f"DELETE FROM study_image_refs WHERE ref_count <= 0 AND url IN ({PURGE_URLS_SQL.format(ids=ids)})",
+                tuple(entry_ids)
+            ),
+            (f"SELECT DISTINCT url FROM ({PURGE_URLS_SQL.format(ids=ids)})", tuple(entry_ids)),
+        ])
+        return [row["url"] for row in results[-1]]
+
+    async def finish_purge(self, entry_ids: List[int]) -> None:
+        """Remove completed entries from the queue"""
+        await self._fetch(
+            f"DELETE FROM study_purge_queue WHERE id IN ({', '.join('?' for _ in entry_ids)})",
+            tuple(entry_ids)
+        )
+
+    async def retry_purge(self, entry_ids: List[int], error: str, base_seconds: int, max_seconds: int) -> None:
+        """Schedule another attempt with exponential backoff (base * 2^attempts, capped)"""
+        await self._fetch(
+            f"""
+            UPDATE study_purge_queue
+            SET attempts = attempts + 1,
+                last_error = ?,
+                next_attempt_at = strftime('%Y-%m-%dT%H:%M:%f', 'now',
+                                           '+' || min(?, ? * (1 << min(attempts, 20))) || ' seconds')
+            WHERE id IN ({', '.join('?' for _ in entry_ids)})
+            """,
+            (error, max_seconds, base_seconds, *entry_ids)
+        )
+
+    async def get_purge_stats(self) -> Dict[str, int]:
+        """Queue length and entries that have failed at least once"""
+        rows = await self._fetch(
+            "SELECT count(*) AS queued, coalesce(sum(attempts > 0), 0) AS retrying FROM study_purge_queue"
+        )
+        return rows[0]
+
+    # ==================== PRACTICE POOLS ====================
+
+    async def add_practice_questions(self, question_id: int, practice: List[Dict[str, str]]) -> int:
+        """
+        Add generated practice questions to a question's pool, skipping ones already in it
+
+        Args:
+            question_id: Question the practice questions are for
+            practice: [{"question_text", "text_key"}]; text_key (normalized text) is unique per pool
+
+        Returns:
+            Number of practice questions added
+        """
+        if not practice:
+            return 0
+        now = datetime.utcnow().isoformat()
+        rows = await self._fetch(
+            f"""
+            INSERT INTO study_practice_questions (question_id, question_text, text_key, created_at)
+            VALUES {', '.join('(?, ?, ?, ?)' for _ in practice)}
+            ON CONFLICT (question_id, text_key) DO NOTHING
+            RETURNING id
+            """,
+            tuple(value for item in practice for value in (question_id, item["question_text"], item["text_key"], now))
+        )
+        return len(rows)
+
+    async def get_practice_questions(self, question_id: int) -> List[Dict[str, Any]]:
+        """A question's whole practice pool, oldest first"""
+        return await self._fetch(
+            "SELECT * FROM study_practice_questions WHERE question_id = ? ORDER BY id", (question_id,)
+        )
+
+    async def count_practice_questions(self, question_id: int) -> int:
+        """Size of a question's practice pool"""
+        rows = await self._fetch(
+            "SELECT count(*) AS n FROM study_practice_questions WHERE question_id = ?", (question_id,)
+        )
+        return rows[0]["n"]
+
+    async def take_practice_questions(self, question_id: int, limit: int) -> Tuple[List[Dict[str, Any]], Dict[str, int]]:
+        """
+        Serve practice questions from a pool, least served first, counting them as served
+
+        Returns:
+            Tuple of (up to limit practice questions, the pool's unseen ones first;
+            {"size", "unseen"} of the pool after this take)
+        """
+        rows = await self._fetch(
+            """
+            UPDATE study_practice_questions SET served_count = served_count + 1, last_served_at = ?
+            WHERE id IN (
+                SELECT id FROM study_practice_questions WHERE question_id = ?
+                ORDER BY served_count, last_served_at, id LIMIT ?
+            )
+            RETURNING *
+            """,
+            (datetime.utcnow().isoformat(), question_id, limit)
+        )
+        pool = await self._fetch(
+            "SELECT count(*) AS size, coalesce(sum(served_count = 0), 0) AS unseen "
+            "FROM study_practice_questions WHERE question_id = ?",
+            (question_id,)
+        )
+        return sorted(rows, key=lambda row: row["id"]), pool[0]
+
+    # ==================== APP CONFIG ====================
+
+    async def get_app_config(self, key: str) -> Optional[Any]:
+        """Get a JSON config value shared by all app processes (None if unset)"""
+        rows = await self._fetch("SELECT value FROM study_app_config WHERE key = ?", (key,))
+        return json.loads(rows[0]["value"]) if rows else None
+
+    async def set_app_config(self, key: str, value: Any) -> None:
+        """Set a JSON config value in a single-row write"""
+        await self._fetch(
+            """
+            INSERT INTO study_app_config (key, value, updated_at) VALUES (?, ?, ?)
+            ON CONFLICT (key) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at
+            """,
+            (key, json.dumps(value), datetime.utcnow().isoformat())
+        )
+
+    # ==================== UPLOAD HISTORY OPERATIONS ====================
+
+    async def create_upload_history(
+        self,
+        user_id: int,
+        filename: str,
+        subject: Optional[str] = None,
+        questions_extracted: int = 0,
+        status: str = "processing",
+        error_message: Optional[str] = None,
+        pages_total: int = 1
+    ) -> Dict[str, Any]:
+        """Create upload history record"""
+        record = await self._insert("study_upload_history", {
+            "user_id": user_id,
+            "filename": filename,
+            "subject": subject,
+            "questions_extracted": questions_extracted,
+            "status": status,
+            "error_message": error_message,
+            "pages_total": pages_total,
+            "created_at": datetime.utcnow().isoformat()
+        })
+
+        user_versions.bump(user_id)
+        return record
+
+    async def get_upload_history_by_id(self, upload_id: int) -> Optional[Dict[str, Any]]:
+        """Get upload history by ID"""
+        rows = await self._fetch("SELECT * FROM study_upload_history WHERE id = ?", (upload_id,))
+        return rows[0] if rows else None
+
+    async def get_upload_history_by_user(
+        self,
+        user_id: int,
+        limit: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """Get upload history for a user"""
+        sql = "SELECT * FROM study_upload_history WHERE user_id = ? ORDER BY created_at DESC, id DESC"
+        params: tuple = (user_id,)
+        if limit:
+            sql += " LIMIT ?"
+            params += (limit,)
+
+        key = ("get_upload_history_by_user", user_id, limit, user_versions.get_version(user_id)[0])
+        return await self._read(key, sql, params)
+
+    async def update_upload_history(self, upload_id: int, **kwargs) -> Dict[str, Any]:
+        """Update upload history fields"""
+        rows = await self._update("study_upload_history", UPLOAD_HISTORY_COLUMNS, upload_id, kwargs)
+
+        self._bump_owners(rows)
+        return rows[0] if rows else None
+
+    async def delete_upload_history(self, upload_id: int) -> bool:
+        """Delete upload history"""
+        rows = await self._fetch(
+            "DELETE FROM study_upload_history WHERE id = ? RETURNING id, user_id", (upload_id,)
+        )
+
+        self._bump_owners(rows)
+        return len(rows) > 0
+
+
+def create_sqlite_connection() -> SQLiteConnection:
+    """Open a connection to the configured DATABASE_URL file (used by the local vector store)"""
+    return SQLiteConnection(sqlite_path_from_url(settings.DATABASE_URL))
@@ -0,0 +1,178 @@
+"""
+Storage Backend
+Interface shared by the image stores (Supabase bucket, local filesystem,
+and the disk cache in front of the bucket)
+
+Objects are addressed by a relative path, normally the content address of
+their bytes, so a path never changes content once written. Backends map
+paths to the URLs stored on questions and back.
+"""
+
+import hashlib
+import os
+import re
+import tempfile
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional
+
+# "ab/cd/<sha256>.<ext>" - see content_address()
+CONTENT_ADDRESS_PATTERN = re.compile(r"^([0-9a-f]{2})/([0-9a-f]{2})/(\1\2[0-9a-f]{60})\.[a-z0-9]+$")
+
+
+def content_address(file_data: bytes, file_ext: str) -> str:
+    """
+    Storage path derived from the content: "ab/cd/<sha256>.<ext>"
+
+    Identical images map to the same object; the two-level prefix keeps
+    directory listings (and local directories) small.
+    """
+    return digest_address(hashlib.sha256(file_data).hexdigest(), file_ext)
+
+
+def digest_address(digest: str, file_ext: str) -> str:
+    """Content address of a file from its sha256 hex digest (see content_address)"""
+    return f"{digest[:2]}/{digest[2:4]}/{digest}.{file_ext.lstrip('.').lower()}"
+
+
+def content_digest(path: str) -> Optional[str]:
+    """The sha256 of a content-addressed path, or None for any other path"""
+    match = CONTENT_ADDRESS_PATTERN.match(path)
+    return match.group(3) if match else None
+
+
+def safe_relative_path(path: str) -> str:
+    """Normalize an object path, refusing absolute paths and parent references"""
+    relative = os.path.normpath(path.split('?')[0]).replace(os.sep, "/")
+    if relative.startswith("..") or os.path.isabs(relative) or relative in ("", "."):
+        raise ValueError(f"Invalid object path: {path}")
+    return relative
+
+
+def write_file_atomic(full_path: str, file_data: bytes) -> None:
+    """
+    Write a file so readers see either nothing or the complete content
+
+    The bytes go to a temporary file in the same directory, are flushed to
+    disk, and are renamed over the target (rename is atomic on one filesystem).
+    Blocking; run in a worker thread.
+    """
+    directory = os.path.dirname(full_path)
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(file_data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, full_path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+class StorageBackend(ABC):
+    """Object store holding question images"""
+
+    enabled: bool = False
+
+    @abstractmethod
+    async def upload_object(self, path: str, file_data: bytes, content_type: str) -> str:
+        """
+        Write bytes to a path (overwriting is harmless: paths are content hashes)
+
+        Returns:
+            URL of the object
+        """
+
+    @abstractmethod
+    async def read_object(self, path: str) -> bytes:
+        """Read an object's bytes; raises FileNotFoundError if it does not exist"""
+
+    @abstractmethod
+    async def delete_object(self, path: str) -> bool:
+        """Delete an object; returns True if it was deleted"""
+
+    @abstractmethod
+    def object_url(self, path: str) -> str:
+        """URL of a path in this store"""
+
+    @abstractmethod
+    def object_path(self, url: str) -> Optional[str]:
+        """Path of a URL returned by this store, or None if the URL is not ours"""
+
+    @abstractmethod
+    async def object_exists(self, path: str) -> bool:
+        """Whether an object is stored at path"""
+
+    async def delete_objects(self, paths: List[str]) -> None:
+        """
+        Delete several objects (missing objects are fine); raises if any deletion failed
+
+        Backends with a batch delete override this.
+        """
+        failed = [path for path in paths if not await self.delete_object(path) and await self.object_exists(path)]
+        if failed:
+            raise IOError(f"Failed to delete {len(failed)} object(s)")
+
+    async def create_upload_url(self, path: str, content_type: str, expires_in: int) -> Dict[str, Any]:
+        """
+        Issue a short-lived URL the client can upload one object to directly
+
+        Returns:
+            {"url": ..., "method": ..., "headers": {...}, "expires_in": seconds}
+        """
+        raise NotImplementedError(f"{type(self).__name__} does not support direct uploads")
+
+    def local_file(self, path: str) -> Optional[str]:
+        """Filesystem path holding the object, if this store keeps it on local disk"""
+        return None
+
+    async def upload_image(self, file_data: bytes, filename: str, content_type: str) -> str:
+        """
+        Store an image under its content address
+
+        Args:
+            file_data: Raw bytes of the image file
+            filename: Original filename (used to extract extension)
+            content_type: MIME type of the file
+
+        Returns:
+            URL of the stored image
+        """
+        file_ext = filename.split('.')[-1].lower()
+        return await self.upload_object(content_address(file_data, file_ext), file_data, content_type)
+
+    async def read_image(self, image_url: str) -> bytes:
+        """Read an image by the URL returned from upload_image"""
+        path = self.object_path(image_url)
+        if path is None:
+            raise FileNotFoundError(f"Not a stored image: {image_url}")
+        return await self.read_object(path)
+
+    async def delete_image(self, image_url: str) -> bool:
+        """
+        Delete an image by the URL returned from upload_image
+
+        Returns:
+            True if deleted successfully, False otherwise (including URLs of
+            other stores, which are not ours to delete)
+        """
+        path = self.object_path(image_url)
+        if path is None:
+            return False
+        return await self.delete_object(path)
+
+    async def delete_images(self, image_urls: List[str]) -> int:
+        """
+        Delete several images by URL in one batch; raises if any deletion failed
+
+        Returns:
+            Number of URLs belonging to this store (other URLs are skipped)
+        """
+        paths = [path for path in map(self.object_path, image_urls) if path is not None]
+        if paths:
+            await self.delete_objects(paths)
+        return len(paths)
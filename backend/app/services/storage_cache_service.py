@@ -0,0 +1,219 @@
+"""
+Storage Cache Service
+Size-bounded LRU disk cache in front of a remote StorageBackend
+
+Reads of bucket objects (re-rendering, re-analysis, serving through the API)
+are answered from local disk after the first download, and uploads are written
+through, so a just-uploaded image is never downloaded again. Objects are
+content-addressed and never change, so cached copies need no revalidation;
+the least recently used files are evicted once the cache exceeds its budget.
+Paths the remote store does not have are remembered for MISSING_TTL_SECONDS,
+so repeated requests for them do not each cost a download attempt.
+"""
+
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from app.services.storage_backend import StorageBackend, safe_relative_path, write_file_atomic
+
+# How long a path found missing in the remote store is answered as missing without a
+# download (short: direct uploads reach the bucket without passing through the cache)
+MISSING_TTL_SECONDS = 30
+MISSING_MAX = 10_000
+
+
+class CachedStorageBackend(StorageBackend):
+    """Remote store with a local LRU disk cache"""
+
+    def __init__(self, remote: StorageBackend, cache_dir: str, max_bytes: int):
+        self.remote = remote
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, int]" = OrderedDict()  # path -> size, least recent first
+        self._bytes = 0
+        self._fills: Dict[str, asyncio.Future] = {}  # path -> in-flight download
+        self._missing: "OrderedDict[str, float]" = OrderedDict()  # path -> when found missing, oldest first
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "missing_hits": 0}
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._load()
+        print(f"✅ Storage cache initialized ({self.cache_dir}, {len(self._entries)} files, "
+              f"{self._bytes // (1024 * 1024)}/{max_bytes // (1024 * 1024)} MB)")
+
+    @property
+    def enabled(self) -> bool:
+        return self.remote.enabled
+
+    def _load(self) -> None:
+        """Index files left by a previous run, oldest access first"""
+        found = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                full_path = os.path.join(root, name)
+                if name.startswith(".tmp-"):
+                    os.remove(full_path)  # interrupted write
+                    continue
+                st = os.stat(full_path)
+                path = os.path.relpath(full_path, self.cache_dir).replace(os.sep, "/")
+                found.append((st.st_atime, path, st.st_size))
+        for _, path, size in sorted(found):
+            self._entries[path] = size
+            self._bytes += size
+        self._evict()
+
+    def _full_path(self, path: str) -> str:
+        return os.path.join(self.cache_dir, safe_relative_path(path))
+
+    def _touch(self, path: str) -> bool:
+        if path in self._entries:
+            self._entries.move_to_end(path)
+            return True
+        return False
+
+    def _add(self, path: str, size: int) -> None:
+        self._bytes += size - self._entries.pop(path, 0)
+        self._entries[path] = size
+        self._evict()
+
+    def _evict(self) -> None:
+        """Drop least recently used files until the cache fits its budget"""
+        while self._bytes > self.max_bytes and self._entries:
+            path, size = self._entries.popitem(last=False)
+            self._bytes -= size
+            self.stats["evictions"] += 1
+            try:
+                os.remove(self._full_path(path))
+            except OSError:
+                pass
+
+    def _discard(self, path: str) -> None:
+        self._bytes -= self._entries.pop(path, 0)
+        try:
+            os.remove(self._full_path(path))
+        except OSError:
+            pass
+
+    def _known_missing(self, path: str) -> bool:
+        found_missing = self._missing.get(path)
+        if found_missing is None:
+            return False
+        if time.monotonic() - found_missing < MISSING_TTL_SECONDS:
+            return True
+        del self._missing[path]
+        return False
+
+    def _note_missing(self, path: str) -> None:
+        self._missing.pop(path, None)
+        self._missing[path] = time.monotonic()
+        while len(self._missing) > MISSING_MAX:
+            self._missing.popitem(last=False)
+
+    async def _put(self, path: str, file_data: bytes) -> None:
+        self._missing.pop(path, None)
+        if len(file_data) > self.max_bytes:
+            return
+        await asyncio.to_thread(write_file_atomic, self._full_path(path), file_data)
+        self._add(path, len(file_data))
+
+    async def _fill(self, path: str) -> bytes:
+        """Download an object into the cache; concurrent misses share one download"""
+        if path in self._fills:
+            return await asyncio.shield(self._fills[path])
+        if self._known_missing(path):
+            self.stats["missing_hits"] += 1
+            raise FileNotFoundError(path)
+
+        future = asyncio.get_running_loop().create_future()
+        self._fills[path] = future
+        try:
+            file_data = await self.remote.read_object(path)
+            await self._put(path, file_data)
+            future.set_result(file_data)
+            return file_data
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            if isinstance(e, FileNotFoundError):
+                self._note_missing(path)
+            future.set_exception(e)
+            future.exception()  # mark retrieved when nobody else is waiting
+            raise
+        finally:
+            self._fills.pop(path, None)
+
+    async def upload_object(self, path: str, file_data: bytes, content_type: str) -> str:
+        """Upload to the remote store and keep a cached copy"""
+        url = await self.remote.upload_object(path, file_data, content_type)
+        try:
+            await self._put(path, file_data)
+        except OSError as e:
+            print(f"⚠️  Storage cache write failed: {e}")
+        return url
+
+    async def read_object(self, path: str) -> bytes:
+        """Read from the cache, downloading from the remote store on a miss"""
+        if self._touch(path):
+            try:
+                file_data = await asyncio.to_thread(self._read, self._full_path(path))
+                self.stats["hits"] += 1
+                return file_data
+            except OSError:
+                self._discard(path)
+        self.stats["misses"] += 1
+        return await self._fill(path)
+
+    def _read(self, full_path: str) -> bytes:
+        with open(full_path, "rb") as f:
+            return f.read()
+
+    async def delete_object(self, path: str) -> bool:
+        """Delete from the remote store and the cache"""
+        self._discard(path)
+        return await self.remote.delete_object(path)
+
+    async def delete_objects(self, paths: List[str]) -> None:
+        """Delete from the remote store (one batch) and the cache"""
+        for path in paths:
+            self._discard(path)
+        await self.remote.delete_objects(paths)
+
+    async def object_exists(self, path: str) -> bool:
+        return path in self._entries or await self.remote.object_exists(path)
+
+    async def create_upload_url(self, path: str, content_type: str, expires_in: int) -> Dict[str, Any]:
+        # Direct uploads bypass the cache; the object is cached when first read
+        return await self.remote.create_upload_url(path, content_type, expires_in)
+
+    def object_url(self, path: str) -> str:
+        return self.remote.object_url(path)
+
+    def object_path(self, url: str) -> Optional[str]:
+        return self.remote.object_path(url)
+
+    async def cached_file(self, path: str) -> Optional[str]:
+        """
+        Filesystem path of a cached copy of the object, downloading it if needed
+
+        Returns:
+            The cached file, or None if the object is too large to cache
+        """
+        if self._touch(path) and os.path.exists(self._full_path(path)):
+            self.stats["hits"] += 1
+        else:
+            self.stats["misses"] += 1
+            await self._fill(path)
+        full_path = self._full_path(path)
+        return full_path if path in self._entries else None
+
+    def get_stats(self) -> Dict[str, int]:
+        """Get cache counters and occupancy"""
+        return {
+            **self.stats,
+            "files": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "missing": len(self._missing)
+        }
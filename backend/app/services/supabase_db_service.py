@@ -4,16 +4,26 @@ Replaces SQLAlchemy with direct Supabase SDK operations
 Handles all CRUD operations for users, questions, and upload_history
 """
 
-from typing import Optional, List, Dict, Any
-from datetime import datetime
+import asyncio
+from typing import Optional, List, Dict, Any, Tuple
+from datetime import datetime, timezone
 from app.config import settings
+from app.services.db_service_base import (
+    DBServiceBase,
+    USER_LIST_COLUMNS,
+    decode_cursor,
+    page_result,
+    user_sort_column
+)
+from app.services.user_version_service import user_versions
 from supabase import create_client, Client
 
-class SupabaseDBService:
+class SupabaseDBService(DBServiceBase):
     """Unified database service using Supabase SDK"""
 
     def __init__(self):
         """Initialize Supabase client"""
+        super().__init__()
         try:
             # Use anon key with RLS policies for security
             self.client: Client = create_client(
@@ -27,6 +37,10 @@ class SupabaseDBService:
             self.client = None
             self.enabled = False
 
+    async def _read(self, key: tuple, query) -> Any:
+        """Execute a PostgREST read in a worker thread, coalescing identical concurrent reads"""
+        return await self._singleflight(key, lambda: asyncio.to_thread(query.execute))
+
     # ==================== USER OPERATIONS ====================
 
     async def create_user(self, email: str, name: str, google_id: str,
@@ -46,33 +60,39 @@ class SupabaseDBService:
         }
 
         result = self.client.table("study_users").insert(data).execute()
-        return result.data[0] if result.data else None
+        user = result.data[0] if result.data else None
+        if user:
+            user_versions.bump(user["id"])  # Lookups by email / Google ID must see the new user
+        return user
 
     async def get_user_by_id(self, user_id: int) -> Optional[Dict[str, Any]]:
         """Get user by ID"""
-        result = self.client.table("study_users")\
+        query = self.client.table("study_users")\
             .select("*")\
-            .eq("id", user_id)\
-            .execute()
+            .eq("id", user_id)
 
+        key = ("get_user_by_id", user_id, user_versions.get_version(user_id)[0])
+        result = await self._read(key, query)
         return result.data[0] if result.data else None
 
     async def get_user_by_email(self, email: str) -> Optional[Dict[str, Any]]:
         """Get user by email"""
-        result = self.client.table("study_users")\
+        query = self.client.table("study_users")\
             .select("*")\
-            .eq("email", email)\
-            .execute()
+            .eq("email", email)
 
+        key = ("get_user_by_email", email, user_versions.get_write_count())
+        result = await self._read(key, query)
         return result.data[0] if result.data else None
 
     async def get_user_by_google_id(self, google_id: str) -> Optional[Dict[str, Any]]:
         """Get user by Google ID"""
-        result = self.client.table("study_users")\
+        query = self.client.table("study_users")\
             .select("*")\
-            .eq("google_id", google_id)\
-            .execute()
+            .eq("google_id", google_id)
 
+        key = ("get_user_by_google_id", google_id, user_versions.get_write_count())
+        result = await self._read(key, query)
         return result.data[0] if result.data else None
 
     async def update_user(self, user_id: int, **kwargs) -> Dict[str, Any]:
@@ -84,127 +104,73 @@ class SupabaseDBService:
             .eq("id", user_id)\
             .execute()
 
+        user_versions.bump(user_id)
         return result.data[0] if result.data else None
 
-    async def update_user_grade(self, user_id: int, grade: str) -> Dict[str, Any]:
-        """Update user's grade"""
-        return await self.update_user(user_id, grade=grade)
-
-    async def add_token_usage(self, user_id: int, prompt_tokens: int,
-                             completion_tokens: int, total_tokens: int) -> Dict[str, Any]:
+    async def get_all_users_token_usage(self, limit: Optional[int] = None) -> Dict[str, Any]:
         """
-        Add token usage to user's total
+        Get system-wide token usage across all users
 
         Args:
-            user_id: User ID
-            prompt_tokens: Prompt/input tokens used
-            completion_tokens: Completion/output tokens used
-            total_tokens: Total tokens used
-        """
-        # Get current token counts
-        user = await self.get_user_by_id(user_id)
-        if not user:
-            raise ValueError(f"User {user_id} not found")
-
-        current_total = user.get('total_tokens_used', 0) or 0
-        current_prompt = user.get('prompt_tokens_used', 0) or 0
-        current_completion = user.get('completion_tokens_used', 0) or 0
-
-        # Update with new usage
-        update_data = {
-            'total_tokens_used': current_total + total_tokens,
-            'prompt_tokens_used': current_prompt + prompt_tokens,
-            'completion_tokens_used': current_completion + completion_tokens,
-            'last_token_update': datetime.utcnow().isoformat()
-        }
-
-        return await self.update_user(user_id, **update_data)
-
-    async def get_user_token_usage(self, user_id: int) -> Dict[str, Any]:
-        """
-        Get user's token usage statistics
-
-        Returns:
-            Dict with total_tokens_used, prompt_tokens_used, completion_tokens_used, last_token_update
-        """
-        user = await self.get_user_by_id(user_id)
-        if not user:
-            return {
-                'total_tokens_used': 0,
-                'prompt_tokens_used': 0,
-                'completion_tokens_used': 0,
-                'last_token_update': None
-            }
-
-        return {
-            'total_tokens_used': user.get('total_tokens_used', 0) or 0,
-            'prompt_tokens_used': user.get('prompt_tokens_used', 0) or 0,
-            'completion_tokens_used': user.get('completion_tokens_used', 0) or 0,
-            'last_token_update': user.get('last_token_update')
-        }
-
-    async def get_all_users_token_usage(self) -> Dict[str, Any]:
-        """
-        Get system-wide token usage across all users
+            limit: Only return the top-K users by usage (all users if None)
 
         Returns:
             Dict with:
             - total_tokens: Sum of all users' tokens
             - total_prompt_tokens: Sum of all prompt tokens
             - total_completion_tokens: Sum of all completion tokens
-            - users: List of individual user token usage
+            - total_users: Number of users
+            - users: Individual user token usage, highest first
         """
-        # Fetch all users with token data
-        result = self.client.table("study_users")\
-            .select("id, email, name, total_tokens_used, prompt_tokens_used, completion_tokens_used, last_token_update")\
-            .execute()
-
-        users_data = result.data if result.data else []
+        # Totals are aggregated in the database (see migrations/add_user_listing_indexes.sql)
+        totals_result = self.client.rpc("study_token_usage_totals", {}).execute()
+        totals = totals_result.data[0] if totals_result.data else {}
 
-        # Calculate totals
-        total_tokens = 0
-        total_prompt_tokens = 0
-        total_completion_tokens = 0
-        users_list = []
+        # Top-K users sorted server-side
+        query = self.client.table("study_users")\
+            .select("id, email, name, total_tokens_used, prompt_tokens_used, completion_tokens_used, last_token_update")\
+            .order("total_tokens_used", desc=True)\
+            .order("id", desc=True)
 
-        for user in users_data:
-            user_total = user.get('total_tokens_used', 0) or 0
-            user_prompt = user.get('prompt_tokens_used', 0) or 0
-            user_completion = user.get('completion_tokens_used', 0) or 0
+        if limit:
+            query = query.limit(limit)
 
-            total_tokens += user_total
-            total_prompt_tokens += user_prompt
-            total_completion_tokens += user_completion
+        result = query.execute()
+        users_data = result.data if result.data else []
 
-            users_list.append({
+        users_list = [
+            {
                 'user_id': user.get('id'),
                 'email': user.get('email'),
                 'name': user.get('name'),
-                'total_tokens_used': user_total,
-                'prompt_tokens_used': user_prompt,
-                'completion_tokens_used': user_completion,
+                'total_tokens_used': user.get('total_tokens_used', 0) or 0,
+                'prompt_tokens_used': user.get('prompt_tokens_used', 0) or 0,
+                'completion_tokens_used': user.get('completion_tokens_used', 0) or 0,
                 'last_token_update': user.get('last_token_update')
-            })
-
-        # Sort users by total tokens (highest first)
-        users_list.sort(key=lambda x: x['total_tokens_used'], reverse=True)
+            }
+            for user in users_data
+        ]
 
         return {
-            'total_tokens': total_tokens,
-            'total_prompt_tokens': total_prompt_tokens,
-            'total_completion_tokens': total_completion_tokens,
-            'total_users': len(users_data),
+            'total_tokens': totals.get('total_tokens', 0) or 0,
+            'total_prompt_tokens': totals.get('total_prompt_tokens', 0) or 0,
+            'total_completion_tokens': totals.get('total_completion_tokens', 0) or 0,
+            'total_users': totals.get('total_users', 0) or 0,
             'users': users_list
         }
 
     async def delete_user(self, user_id: int) -> bool:
-        """Delete user"""
-        result = self.client.table("study_users")\
-            .delete()\
-            .eq("id", user_id)\
-            .execute()
+        """
+        Delete user together with their questions and upload history
 
-        return len(result.data) > 0
+        The questions' embeddings and images are queued for the purge worker
+        (delete_user_queued, see migrations/add_deletion_purge_queue.sql).
+        """
+        query = self.client.rpc("delete_user_queued", {"p_user_id": user_id})
+        result = await asyncio.to_thread(query.execute)
+
+        user_versions.bump(user_id)
+        return len(result.data or []) > 0
 
     async def get_all_users(self) -> List[Dict[str, Any]]:
         """Get all users (admin only)"""
@@ -215,6 +181,44 @@ class SupabaseDBService:
 
         return result.data if result.data else []
 
+    async def get_users_page(
+        self,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        sort: str = "created_at",
+        search: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Get one page of users (admin only), sorted and filtered server-side
+
+        Args:
+            limit: Page size
+            cursor: next_cursor from the previous page
+            sort: "created_at" (newest first) or "tokens" (highest usage first)
+            search: Case-insensitive email or name prefix
+
+        Returns:
+            Dict with users and next_cursor (None on the last page)
+        """
+        column = user_sort_column(sort)
+        query = self.client.table("study_users").select(USER_LIST_COLUMNS)
+
+        if search:
+            # Strip PostgREST/LIKE metacharacters; the prefix is served by the trigram indexes
+            prefix = "".join(ch for ch in search if ch not in ',()"\\*%')
+            query = query.or_(f'email.ilike."{prefix}*",name.ilike."{prefix}*"')
+
+        if cursor:
+            value, last_id = decode_cursor(cursor)
+            query = query.or_(f'{column}.lt."{value}",and({column}.eq."{value}",id.lt.{last_id})')
+
+        result = query.order(column, desc=True)\
+            .order("id", desc=True)\
+            .limit(limit + 1)\
+            .execute()
+
+        return page_result(result.data or [], limit, column)
+
     # ==================== QUESTION OPERATIONS ====================
 
     async def create_question(
@@ -225,6 +229,8 @@ class SupabaseDBService:
         grade: Optional[str] = None,
         image_url: Optional[str] = None,
         image_snippet_url: Optional[str] = None,
+        image_thumbnail_url: Optional[str] = None,
+        image_review_url: Optional[str] = None,
         explanation: Optional[str] = None,
         status: str = "pending",
         vector_id: Optional[str] = None,
@@ -238,6 +244,8 @@ class SupabaseDBService:
             "grade": grade,
             "image_url": image_url,
             "image_snippet_url": image_snippet_url,
+            "image_thumbnail_url": image_thumbnail_url,
+            "image_review_url": image_review_url,
             "explanation": explanation,
             "status": status,
             "vector_id": vector_id,
@@ -247,17 +255,50 @@ class SupabaseDBService:
         }
 
         result = self.client.table("study_questions").insert(data).execute()
+        user_versions.bump(user_id)
         return result.data[0] if result.data else None
 
     async def get_question_by_id(self, question_id: int) -> Optional[Dict[str, Any]]:
         """Get question by ID"""
-        result = self.client.table("study_questions")\
+        query = self.client.table("study_questions")\
             .select("*")\
-            .eq("id", question_id)\
-            .execute()
+            .eq("id", question_id)
 
+        key = ("get_question_by_id", question_id, user_versions.get_write_count())
+        result = await self._read(key, query)
         return result.data[0] if result.data else None
 
+    async def get_questions_by_ids(
+        self,
+        question_ids: List[int],
+        user_id: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Get several questions in one round trip
+
+        Args:
+            question_ids: IDs to fetch; the result keeps this order (e.g. search ranking)
+            user_id: If given, only questions owned by this user are returned
+
+        Returns:
+            Questions found, ordered like question_ids
+        """
+        ids = list(dict.fromkeys(question_ids))
+        if not ids:
+            return []
+
+        query = self.client.table("study_questions")\
+            .select("*")\
+            .in_("id", ids)
+
+        if user_id is not None:
+            query = query.eq("user_id", user_id)
+
+        key = ("get_questions_by_ids", tuple(ids), user_id,
+               user_versions.get_version(user_id)[0] if user_id is not None else user_versions.get_write_count())
+        result = await self._read(key, query)
+        return self._order_by_ids(result.data or [], ids)
+
     async def get_questions_by_user(
         self,
         user_id: int,
@@ -284,9 +325,47 @@ class SupabaseDBService:
         if limit:
             query = query.limit(limit)
 
-        result = query.execute()
+        key = ("get_questions_by_user", user_id, status, subject, grade, limit,
+               user_versions.get_version(user_id)[0])
+        result = await self._read(key, query)
         return result.data if result.data else []
 
+    async def get_pending_explanations_after(
+        self,
+        user_id: int,
+        after_question_id: int,
+        limit: int
+    ) -> List[Dict[str, Any]]:
+        """
+        Next questions waiting for a lazily generated explanation, in review order
+        (GET /questions/wrong: newest first) after a given question
+
+        Args:
+            user_id: Owner of the questions
+            after_question_id: The question the student opened
+            limit: Largest number of questions returned
+
+        Returns:
+            Pending questions not marked understood, older than the opened one
+        """
+        opened = await self.get_question_by_id(after_question_id)
+        if not opened:
+            return []
+
+        created_at = opened["created_at"]
+        query = self.client.table("study_questions")\
+            .select("*")\
+            .eq("user_id", user_id)\
+            .is_("explanation", "null")\
+            .neq("status", "understood")\
+            .eq("question_metadata->explanation->>source", "pending")\
+            .or_(f'created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt.{after_question_id})')\
+            .order("created_at", desc=True)\
+            .order("id", desc=True)\
+            .limit(limit)
+        result = await asyncio.to_thread(query.execute)
+        return result.data or []
+
     async def update_question(self, question_id: int, **kwargs) -> Dict[str, Any]:
         """Update question fields"""
         kwargs['updated_at'] = datetime.utcnow().isoformat()
@@ -296,11 +375,64 @@ class SupabaseDBService:
             .eq("id", question_id)\
             .execute()
 
+        self._bump_owners(result.data)
         return result.data[0] if result.data else None
 
-    async def update_question_status(self, question_id: int, status: str) -> Dict[str, Any]:
-        """Update question status"""
-        return await self.update_question(question_id, status=status)
+    async def update_questions(
+        self,
+        user_id: int,
+        question_ids: List[int],
+        full_rows: bool = True,
+        explanation_provenance: Optional[Dict[str, Any]] = None,
+        **kwargs
+    ) -> List[Dict[str, Any]]:
+        """
+        Update the same fields on several of a user's questions in one statement
+
+        Ownership is part of the statement's filter, so no per-question lookup is needed.
+
+        Args:
+            user_id: Owner; questions of other users are not touched
+            question_ids: Questions to update
+            full_rows: Return whole rows (False: only id and user_id; PostgREST
+                returns whole rows either way, trimmed here)
+            explanation_provenance: Set as question_metadata["explanation"] of every
+                updated row in the same statement (the rest of its metadata is kept;
+                only status and explanation may be set alongside it)
+            **kwargs: Columns to set
+
+        Returns:
+            Updated rows (IDs not found or not owned are absent)
+        """
+        if not question_ids:
+            return []
+
+        if explanation_provenance is not None:
+            # PostgREST can't merge into each row's JSON, so the function does it
+            unknown = set(kwargs) - {"status", "explanation"}
+            if unknown:
+                raise ValueError(f"Unknown columns: {', '.join(sorted(unknown))}")
+            query = self.client.rpc("update_questions_explanation", {
+                "p_user_id": user_id,
+                "p_question_ids": list(question_ids),
+                "p_provenance": explanation_provenance,
+                "p_explanation": kwargs.get("explanation"),
+                "p_status": kwargs.get("status")
+            })
+        else:
+            kwargs['updated_at'] = datetime.utcnow().isoformat()
+            query = self.client.table("study_questions")\
+                .update(kwargs)\
+                .eq("user_id", user_id)\
+                .in_("id", list(question_ids))
+        result = await asyncio.to_thread(query.execute)
+
+        rows = result.data or []
+        if rows:
+            user_versions.bump(user_id)
+        if not full_rows:
+            rows = [{"id": row["id"], "user_id": row["user_id"]} for row in rows]
+        return rows
 
     async def delete_question(self, question_id: int) -> bool:
         """Delete question"""
@@ -309,8 +441,31 @@ class SupabaseDBService:
             .eq("id", question_id)\
             .execute()
 
+        self._bump_owners(result.data)
         return len(result.data) > 0
 
+    async def delete_questions(self, user_id: int, question_ids: List[int]) -> List[int]:
+        """
+        Delete several of a user's questions in one statement
+
+        Their embeddings and image references are queued for the purge worker
+        in the same statement, so the rows disappear immediately and nothing is
+        left orphaned.
+
+        Returns:
+            IDs deleted (IDs not found or not owned by the user are skipped)
+        """
+        query = self.client.rpc("delete_questions_queued", {
+            "p_user_id": user_id,
+            "p_question_ids": list(question_ids)
+        })
+        result = await asyncio.to_thread(query.execute)
+
+        deleted = [row["id"] for row in result.data or []]
+        if deleted:
+            user_versions.bump(user_id)
+        return deleted
+
     async def count_questions_by_user(self, user_id: int, status: Optional[str] = None) -> int:
         """Count questions for a user"""
         query = self.client.table("study_questions")\
@@ -320,9 +475,218 @@ class SupabaseDBService:
         if status:
             query = query.eq("status", status)
 
-        result = query.execute()
+        key = ("count_questions_by_user", user_id, status, user_versions.get_version(user_id)[0])
+        result = await self._read(key, query)
         return result.count if result.count else 0
 
+    async def search_question_ids(self, user_id: int, query: str, limit: int = 20) -> List[int]:
+        """
+        Full-text search over the user's question text
+
+        Any query term may match; questions matching more (and rarer) terms rank higher.
+
+        Returns:
+            Matching question IDs, best match first
+        """
+        rpc = self.client.rpc("search_question_ids", {
+            "p_user_id": user_id,
+            "p_query": query,
+            "match_count": limit
+        })
+
+        key = ("search_question_ids", user_id, query, limit, user_versions.get_version(user_id)[0])
+        result = await self._read(key, rpc)
+        return [row["id"] for row in result.data or []]
+
+    async def get_questions_batch(self, after_id: int = 0, limit: int = 500) -> List[Dict[str, Any]]:
+        """
+        Page through all users' questions in id order (maintenance jobs)
+
+        Args:
+            after_id: Return questions with id > after_id
+            limit: Page size
+
+        Returns:
+            Questions (id, user_id, subject, grade, question_text, vector_id), ascending id
+        """
+        query = self.client.table("study_questions")\
+            .select("id, user_id, subject, grade, question_text, vector_id")\
+            .gt("id", after_id)\
+            .order("id")\
+            .limit(limit)
+
+        result = await asyncio.to_thread(query.execute)
+        return result.data or []
+
+    # ==================== IMAGE REFERENCES ====================
+
+    async def acquire_image_refs(self, counts: Dict[str, int]) -> Dict[str, int]:
+        """
+        Add references to stored images
+
+        Args:
+            counts: {image_url: references to add}
+
+        Returns:
+            {image_url: reference count after adding}; a count equal to the
+            number added means the image was not stored before
+        """
+        urls = list(counts)
+        query = self.client.rpc("acquire_image_refs", {
+            "p_urls": urls,
+            "p_counts": [counts[url] for url in urls]
+        })
+        result = await asyncio.to_thread(query.execute)
+        return {row["url"]: row["ref_count"] for row in result.data or []}
+
+    async def release_image_refs(self, counts: Dict[str, int]) -> List[str]:
+        """
+        Drop references to stored images
+
+        Args:
+            counts: {image_url: references to drop}
+
+        Returns:
+            URLs whose last reference went (their rows are deleted; the caller
+            deletes the objects). URLs without a reference row are ignored
+        """
+        urls = list(counts)
+        query = self.client.rpc("release_image_refs", {
+            "p_urls": urls,
+            "p_counts": [counts[url] for url in urls]
+        })
+        result = await asyncio.to_thread(query.execute)
+        return [row["url"] for row in result.data or []]
+
+    # ==================== PURGE QUEUE ====================
+
+    async def enqueue_image_purge(self, image_urls: List[str]) -> None:
+        """Queue unreferenced images whose deletion failed, for the purge worker to retry"""
+        query = self.client.table("study_purge_queue").insert({
+            "image_urls": list(image_urls),
+            "refs_released": True
+        })
+        await asyncio.to_thread(query.execute)
+
+    async def get_purge_batch(self, limit: int) -> List[Dict[str, Any]]:
+        """Queue entries due for an attempt, oldest first"""
+        query = self.client.table("study_purge_queue")\
+            .select("id, question_id, user_id, image_urls, refs_released, attempts")\
+            .lte("next_attempt_at", datetime.now(timezone.utc).isoformat())\
+            .order("id")\
+            .limit(limit)
+        result = await asyncio.to_thread(query.execute)
+        return result.data or []
+
+    async def release_purge_refs(self, entry_ids: List[int]) -> List[str]:
+        """
+        Drop the image references of queue entries, once per entry
+
+        Each entry is left listing only its images whose last reference went,
+        so a retried entry never drops references twice.
+
+        Returns:
+            Images of the entries left unreferenced (the caller deletes them)
+        """
+        query = self.client.rpc("release_purge_refs", {"p_ids": entry_ids})
+        result = await asyncio.to_thread(query.execute)
+        return [row["url"] for row in result.data or []]
+
+    async def finish_purge(self, entry_ids: List[int]) -> None:
+        """Remove completed entries from the queue"""
+        query = self.client.table("study_purge_queue").delete().in_("id", entry_ids)
+        await asyncio.to_thread(query.execute)
+
+    async def retry_purge(self, entry_ids: List[int], error: str, base_seconds: int, max_seconds: int) -> None:
+        """Schedule another attempt with exponential backoff (base * 2^attempts, capped)"""
+        query = self.client.rpc("retry_purge", {
+            "p_ids": entry_ids,
+            "p_error": error,
+            "p_base_seconds": base_seconds,
+            "p_max_seconds": max_seconds
+        })
+        await asyncio.to_thread(query.execute)
+
+    async def get_purge_stats(self) -> Dict[str, int]:
+        """Queue length and entries that have failed at least once"""
+        queued = self.client.table("study_purge_queue").select("id", count="exact").limit(1)
+        retrying = self.client.table("study_purge_queue").select("id", count="exact").gt("attempts", 0).limit(1)
+        queued, retrying = await asyncio.gather(asyncio.to_thread(queued.execute), asyncio.to_thread(retrying.execute))
+        return {"queued": queued.count or 0, "retrying": retrying.count or 0}
+
+    # ==================== PRACTICE POOLS ====================
+
+    async def add_practice_questions(self, question_id: int, practice: List[Dict[str, str]]) -> int:
+        """
+        Add generated practice questions to a question's pool, skipping ones already in it
+
+        Args:
+            question_id: Question the practice questions are for
+            practice: [{"question_text", "text_key"}]; text_key (normalized text) is unique per pool
+
+        Returns:
+            Number of practice questions added
+        """
+        if not practice:
+            return 0
+        query = self.client.table("study_practice_questions").upsert(
+            [
+                {"question_id": question_id, "question_text": item["question_text"], "text_key": item["text_key"]}
+                for item in practice
+            ],
+            on_conflict="question_id,text_key",
+            ignore_duplicates=True
+        )
+        result = await asyncio.to_thread(query.execute)
+        return len(result.data or [])
+
+    async def get_practice_questions(self, question_id: int) -> List[Dict[str, Any]]:
+        """A question's whole practice pool, oldest first"""
+        query = self.client.table("study_practice_questions")\
+            .select("*")\
+            .eq("question_id", question_id)\
+            .order("id")
+        result = await asyncio.to_thread(query.execute)
+        return result.data or []
+
+    async def count_practice_questions(self, question_id: int) -> int:
+        """Size of a question's practice pool"""
+        query = self.client.table("study_practice_questions")\
+            .select("id", count="exact")\
+            .eq("question_id", question_id)\
+            .limit(1)
+        result = await asyncio.to_thread(query.execute)
+        return result.count or 0
+
+    async def take_practice_questions(self, question_id: int, limit: int) -> Tuple[List[Dict[str, Any]], Dict[str, int]]:
+        """
+        Serve practice questions from a pool, least served first, counting them as served
+
+        Returns:
+            Tuple of (up to limit practice questions, the pool's unseen ones first;
+            {"size", "unseen"} of the pool after this take)
+        """
+        query = self.client.rpc("take_practice_questions", {"p_question_id": question_id, "p_limit": limit})
+        result = await asyncio.to_thread(query.execute)
+        return self._split_pool_counts(result.data or [])
+
+    # ==================== APP CONFIG ====================
+
+    async def get_app_config(self, key: str) -> Optional[Any]:
+        """Get a JSON config value shared by all app processes (None if unset)"""
+        query = self.client.table("study_app_config").select("value").eq("key", key)
+        result = await asyncio.to_thread(query.execute)
+        return result.data[0]["value"] if result.data else None
+
+    async def set_app_config(self, key: str, value: Any) -> None:
+        """Set a JSON config value in a single-row write"""
+        query = self.client.table("study_app_config").upsert({
+            "key": key,
+            "value": value,
+            "updated_at": datetime.utcnow().isoformat()
+        })
+        await asyncio.to_thread(query.execute)
+
     # ==================== UPLOAD HISTORY OPERATIONS ====================
 
     async def create_upload_history(
@@ -332,7 +696,8 @@ class SupabaseDBService:
         subject: Optional[str] = None,
         questions_extracted: int = 0,
         status: str = "processing",
-        error_message: Optional[str] = None
+        error_message: Optional[str] = None,
+        pages_total: int = 1
     ) -> Dict[str, Any]:
         """Create upload history record"""
         data = {
@@ -342,10 +707,12 @@ class SupabaseDBService:
             "questions_extracted": questions_extracted,
             "status": status,
             "error_message": error_message,
+            "pages_total": pages_total,
             "created_at": datetime.utcnow().isoformat()
         }
 
         result = self.client.table("study_upload_history").insert(data).execute()
+        user_versions.bump(user_id)
         return result.data[0] if result.data else None
 
     async def get_upload_history_by_id(self, upload_id: int) -> Optional[Dict[str, Any]]:
@@ -371,7 +738,8 @@ class SupabaseDBService:
         if limit:
             query = query.limit(limit)
 
-        result = query.execute()
+        key = ("get_upload_history_by_user", user_id, limit, user_versions.get_version(user_id)[0])
+        result = await self._read(key, query)
         return result.data if result.data else []
 
     async def update_upload_history(self, upload_id: int, **kwargs) -> Dict[str, Any]:
@@ -381,6 +749,7 @@ class SupabaseDBService:
             .eq("id", upload_id)\
             .execute()
 
+        self._bump_owners(result.data)
         return result.data[0] if result.data else None
 
     async def delete_upload_history(self, upload_id: int) -> bool:
@@ -390,59 +759,19 @@ class SupabaseDBService:
             .eq("id", upload_id)\
             .execute()
 
+        self._bump_owners(result.data)
         return len(result.data) > 0
 
-    # ==================== STATISTICS OPERATIONS ====================
-
-    async def get_user_stats(self, user_id: int, grade: Optional[str] = None) -> Dict[str, Any]:
-        """Get comprehensive user statistics with optional grade filter"""
-        # Get all questions (filtered by grade if provided)
-        all_questions = await self.get_questions_by_user(user_id, grade=grade)
-
-        # Count by status
-        pending = len([q for q in all_questions if q['status'] == 'pending'])
-        reviewing = len([q for q in all_questions if q['status'] == 'reviewing'])
-        understood = len([q for q in all_questions if q['status'] == 'understood'])
-
-        # Count by subject
-        subjects = {}
-        for q in all_questions:
-            subject = q['subject']
-            if subject not in subjects:
-                subjects[subject] = {'total': 0, 'understood': 0}
-            subjects[subject]['total'] += 1
-            if q['status'] == 'understood':
-                subjects[subject]['understood'] += 1
-
-        return {
-            "total_questions": len(all_questions),
-            "pending": pending,
-            "reviewing": reviewing,
-            "understood": understood,
-            "completion_rate": (understood / len(all_questions) * 100) if all_questions else 0,
-            "subjects": subjects
-        }
-
-    async def get_subject_stats(self, user_id: int, grade: Optional[str] = None) -> List[Dict[str, Any]]:
-        """Get statistics grouped by subject with optional grade filter"""
-        questions = await self.get_questions_by_user(user_id, grade=grade)
-
-        subjects = {}
-        for q in questions:
-            subject = q['subject']
-            if subject not in subjects:
-                subjects[subject] = {
-                    'subject': subject,
-                    'total': 0,
-                    'pending': 0,
-                    'reviewing': 0,
-                    'understood': 0
-                }
-
-            subjects[subject]['total'] += 1
-            subjects[subject][q['status']] += 1
-
-        return list(subjects.values())
+def _create_db_service() -> DBServiceBase:
+    """Create the database backend selected by DB_BACKEND"""
+    backend = settings.DB_BACKEND.lower()
+    if backend == "postgres":
+        from app.services.postgres_db_service import PostgresDBService
+        return PostgresDBService(settings.DATABASE_URL)
+    if backend == "sqlite":
+        from app.services.sqlite_db_service import SQLiteDBService, sqlite_path_from_url
+        return SQLiteDBService(sqlite_path_from_url(settings.DATABASE_URL))
+    return SupabaseDBService()
 
 # Create singleton instance
-supabase_db = SupabaseDBService()
+supabase_db = _create_db_service()
@@ -1,8 +1,25 @@
 from supabase import create_client, Client
 from app.config import settings
+from app.services.embedding_codec import to_pgvector
+from app.services.embedding_model_service import embedding_models, default_model, model_tag
+from app.services.vector_index_service import vector_index
 from typing import List, Dict, Any, Optional
+import asyncio
 import json
 
+# match_question_embeddings parameters added by later migrations (newest first),
+# dropped one by one when the database still has an older signature
+MATCH_PARAM_MIGRATIONS = (
+    ("p_model", "add_embedding_model_versioning.sql"),
+    ("rescore_factor", "add_halfvec_vector_index.sql"),
+)
+
+
+def is_missing_function(error: Exception) -> bool:
+    """True if PostgREST found no function matching the rpc's name and parameters"""
+    return getattr(error, "code", None) == "PGRST202" or "Could not find the function" in str(error)
+
+
 class SupabaseService:
     def __init__(self):
         # Check if Supabase is properly configured
@@ -25,6 +42,7 @@ class SupabaseService:
                 self.client = None
                 self.enabled = False
         self.table_name = "study.question_embeddings"  # Use study schema
+        self._match_params_dropped = 0  # Leading MATCH_PARAM_MIGRATIONS the database lacks
 
     async def create_embedding_table(self):
         """Create the embeddings table if it doesn't exist"""
@@ -41,16 +59,23 @@ class SupabaseService:
             question_text TEXT NOT NULL,
             subject VARCHAR(100),
             grade VARCHAR(50),
-            embedding vector(1536),
+            embedding vector,  -- dimensions vary by embedding_model
+            embedding_model TEXT NOT NULL,  -- "<deployment>@<dimensions>"
             metadata JSONB,
             created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
         );
 
-        CREATE INDEX ON study.question_embeddings USING ivfflat (embedding vector_cosine_ops)
-        WITH (lists = 100);
+        -- HNSW over a half-precision copy; results are rescored on the full vector
+        CREATE INDEX ON study.question_embeddings
+        USING hnsw ((embedding::halfvec(1536)) halfvec_cosine_ops)
+        WITH (m = 16, ef_construction = 64);
 
         CREATE INDEX idx_question_embeddings_user_id ON study.question_embeddings(user_id);
         CREATE INDEX idx_question_embeddings_subject ON study.question_embeddings(subject);
+
+        -- Search function: see migrations/add_vector_search_function.sql,
+        -- migrations/add_halfvec_vector_index.sql and
+        -- migrations/add_embedding_model_versioning.sql (one partial index per model)
         """
         pass
 
@@ -62,12 +87,19 @@ class SupabaseService:
         embedding: List[float],
         subject: str,
         grade: Optional[str] = None,
-        metadata: Optional[Dict[str, Any]] = None
+        metadata: Optional[Dict[str, Any]] = None,
+        embedding_model: Optional[str] = None
     ) -> str:
-        """Store question embedding in Supabase vector database"""
+        """
+        Store question embedding in Supabase vector database
+
+        embedding_model is the tag of the model that produced the embedding
+        (defaults to the active model); only active-model vectors are searched.
+        """
         if not self.enabled:
             return "mock-id"
 
+        embedding_model = embedding_model or embedding_models.active_tag
         try:
             data = {
                 "user_id": user_id,
@@ -75,14 +107,19 @@ class SupabaseService:
                 "question_text": question_text,
                 "subject": subject,
                 "grade": grade,
-                "embedding": embedding,
+                "embedding": to_pgvector(embedding),
+                "embedding_model": embedding_model,
                 "metadata": json.dumps(metadata or {})
             }
 
-            result = self.client.table(self.table_name).insert(data).execute()
+            query = self.client.table(self.table_name).insert(data)
+            result = await asyncio.to_thread(query.execute)
 
             if result.data and len(result.data) > 0:
-                return result.data[0].get("id")
+                vector_id = result.data[0].get("id")
+                if embedding_model == embedding_models.active_tag:
+                    vector_index.add(user_id, vector_id, embedding, question_id, subject, grade)
+                return vector_id
 
             raise Exception("Failed to store embedding")
 
@@ -96,52 +133,193 @@ class SupabaseService:
         query_embedding: List[float],
         limit: int = 10,
         subject: Optional[str] = None,
-        grade: Optional[str] = None
+        grade: Optional[str] = None,
+        embedding_model: Optional[str] = None
     ) -> List[Dict[str, Any]]:
-        """Search for similar questions using vector similarity"""
+        """
+        Search for similar questions using vector similarity
+
+        Served from the in-process index when the user's vectors are loaded;
+        otherwise runs top-K cosine search in the database (match_question_embeddings,
+        HNSW-backed) and loads the index in the background for the next search.
+        Only vectors of embedding_model (default: the active model) are searched;
+        other models (shadow reads) always go to the database.
+        If the database predates the rescore/model migrations, the missing parameters
+        are logged as errors and the old signature is used (until the process restarts).
+        Returns only ids and scores, best match first:
+        [{"id", "question_id", "subject", "grade", "similarity"}, ...]
+        """
         if not self.enabled:
             return []
 
-        try:
-            # Build RPC call for vector similarity search
-            rpc_params = {
-                "query_embedding": query_embedding,
-                "match_threshold": 0.7,
-                "match_count": limit,
-                "p_user_id": user_id
-            }
+        embedding_model = embedding_model or embedding_models.active_tag
+        if embedding_model == embedding_models.active_tag:
+            index = vector_index.get(user_id)
+            if index is not None:
+                return await vector_index.search(index, query_embedding, limit, subject, grade, self._fetch_vectors)
+            vector_index.warm(user_id, self._load_user_vectors)
 
-            if subject:
-                rpc_params["p_subject"] = subject
-            if grade:
-                rpc_params["p_grade"] = grade
+        rpc_params = {
+            "query_embedding": to_pgvector(query_embedding),
+            "match_threshold": settings.VECTOR_MATCH_THRESHOLD,
+            "match_count": limit,
+            "p_user_id": user_id,
+            "rescore_factor": settings.VECTOR_RESCORE_FACTOR,
+            "p_model": embedding_model
+        }
+        if subject:
+            rpc_params["p_subject"] = subject
+        if grade:
+            rpc_params["p_grade"] = grade
 
-            # This requires creating a custom RPC function in Supabase
-            # For now, we'll use a basic query
-            query = self.client.table(self.table_name).select("*").eq("user_id", user_id)
+        while True:
+            params = dict(rpc_params)
+            for name, _ in MATCH_PARAM_MIGRATIONS[:self._match_params_dropped]:
+                params.pop(name, None)
+            if "p_model" not in params and embedding_model != model_tag(default_model()):
+                # Without p_model the database only holds the configured model's vectors
+                print(f"❌ Cannot search {embedding_model} vectors: match_question_embeddings has no p_model "
+                      f"(run migrations/add_embedding_model_versioning.sql)")
+                return []
 
-            if subject:
-                query = query.eq("subject", subject)
-            if grade:
-                query = query.eq("grade", grade)
+            try:
+                query = self.client.rpc("match_question_embeddings", params)
+                result = await asyncio.to_thread(query.execute)
+                return result.data if result.data else []
 
-            result = query.limit(limit).execute()
+            except Exception as e:
+                if not is_missing_function(e) or self._match_params_dropped == len(MATCH_PARAM_MIGRATIONS):
+                    print(f"❌ Error searching similar questions: {e}")
+                    return []
+                name, migration = MATCH_PARAM_MIGRATIONS[self._match_params_dropped]
+                self._match_params_dropped += 1
+                print(f"❌ match_question_embeddings has no {name} parameter - run migrations/{migration}; "
+                      f"searching with the old signature until then")
 
-            return result.data if result.data else []
+    async def find_nearest_question(
+        self,
+        query_embedding: List[float],
+        subject: str,
+        grade: Optional[str] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Find the closest existing question of any user in the same subject and grade
+        (compared on the active model's vectors)
 
-        except Exception as e:
-            print(f"Error searching similar questions: {e}")
+        Returns:
+            {"question_id", "similarity"} or None if there is no candidate
+        """
+        if not self.enabled:
+            return None
+
+        query = self.client.rpc("match_nearest_question", {
+            "query_embedding": to_pgvector(query_embedding),
+            "p_subject": subject,
+            "p_grade": grade,
+            "p_model": embedding_models.active_tag
+        })
+        result = await asyncio.to_thread(query.execute)
+        return result.data[0] if result.data else None
+
+    async def get_embedding_health(self, after_question_id: int = 0, limit: int = 1000) -> List[Dict[str, Any]]:
+        """
+        Page through stored embeddings with their size and whether they are all zeros
+
+        A page holds every embedding of its questions (a question's rows are
+        never split across pages), so the next page starts after the last row's question_id.
+
+        Args:
+            after_question_id: Return embeddings of questions with id > after_question_id
+            limit: Questions per page
+
+        Returns:
+            [{"id", "question_id", "embedding_model", "dims", "is_zero"}, ...] ordered by question_id
+        """
+        if not self.enabled:
             return []
 
+        query = self.client.rpc("question_embedding_health", {
+            "p_after_question_id": after_question_id,
+            "p_question_limit": limit
+        })
+        result = await asyncio.to_thread(query.execute)
+        return result.data or []
+
+    async def _load_user_vectors(self, user_id: int) -> List[Dict[str, Any]]:
+        """Fetch all of a user's active-model embeddings for the in-process index"""
+        query = (
+            self.client.table(self.table_name)
+            .select("id, question_id, subject, grade, embedding")
+            .eq("user_id", user_id)
+            .eq("embedding_model", embedding_models.active_tag)
+        )
+        result = await asyncio.to_thread(query.execute)
+
+        return self._parse_embeddings(result.data or [])
+
+    async def _fetch_vectors(self, vector_ids: List[str]) -> Dict[str, Any]:
+        """Fetch full-precision embeddings by id (rescoring quantized index hits)"""
+        query = self.client.table(self.table_name).select("id, embedding").in_("id", vector_ids)
+        result = await asyncio.to_thread(query.execute)
+        return {row["id"]: row["embedding"] for row in self._parse_embeddings(result.data or [])}
+
+    @staticmethod
+    def _parse_embeddings(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        for row in rows:
+            # PostgREST returns vector columns as text: "[0.1,0.2,...]"
+            if isinstance(row.get("embedding"), str):
+                row["embedding"] = json.loads(row["embedding"])
+        return rows
+
     async def delete_question_embedding(self, vector_id: str) -> bool:
         """Delete a question embedding"""
         try:
             result = self.client.table(self.table_name).delete().eq("id", vector_id).execute()
+            vector_index.remove(vector_id)
             return True
         except Exception as e:
             print(f"Error deleting embedding: {e}")
             return False
 
+    async def delete_question_embeddings(self, question_id: int) -> bool:
+        """Delete every embedding of a question (all models)"""
+        try:
+            query = self.client.table(self.table_name).delete().eq("question_id", question_id)
+            result = await asyncio.to_thread(query.execute)
+            for row in result.data or []:
+                vector_index.remove(row["id"])
+            return True
+        except Exception as e:
+            print(f"Error deleting embeddings: {e}")
+            return False
+
+    async def delete_embeddings_for_questions(self, question_ids: List[int]) -> int:
+        """
+        Delete every embedding of several questions in one call (purge worker)
+
+        Raises on failure so the caller can retry.
+
+        Returns:
+            Embedding rows deleted
+        """
+        if not question_ids or not self.enabled:
+            return 0
+        query = self.client.table(self.table_name).delete().in_("question_id", list(question_ids))
+        result = await asyncio.to_thread(query.execute)
+        for row in result.data or []:
+            vector_index.remove(row["id"])
+        return len(result.data or [])
+
+    async def delete_embeddings_except(self, keep_models: List[str]) -> int:
+        """Delete embeddings of every model not in keep_models; returns rows deleted"""
+        if not self.enabled:
+            return 0
+
+        query = self.client.table(self.table_name).delete()\
+            .not_.in_("embedding_model", keep_models)
+        result = await asyncio.to_thread(query.execute)
+        return len(result.data or [])
+
     async def update_question_embedding(
         self,
         vector_id: str,
@@ -156,7 +334,7 @@ class SupabaseService:
             if question_text:
                 update_data["question_text"] = question_text
             if embedding:
-                update_data["embedding"] = embedding
+                update_data["embedding"] = to_pgvector(embedding)
             if metadata:
                 update_data["metadata"] = json.dumps(metadata)
 
@@ -164,10 +342,19 @@ class SupabaseService:
                 return True
 
             result = self.client.table(self.table_name).update(update_data).eq("id", vector_id).execute()
+            if embedding:
+                vector_index.update(vector_id, embedding)
             return True
         except Exception as e:
             print(f"Error updating embedding: {e}")
             return False
 
+def _create_vector_service():
+    """Create the vector store matching DB_BACKEND"""
+    if settings.DB_BACKEND.lower() == "sqlite":
+        from app.services.local_vector_service import LocalVectorService
+        return LocalVectorService()
+    return SupabaseService()
+
 # Create a singleton instance
-supabase_service = SupabaseService()
+supabase_service = _create_vector_service()
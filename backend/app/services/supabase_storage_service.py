@@ -5,11 +5,13 @@ Uses anon key with public bucket policies for uploads
 """
 
 from supabase import create_client, Client
+from typing import Any, Dict, List, Optional
 from app.config import settings
-import uuid
+from app.services.storage_backend import StorageBackend
+import asyncio
 
 
-class SupabaseStorageService:
+class SupabaseStorageService(StorageBackend):
     """Service for handling image uploads to Supabase Storage"""
 
     def __init__(self):
@@ -31,49 +33,102 @@ class SupabaseStorageService:
         except Exception as e:
             print(f"❌ Failed to initialize Supabase Storage: {e}")
 
-    async def upload_image(self, file_data: bytes, filename: str, content_type: str) -> str:
+    async def upload_object(self, path: str, file_data: bytes, content_type: str) -> str:
         """
-        Upload image to Supabase Storage
-
-        Args:
-            file_data: Raw bytes of the image file
-            filename: Original filename (used to extract extension)
-            content_type: MIME type of the file
+        Upload bytes to a path in the bucket (overwriting is harmless: paths are content hashes)
 
         Returns:
-            Public URL of the uploaded image
+            Public URL of the object
         """
         if not self.enabled or not self.client:
             raise Exception("Supabase Storage is not enabled")
 
         try:
-            # Generate unique filename to avoid collisions
-            file_ext = filename.split('.')[-1].lower()
-            unique_filename = f"{uuid.uuid4()}.{file_ext}"
-
-            # Upload to Supabase Storage
-            self.client.storage.from_(self.bucket_name).upload(
-                path=unique_filename,
+            bucket = self.client.storage.from_(self.bucket_name)
+            await asyncio.to_thread(
+                bucket.upload,
+                path=path,
                 file=file_data,
-                file_options={"content-type": content_type}
+                # Content never changes at a path, so clients may cache it indefinitely
+                file_options={"content-type": content_type, "cache-control": "31536000", "x-upsert": "true"}
             )
 
-            # Get public URL
-            public_url = self.client.storage.from_(self.bucket_name).get_public_url(unique_filename)
-
-            print(f"✅ Image uploaded to Supabase Storage: {unique_filename}")
-            return public_url
+            print(f"✅ Image uploaded to Supabase Storage: {path}")
+            return self.object_url(path)
 
         except Exception as e:
             print(f"❌ Error uploading to Supabase Storage: {e}")
             raise
 
-    async def delete_image(self, image_url: str) -> bool:
+    def object_url(self, path: str) -> str:
+        """Public URL of a path in the bucket"""
+        return self.client.storage.from_(self.bucket_name).get_public_url(path)
+
+    def object_path(self, url: str) -> Optional[str]:
         """
-        Delete image from Supabase Storage
+        Object path of a public bucket URL
+
+        URL format: https://xxx.supabase.co/storage/v1/object/public/bucket_name/ab/cd/<sha256>.ext
+        """
+        # Only objects in our bucket (local fallback files are not ours)
+        marker = f"/{self.bucket_name}/"
+        if marker not in url:
+            return None
+        # Handle URL query parameters if present
+        return url.split(marker, 1)[1].split('?')[0]
+
+    async def object_exists(self, path: str) -> bool:
+        """Whether an object is stored at path (one listing of its folder)"""
+        if not self.enabled or not self.client:
+            return False
+        folder, _, name = path.rpartition("/")
+        try:
+            found = await asyncio.to_thread(
+                self.client.storage.from_(self.bucket_name).list,
+                folder,
+                {"search": name, "limit": 1}
+            )
+        except Exception as e:
+            print(f"❌ Error checking Supabase Storage object: {e}")
+            return False
+        return any(item.get("name") == name for item in found or [])
 
-        Args:
-            image_url: Full public URL of the image
+    async def delete_objects(self, paths: List[str]) -> None:
+        """Delete several objects in one storage call; raises on failure"""
+        if not self.enabled or not self.client:
+            raise Exception("Supabase Storage is not enabled")
+        await asyncio.to_thread(self.client.storage.from_(self.bucket_name).remove, list(paths))
+        print(f"✅ {len(paths)} image(s) deleted from Supabase Storage")
+
+    async def create_upload_url(self, path: str, content_type: str, expires_in: int) -> Dict[str, Any]:
+        """
+        Signed upload URL for one object (Supabase fixes its lifetime at 2 hours)
+
+        The client PUTs the file to the URL. Uploads never overwrite an
+        existing object, so a signed URL cannot replace a stored image.
+        """
+        if not self.enabled or not self.client:
+            raise Exception("Supabase Storage is not enabled")
+        signed = await asyncio.to_thread(self.client.storage.from_(self.bucket_name).create_signed_upload_url, path)
+        return {
+            "url": signed["signed_url"],
+            "method": "PUT",
+            "headers": {"Content-Type": content_type, "x-upsert": "false"},
+            "expires_in": 7200
+        }
+
+    async def read_object(self, path: str) -> bytes:
+        """Download an object from the bucket"""
+        if not self.enabled or not self.client:
+            raise Exception("Supabase Storage is not enabled")
+        try:
+            return await asyncio.to_thread(self.client.storage.from_(self.bucket_name).download, path)
+        except Exception as e:
+            raise FileNotFoundError(f"{path}: {e}")
+
+    async def delete_object(self, path: str) -> bool:
+        """
+        Delete an object from Supabase Storage
 
         Returns:
             True if deleted successfully, False otherwise
@@ -82,16 +137,8 @@ class SupabaseStorageService:
             return False
 
         try:
-            # Extract filename from URL
-            # URL format: https://xxx.supabase.co/storage/v1/object/public/bucket_name/filename.ext
-            filename = image_url.split('/')[-1]
-
-            # Handle URL query parameters if present
-            if '?' in filename:
-                filename = filename.split('?')[0]
-
-            self.client.storage.from_(self.bucket_name).remove([filename])
-            print(f"✅ Image deleted from Supabase Storage: {filename}")
+            await asyncio.to_thread(self.client.storage.from_(self.bucket_name).remove, [path])
+            print(f"✅ Image deleted from Supabase Storage: {path}")
             return True
 
         except Exception as e:
@@ -99,10 +146,26 @@ class SupabaseStorageService:
             return False
 
 
-# Singleton instance
-supabase_storage = SupabaseStorageService()
-
+def _create_storage_service() -> StorageBackend:
+    """
+    Create the image store selected by STORAGE_BACKEND (empty: follow DB_BACKEND)
 
+    The bucket gets a size-bounded local disk cache in front of it unless
+    STORAGE_CACHE_MAX_MB is 0.
+    """
+    backend = (settings.STORAGE_BACKEND or ("local" if settings.DB_BACKEND.lower() == "sqlite" else "supabase")).lower()
+    if backend == "local":
+        from app.services.local_storage_service import local_storage
+        return local_storage
+    if backend != "supabase":
+        raise ValueError(f"Unknown STORAGE_BACKEND: {settings.STORAGE_BACKEND}")
 
+    remote = SupabaseStorageService()
+    if settings.STORAGE_CACHE_MAX_MB > 0:
+        from app.services.storage_cache_service import CachedStorageBackend
+        return CachedStorageBackend(remote, settings.STORAGE_CACHE_DIR, settings.STORAGE_CACHE_MAX_MB * 1024 * 1024)
+    return remote
 
 
+# Singleton instance
+supabase_storage = _create_storage_service()
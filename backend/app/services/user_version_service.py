@@ -0,0 +1,104 @@
+"""
+User Version Service
+Tracks a per-user change counter that the database service bumps on every write
+Used to emit ETag / Last-Modified headers and answer conditional GETs with 304
+without running the underlying queries
+"""
+
+import hashlib
+import uuid
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Dict, Optional, Tuple
+
+from fastapi import Request, Response, status
+
+
+class UserVersionService:
+    """In-process per-user change counter for conditional GET support"""
+
+    def __init__(self):
+        # Random per-process epoch so ETags issued before a restart never match.
+        # Versions live in memory, so this assumes a single API process (see Procfile).
+        self.epoch = uuid.uuid4().hex[:8]
+        self.started_at = datetime.now(timezone.utc).replace(microsecond=0)
+        self._versions: Dict[int, Tuple[int, datetime]] = {}
+        self._writes = 0  # Bumps of any user
+
+    def bump(self, user_id: Optional[int]) -> None:
+        """Record that data owned by this user has changed"""
+        if user_id is None:
+            return
+
+        version, _ = self._versions.get(user_id, (0, self.started_at))
+        now = datetime.now(timezone.utc).replace(microsecond=0)
+        self._versions[user_id] = (version + 1, now)
+        self._writes += 1
+
+    def get_write_count(self) -> int:
+        """Count of writes by any user (versions reads whose owner is not known before the query)"""
+        return self._writes
+
+    def get_version(self, user_id: int) -> Tuple[int, datetime]:
+        """Get (change counter, last modified time) for a user"""
+        return self._versions.get(user_id, (0, self.started_at))
+
+    def make_etag(self, user_id: int, scope: str, request: Request) -> str:
+        """Build a weak ETag from the user's version, the endpoint scope and query string"""
+        version, _ = self.get_version(user_id)
+        raw = f"{self.epoch}:{user_id}:{version}:{scope}:{request.url.query}"
+        digest = hashlib.sha1(raw.encode("utf-8")).hexdigest()[:20]
+        return f'W/"{digest}"'
+
+    def check_not_modified(
+        self,
+        request: Request,
+        response: Response,
+        user_id: int,
+        scope: str
+    ) -> Optional[Response]:
+        """
+        Set validator headers on the response and check the request's preconditions
+
+        Args:
+            request: Incoming request (If-None-Match / If-Modified-Since are read from it)
+            response: Response the endpoint will return (headers are set on it)
+            user_id: Owner of the data being served
+            scope: Endpoint name, so different endpoints never share an ETag
+
+        Returns:
+            A 304 response if the client's copy is current, otherwise None
+        """
+        etag = self.make_etag(user_id, scope, request)
+        _, last_modified = self.get_version(user_id)
+
+        headers = {
+            "ETag": etag,
+            "Last-Modified": format_datetime(last_modified, usegmt=True),
+            "Cache-Control": "private, no-cache",
+            "Vary": "Authorization",
+        }
+        response.headers.update(headers)
+
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is not None:
+            # Weak comparison: ignore W/ prefixes on either side
+            candidates = [tag.strip() for tag in if_none_match.split(",")]
+            if "*" in candidates or any(tag.removeprefix("W/") == etag.removeprefix("W/") for tag in candidates):
+                return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+            return None
+
+        if_modified_since = request.headers.get("if-modified-since")
+        if if_modified_since:
+            try:
+                since = parsedate_to_datetime(if_modified_since)
+                if last_modified <= since:
+                    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+            except (TypeError, ValueError):
+                pass
+
+        return None
+
+
+# Singleton instance
+user_versions = UserVersionService()
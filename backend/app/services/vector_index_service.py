@@ -0,0 +1,382 @@
+"""
+Vector Index Service
+In-process, per-user embedding index for similarity search
+
+Each user's question bank is small (hundreds to a few thousand vectors), so an
+exact cosine top-K over a contiguous matrix in memory is faster than a database
+round trip. Rows can be kept as float16 or int8 (VECTOR_INDEX_PRECISION) to cut
+memory; int8 candidates are rescored on the full-precision vectors. Indexes are
+loaded lazily on a user's first search (which is answered by the database
+meanwhile) and evicted LRU under a memory budget.
+
+The app's own writes keep the indexes current. Vectors written by another
+process (backfill_embeddings.py) are picked up within
+EMBEDDING_MODEL_REFRESH_SECONDS: the job bumps a version that
+embedding_model_service checks, clearing the indexes when it changes.
+Otherwise assumes a single app process, like the ETag version counter.
+"""
+
+import asyncio
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Callable, Awaitable
+
+import numpy as np
+
+from app.config import settings
+from app.services.embedding_codec import normalize, quantize_int8
+
+PRECISIONS = {"float32": np.float32, "float16": np.float16, "int8": np.int8}
+
+
+class UserVectorIndex:
+    """
+    One user's L2-normalized embeddings as a contiguous matrix
+
+    precision: "float32" (4 bytes/dim), "float16" (2 bytes/dim, scores within ~1e-3)
+    or "int8" (1 byte/dim + per-row scale; callers rescore candidates on full precision)
+    """
+
+    SCAN_CHUNK_ROWS = 1024  # Bounds the float32 scratch buffer when scanning quantized rows
+
+    def __init__(self, dim: int, capacity: int = 64, precision: str = "float32"):
+        if precision not in PRECISIONS:
+            raise ValueError(f"Unknown vector index precision: {precision}")
+        self.dim = dim
+        self.precision = precision
+        self.size = 0
+        # Rows [0:size) are live; spare capacity makes appends amortized O(dim)
+        capacity = max(capacity, 1)
+        self._matrix = np.empty((capacity, dim), dtype=PRECISIONS[precision])
+        self._scales = np.ones(capacity, dtype=np.float32) if precision == "int8" else None
+        self.ids: List[str] = []
+        self.meta: List[Dict[str, Any]] = []
+        self._positions: Dict[str, int] = {}
+
+    @property
+    def nbytes(self) -> int:
+        return self._matrix.nbytes + (self._scales.nbytes if self._scales is not None else 0)
+
+    def _write_row(self, position: int, embedding) -> None:
+        vector = normalize(embedding)
+        if self.precision == "int8":
+            self._matrix[position], self._scales[position] = quantize_int8(vector)
+        else:
+            self._matrix[position] = vector
+
+    def _move_row(self, source: int, target: int) -> None:
+        self._matrix[target] = self._matrix[source]
+        if self._scales is not None:
+            self._scales[target] = self._scales[source]
+
+    def add(self, vector_id: str, embedding, question_id: int,
+            subject: Optional[str] = None, grade: Optional[str] = None) -> None:
+        """Append (or replace) one embedding"""
+        if vector_id in self._positions:
+            self.remove(vector_id)
+
+        if self.size == self._matrix.shape[0]:
+            grown = np.empty((self._matrix.shape[0] * 2, self.dim), dtype=self._matrix.dtype)
+            grown[:self.size] = self._matrix[:self.size]
+            self._matrix = grown
+            if self._scales is not None:
+                self._scales = np.concatenate([self._scales, np.ones(len(self._scales), dtype=np.float32)])
+
+        self._write_row(self.size, embedding)
+        self.ids.append(vector_id)
+        self.meta.append({"question_id": question_id, "subject": subject, "grade": grade})
+        self._positions[vector_id] = self.size
+        self.size += 1
+
+    def remove(self, vector_id: str) -> bool:
+        """Remove one embedding by moving the last row into its slot"""
+        position = self._positions.pop(vector_id, None)
+        if position is None:
+            return False
+
+        last = self.size - 1
+        if position != last:
+            self._move_row(last, position)
+            self.ids[position] = self.ids[last]
+            self.meta[position] = self.meta[last]
+            self._positions[self.ids[position]] = position
+        self.ids.pop()
+        self.meta.pop()
+        self.size -= 1
+        return True
+
+    def update(self, vector_id: str, embedding) -> bool:
+        """Replace the embedding of an existing row"""
+        position = self._positions.get(vector_id)
+        if position is None:
+            return False
+        self._write_row(position, embedding)
+        return True
+
+    def _scores(self, query: np.ndarray) -> np.ndarray:
+        """Cosine scores of every live row against a normalized query"""
+        if self.precision == "float32":
+            return self._matrix[:self.size] @ query
+
+        scores = np.empty(self.size, dtype=np.float32)
+        for start in range(0, self.size, self.SCAN_CHUNK_ROWS):
+            end = min(start + self.SCAN_CHUNK_ROWS, self.size)
+            scores[start:end] = self._matrix[start:end].astype(np.float32) @ query
+        if self._scales is not None:
+            scores *= self._scales[:self.size]
+        return scores
+
+    def search(
+        self,
+        query_embedding: List[float],
+        limit: int = 10,
+        threshold: float = 0.0,
+        subject: Optional[str] = None,
+        grade: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Cosine top-K (exact for float32, approximate for quantized precisions)
+
+        Returns the same shape as the database search, best match first:
+        [{"id", "question_id", "subject", "grade", "similarity"}, ...]
+        """
+        if self.size == 0 or limit <= 0:
+            return []
+
+        scores = self._scores(normalize(query_embedding))
+
+        if subject or grade:
+            mask = np.fromiter(
+                ((not subject or m["subject"] == subject) and (not grade or m["grade"] == grade)
+                 for m in self.meta),
+                dtype=bool,
+                count=self.size
+            )
+            scores = np.where(mask, scores, -np.inf)
+
+        k = min(limit, self.size)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+
+        results = []
+        for position in top:
+            similarity = float(scores[position])
+            # Rows filtered out by subject/grade score -inf and sort last; stop
+            # there even when no threshold applies (int8 candidate search)
+            if similarity < threshold or similarity == -np.inf:
+                break
+            results.append({"id": self.ids[position], **self.meta[position], "similarity": similarity})
+        return results
+
+
+def rescore(
+    query_embedding: List[float],
+    candidates: List[Dict[str, Any]],
+    vectors: Dict[str, Any],
+    limit: int,
+    threshold: float
+) -> List[Dict[str, Any]]:
+    """
+    Re-rank approximate candidates by exact cosine against full-precision vectors
+
+    Candidates missing from `vectors` keep their approximate score.
+    """
+    query = normalize(query_embedding)
+    rescored = []
+    for candidate in candidates:
+        vector = vectors.get(candidate["id"])
+        similarity = float(normalize(vector) @ query) if vector is not None else candidate["similarity"]
+        if similarity >= threshold:
+            rescored.append({**candidate, "similarity": similarity})
+    rescored.sort(key=lambda c: c["similarity"], reverse=True)
+    return rescored[:limit]
+
+
+class VectorIndexCache:
+    """LRU cache of per-user indexes, bounded by VECTOR_INDEX_MAX_MB"""
+
+    def __init__(self, max_bytes: int, precision: str = "float32", rescore_factor: int = 4):
+        if precision not in PRECISIONS:
+            raise ValueError(f"Unknown vector index precision: {precision}")
+        self.max_bytes = max_bytes
+        self.precision = precision
+        self.rescore_factor = max(rescore_factor, 1)
+        self._indexes: "OrderedDict[int, UserVectorIndex]" = OrderedDict()
+        self._owners: Dict[str, int] = {}  # vector_id -> user_id, for loaded users only
+        self._loading: Dict[int, Dict[str, Any]] = {}
+        self.stats = {"hits": 0, "misses": 0, "loads": 0, "evictions": 0, "rescored": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def get(self, user_id: int) -> Optional[UserVectorIndex]:
+        """Return the user's index if loaded (marks it recently used)"""
+        index = self._indexes.get(user_id)
+        if index is None:
+            self.stats["misses"] += 1
+            return None
+        self._indexes.move_to_end(user_id)
+        self.stats["hits"] += 1
+        return index
+
+    def warm(self, user_id: int, loader: Callable[[int], Awaitable[List[Dict[str, Any]]]]) -> None:
+        """
+        Load the user's index in the background (no-op if disabled or already loading)
+
+        Args:
+            user_id: User ID
+            loader: Coroutine returning the user's rows
+                    [{"id", "question_id", "subject", "grade", "embedding"}, ...]
+        """
+        if not self.enabled or user_id in self._indexes or user_id in self._loading:
+            return
+
+        entry = {"stale": False}
+        self._loading[user_id] = entry
+
+        async def load():
+            try:
+                rows = await loader(user_id)
+                # A write landed while loading: the rows may miss it, so let the next search reload
+                if not entry["stale"]:
+                    self._put(user_id, self._build(rows))
+                    self.stats["loads"] += 1
+            except Exception as e:
+                print(f"⚠️  Failed to load vector index for user {user_id}: {e}")
+            finally:
+                self._loading.pop(user_id, None)
+
+        entry["task"] = asyncio.ensure_future(load())
+
+    async def search(
+        self,
+        index: UserVectorIndex,
+        query_embedding: List[float],
+        limit: int,
+        subject: Optional[str],
+        grade: Optional[str],
+        fetch_vectors: Callable[[List[str]], Awaitable[Dict[str, Any]]]
+    ) -> List[Dict[str, Any]]:
+        """
+        Search a loaded index; int8 indexes over-fetch candidates and rescore them
+
+        Args:
+            index: Index returned by get()
+            fetch_vectors: Coroutine returning {vector_id: full-precision embedding}
+        """
+        threshold = settings.VECTOR_MATCH_THRESHOLD
+        if index.precision != "int8":
+            return index.search(query_embedding, limit, threshold, subject, grade)
+
+        # Quantization error can push a true hit just under the threshold, so
+        # filter only after rescoring
+        candidates = index.search(query_embedding, limit * self.rescore_factor, -np.inf, subject, grade)
+        if not candidates:
+            return []
+        try:
+            vectors = await fetch_vectors([c["id"] for c in candidates])
+            self.stats["rescored"] += 1
+        except Exception as e:
+            print(f"⚠️  Rescoring failed, using quantized scores: {e}")
+            vectors = {}
+        return rescore(query_embedding, candidates, vectors, limit, threshold)
+
+    def _build(self, rows: List[Dict[str, Any]]) -> UserVectorIndex:
+        rows = [row for row in rows if row.get("embedding") is not None]
+        dim = len(rows[0]["embedding"]) if rows else 0
+        index = UserVectorIndex(dim, capacity=len(rows) + 16, precision=self.precision)
+        for row in rows:
+            if len(row["embedding"]) == dim:
+                index.add(row["id"], row["embedding"], row["question_id"], row.get("subject"), row.get("grade"))
+        return index
+
+    def _put(self, user_id: int, index: UserVectorIndex) -> None:
+        self.invalidate(user_id)
+        self._indexes[user_id] = index
+        for vector_id in index.ids:
+            self._owners[vector_id] = user_id
+
+        # Evict least recently used users until under budget (always keep the newest)
+        while len(self._indexes) > 1 and self.memory_bytes() > self.max_bytes:
+            evicted_id, _ = self._indexes.popitem(last=False)
+            self._drop_owners(evicted_id)
+            self.stats["evictions"] += 1
+
+    def _drop_owners(self, user_id: int) -> None:
+        self._owners = {vid: uid for vid, uid in self._owners.items() if uid != user_id}
+
+    def invalidate(self, user_id: int) -> None:
+        """Forget the user's index; the next search reloads it"""
+        if user_id in self._loading:
+            self._loading[user_id]["stale"] = True
+        if self._indexes.pop(user_id, None) is not None:
+            self._drop_owners(user_id)
+
+    def clear(self) -> None:
+        """Forget every index (e.g. after an embedding model cutover)"""
+        for entry in self._loading.values():
+            entry["stale"] = True
+        self._indexes.clear()
+        self._owners.clear()
+
+    def add(self, user_id: int, vector_id: str, embedding: List[float], question_id: int,
+            subject: Optional[str] = None, grade: Optional[str] = None) -> None:
+        """Apply a stored embedding to the user's index, if loaded"""
+        if user_id in self._loading:
+            self._loading[user_id]["stale"] = True
+        index = self._indexes.get(user_id)
+        if index is None:
+            return
+        if index.dim == 0:
+            # Index was built from an empty bank; rebuild with the right dimension
+            index = UserVectorIndex(len(embedding), precision=self.precision)
+            self._indexes[user_id] = index
+        if len(embedding) != index.dim:
+            self.invalidate(user_id)
+            return
+        index.add(vector_id, embedding, question_id, subject, grade)
+        self._owners[vector_id] = user_id
+
+    def remove(self, vector_id: str) -> None:
+        """Apply a deleted embedding to its owner's index, if loaded"""
+        # Owner unknown while a load is in flight: the loaded rows may still contain it
+        for entry in self._loading.values():
+            entry["stale"] = True
+        user_id = self._owners.pop(vector_id, None)
+        if user_id is not None and user_id in self._indexes:
+            self._indexes[user_id].remove(vector_id)
+
+    def update(self, vector_id: str, embedding: List[float]) -> None:
+        """Apply a changed embedding to its owner's index, if loaded"""
+        for entry in self._loading.values():
+            entry["stale"] = True
+        user_id = self._owners.get(vector_id)
+        index = self._indexes.get(user_id) if user_id is not None else None
+        if index is None:
+            return
+        if len(embedding) != index.dim:
+            self.invalidate(user_id)
+            return
+        index.update(vector_id, embedding)
+
+    def memory_bytes(self) -> int:
+        return sum(index.nbytes for index in self._indexes.values())
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache counters (hits, misses, loads, evictions) and size"""
+        stats = dict(self.stats)
+        stats["users"] = len(self._indexes)
+        stats["vectors"] = sum(index.size for index in self._indexes.values())
+        stats["memory_bytes"] = self.memory_bytes()
+        stats["precision"] = self.precision
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = (stats["hits"] / lookups) if lookups else 0
+        return stats
+
+
+# Create a singleton instance
+vector_index = VectorIndexCache(
+    settings.VECTOR_INDEX_MAX_MB * 1024 * 1024,
+    precision=settings.VECTOR_INDEX_PRECISION,
+    rescore_factor=settings.VECTOR_RESCORE_FACTOR
+)
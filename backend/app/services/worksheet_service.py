@@ -0,0 +1,308 @@
+"""
+Worksheet Service
+Multi-page submissions: rendering PDFs to page images and joining the
+questions found on each page
+
+Every page is analyzed on its own (concurrently), so a question cut off by a
+page break comes back as two parts - the end of one page and the start of the
+next. The analysis flags such parts when it can; otherwise the same question
+number at both ends of the break is taken as one question. Questions seen on
+two pages (overlapping photos) are kept once.
+
+Dense pages (large A3 scans) are analyzed the same way one level down: split
+into overlapping tiles that are analyzed concurrently, so small handwriting is
+not downsampled away, and the tiles' questions are joined by number and position.
+"""
+
+import re
+from io import BytesIO
+from typing import Any, Dict, List, Optional, Tuple
+
+import pypdfium2 as pdfium
+from PIL import Image, ImageOps
+
+from app.config import settings
+
+# Longest edge of a rendered PDF page; vision models downscale larger images anyway
+PDF_PAGE_MAX_PX = 2400
+
+
+def render_pdf_pages(pdf_data: bytes, dpi: int, max_pages: int) -> List[bytes]:
+    """
+    Render every page of a PDF to a JPEG image (blocking; run in a worker thread)
+
+    Args:
+        pdf_data: PDF file bytes
+        dpi: Render resolution (capped at PDF_PAGE_MAX_PX on the longest edge)
+        max_pages: Largest page count accepted
+
+    Returns:
+        JPEG bytes per page, in page order
+
+    Raises:
+        ValueError: if the PDF cannot be read, is empty or has too many pages
+    """
+    try:
+        pdf = pdfium.PdfDocument(pdf_data)
+    except pdfium.PdfiumError as e:
+        raise ValueError(f"Unreadable PDF: {e}")
+
+    try:
+        if len(pdf) == 0:
+            raise ValueError("PDF has no pages")
+        if len(pdf) > max_pages:
+            raise ValueError(f"PDF has {len(pdf)} pages; at most {max_pages} per submission")
+
+        pages = []
+        for index in range(len(pdf)):
+            page = pdf[index]
+            try:
+                width, height = page.get_size()  # PDF points (1/72 inch)
+                scale = min(dpi / 72, PDF_PAGE_MAX_PX / max(width, height, 1))
+                image = page.render(scale=scale).to_pil().convert("RGB")
+            finally:
+                page.close()
+
+            buffer = BytesIO()
+            image.save(buffer, format="JPEG", quality=90)
+            pages.append(buffer.getvalue())
+        return pages
+    finally:
+        pdf.close()
+
+
+def _normalize(text: Any) -> str:
+    """Comparable form of a question text or number: lowercase letters and digits only"""
+    return re.sub(r"[\W_]+", "", str(text or "").lower())
+
+
+def _continues(tail: Dict[str, Any], head: Dict[str, Any]) -> bool:
+    """Whether the first question of a page continues the last one of the previous page"""
+    if tail.get("continues_on_next_page") or head.get("continued_from_previous_page"):
+        return True
+    number = _normalize(tail.get("question_number"))
+    return bool(number) and number == _normalize(head.get("question_number"))
+
+
+def _join(tail: Dict[str, Any], head: Dict[str, Any]) -> Dict[str, Any]:
+    """One question from its parts on either side of a page break (kept on the first page)"""
+    tail_text, head_text = tail["question_text"], head["question_text"]
+    if _normalize(head_text) in _normalize(tail_text):
+        text = tail_text
+    elif _normalize(tail_text) in _normalize(head_text):
+        text = head_text
+    else:
+        text = f"{tail_text.rstrip()}\n{head_text.lstrip()}"
+
+    joined = {**head, **{key: value for key, value in tail.items() if value not in (None, "")}}
+    joined["question_text"] = text
+    joined["continues_on_next_page"] = head.get("continues_on_next_page", False)
+    joined["continued_from_previous_page"] = tail.get("continued_from_previous_page", False)
+    return joined
+
+
+def _same_question(a: Dict[str, Any], b: Dict[str, Any]) -> bool:
+    text_a, text_b = _normalize(a["question_text"]), _normalize(b["question_text"])
+    if text_a == text_b:
+        return True
+    number = _normalize(a.get("question_number"))
+    return bool(number) and number == _normalize(b.get("question_number")) and (
+        text_a in text_b or text_b in text_a
+    )
+
+
+def merge_page_questions(pages: List[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """
+    Join the wrong questions of a submission's pages into one list
+
+    Args:
+        pages: Per page (in order), the wrong_questions from analyze_question_paper
+
+    Returns:
+        Questions in page order, each with "page" (0-based index of the page
+        it starts on, whose image and bounding box it keeps)
+    """
+    merged: List[Dict[str, Any]] = []
+    for page_index, questions in enumerate(pages):
+        questions = [dict(q, page=page_index) for q in questions if q.get("question_text")]
+        if questions and merged and merged[-1]["page"] == page_index - 1 and _continues(merged[-1], questions[0]):
+            merged[-1] = _join(merged[-1], questions.pop(0))
+        merged.extend(questions)
+
+    # The same question on two pages: keep the more complete text, in its first position
+    unique: List[Dict[str, Any]] = []
+    for question in merged:
+        duplicate = next((i for i, kept in enumerate(unique) if _same_question(kept, question)), None)
+        if duplicate is None:
+            unique.append(question)
+        elif len(_normalize(question["question_text"])) > len(_normalize(unique[duplicate]["question_text"])):
+            unique[duplicate] = question
+    return unique
+
+
+def tile_grid(width: int, height: int) -> Optional[Tuple[int, int]]:
+    """
+    Rows and columns to split a page into for analysis
+
+    Returns:
+        (rows, columns), or None if the page is small enough for one call
+    """
+    threshold = settings.ANALYSIS_TILE_MIN_MEGAPIXELS
+    if threshold <= 0 or width * height < threshold * 1_000_000:
+        return None
+
+    overlap = settings.ANALYSIS_TILE_OVERLAP
+
+    def count(length: int) -> int:
+        # Fewest tiles whose edge (overlaps included) fits ANALYSIS_TILE_MAX_PX
+        n = 1
+        while n < settings.ANALYSIS_MAX_TILES and length * (1 + (n - 1) * overlap) / n > settings.ANALYSIS_TILE_MAX_PX:
+            n += 1
+        return n
+
+    rows, columns = count(height), count(width)
+    while rows * columns > settings.ANALYSIS_MAX_TILES:
+        if rows >= columns:
+            rows -= 1
+        else:
+            columns -= 1
+    return (rows, columns) if rows * columns > 1 else None
+
+
+def tile_boxes(width: int, height: int, rows: int, columns: int) -> List[Tuple[int, int, int, int]]:
+    """Pixel boxes (left, top, right, bottom) of overlapping tiles covering a page, row by row"""
+    overlap = settings.ANALYSIS_TILE_OVERLAP
+
+    def spans(length: int, n: int) -> List[Tuple[int, int]]:
+        # n equal spans, neighbours sharing overlap * length pixels
+        span = length * (1 + (n - 1) * overlap) / n
+        step = (length - span) / (n - 1) if n > 1 else 0
+        return [(round(i * step), min(length, round(i * step + span))) for i in range(n)]
+
+    return [
+        (left, top, right, bottom)
+        for top, bottom in spans(height, rows)
+        for left, right in spans(width, columns)
+    ]
+
+
+def render_tiles(file_data: bytes) -> Optional[Tuple[Tuple[int, int], List[Tuple[Tuple[int, int, int, int], bytes]]]]:
+    """
+    Split a dense page image into overlapping JPEG tiles (blocking; run in a worker thread)
+
+    Returns:
+        ((page width, page height), [(tile box, JPEG bytes), ...]), or None
+        when the page is analyzed in one call
+    """
+    with Image.open(BytesIO(file_data)) as original:
+        # The header gives the size; only dense pages are decoded
+        if tile_grid(*original.size) is None:
+            return None
+        page = ImageOps.exif_transpose(original).convert("RGB")
+
+    rows, columns = tile_grid(page.width, page.height)
+    tiles = []
+    for box in tile_boxes(page.width, page.height, rows, columns):
+        buffer = BytesIO()
+        page.crop(box).save(buffer, format="JPEG", quality=90)
+        tiles.append((box, buffer.getvalue()))
+    return page.size, tiles
+
+
+def _page_box(bounding_box: Any, tile_box: Tuple[int, int, int, int], width: int, height: int) -> Optional[Dict[str, float]]:
+    """Map a bounding box in fractions of a tile to fractions of the page"""
+    try:
+        x, y, box_width, box_height = (float(bounding_box[key]) for key in ("x", "y", "width", "height"))
+    except (KeyError, TypeError, ValueError):
+        return None
+    left, top, right, bottom = tile_box
+    return {
+        "x": (left + x * (right - left)) / width,
+        "y": (top + y * (bottom - top)) / height,
+        "width": box_width * (right - left) / width,
+        "height": box_height * (bottom - top) / height
+    }
+
+
+def _box_overlap(a: Dict[str, float], b: Dict[str, float]) -> float:
+    """Intersection of two boxes as a share of the smaller one"""
+    overlap_x = min(a["x"] + a["width"], b["x"] + b["width"]) - max(a["x"], b["x"])
+    overlap_y = min(a["y"] + a["height"], b["y"] + b["height"]) - max(a["y"], b["y"])
+    smaller = min(a["width"] * a["height"], b["width"] * b["height"])
+    if overlap_x <= 0 or overlap_y <= 0 or smaller <= 0:
+        return 0.0
+    return overlap_x * overlap_y / smaller
+
+
+def _box_union(a: Dict[str, float], b: Dict[str, float]) -> Dict[str, float]:
+    x, y = min(a["x"], b["x"]), min(a["y"], b["y"])
+    return {
+        "x": x,
+        "y": y,
+        "width": max(a["x"] + a["width"], b["x"] + b["width"]) - x,
+        "height": max(a["y"] + a["height"], b["y"] + b["height"]) - y
+    }
+
+
+def _same_tile_question(a: Dict[str, Any], b: Dict[str, Any]) -> bool:
+    """Whether two tiles reported the same question (same number or text, same place)"""
+    if not (a.get("bounding_box") and b.get("bounding_box")):
+        return _same_question(a, b)
+    if _box_overlap(a["bounding_box"], b["bounding_box"]) < 0.5:
+        return False  # Equal numbers elsewhere on the page are different sections' questions
+    number = _normalize(a.get("question_number"))
+    if number and number == _normalize(b.get("question_number")):
+        return True
+    text_a, text_b = _normalize(a["question_text"]), _normalize(b["question_text"])
+    return text_a in text_b or text_b in text_a
+
+
+def merge_tile_questions(
+    tiles: List[Tuple[Tuple[int, int, int, int], List[Dict[str, Any]]]],
+    width: int,
+    height: int
+) -> List[Dict[str, Any]]:
+    """
+    Join the wrong questions found on the tiles of one page
+
+    A question in the overlap of two tiles, or cut by a tile edge, is reported
+    by each of them; the reports are one question with the most complete text
+    and the union of the boxes.
+
+    Args:
+        tiles: Per tile, its pixel box and the wrong_questions found on it
+            (bounding boxes in fractions of the tile)
+        width: Page width in pixels
+        height: Page height in pixels
+
+    Returns:
+        Questions with bounding boxes in fractions of the page, in reading order
+    """
+    questions: List[Dict[str, Any]] = []
+    for tile_box, tile_questions in tiles:
+        for question in tile_questions:
+            if not question.get("question_text"):
+                continue
+            question = dict(question, bounding_box=_page_box(question.get("bounding_box"), tile_box, width, height))
+
+            match = next((i for i, kept in enumerate(questions) if _same_tile_question(kept, question)), None)
+            if match is None:
+                questions.append(question)
+                continue
+
+            kept = questions[match]
+            longer, shorter = sorted((kept, question), key=lambda q: len(_normalize(q["question_text"])), reverse=True)
+            merged = {**shorter, **{key: value for key, value in longer.items() if value not in (None, "")}}
+            if kept["bounding_box"] and question["bounding_box"]:
+                merged["bounding_box"] = _box_union(kept["bounding_box"], question["bounding_box"])
+            else:
+                merged["bounding_box"] = kept["bounding_box"] or question["bounding_box"]
+            for flag in ("continues_on_next_page", "continued_from_previous_page"):
+                merged[flag] = bool(kept.get(flag) or question.get(flag))
+            questions[match] = merged
+
+    # Top to bottom (questions without a box last), so the last question is the one a page break cuts
+    return sorted(
+        questions,
+        key=lambda q: (q["bounding_box"]["y"], q["bounding_box"]["x"]) if q["bounding_box"] else (2.0, 0.0)
+    )
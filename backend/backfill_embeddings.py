@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Embedding backfill / re-index CLI
+Re-embeds questions whose vectors are missing or all zeros, (--mode all)
+the whole corpus, or (--mode shadow) every question with the model being
+migrated to. Resumable: progress is checkpointed, and re-running the same
+mode continues where it stopped.
+
+Usage (from backend/):
+    python backfill_embeddings.py                     # repair missing/zero vectors
+    python backfill_embeddings.py --mode all          # re-index everything
+    python backfill_embeddings.py --mode all --restart --rpm 600 --concurrency 8
+    python backfill_embeddings.py --mode shadow       # after POST /admin/embeddings/models/migration
+"""
+
+import argparse
+import asyncio
+
+from app.config import settings
+from app.services.embedding_backfill_service import EmbeddingBackfillJob, MODES
+from app.services.supabase_db_service import supabase_db
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=MODES, default="missing")
+    parser.add_argument("--batch-size", type=int, default=settings.EMBEDDING_BACKFILL_BATCH_SIZE,
+                        help="Questions per embeddings request")
+    parser.add_argument("--concurrency", type=int, default=settings.EMBEDDING_BACKFILL_CONCURRENCY,
+                        help="Embeddings requests in flight at once")
+    parser.add_argument("--rpm", type=int, default=settings.EMBEDDING_REQUESTS_PER_MINUTE,
+                        help="Embeddings requests per minute")
+    parser.add_argument("--checkpoint", default=settings.EMBEDDING_BACKFILL_CHECKPOINT)
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and start over")
+    args = parser.parse_args()
+
+    job = EmbeddingBackfillJob(
+        mode=args.mode,
+        batch_size=args.batch_size,
+        concurrency=args.concurrency,
+        requests_per_minute=args.rpm,
+        checkpoint_path=args.checkpoint,
+        restart=args.restart
+    )
+
+    print(f"🚀 Embedding backfill: mode={args.mode}, batch={args.batch_size}, "
+          f"concurrency={args.concurrency}, rpm={args.rpm}")
+    try:
+        await job.run()
+    finally:
+        await supabase_db.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
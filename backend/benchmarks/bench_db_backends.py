@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Benchmark: PostgREST (Supabase SDK) vs direct asyncpg backend
+Measures sequential per-call latency of the hot read paths for one user
+
+Usage (from backend/):
+    python -m benchmarks.bench_db_backends --user-id 1 --iterations 200
+
+Requires SUPABASE_URL/SUPABASE_KEY and a postgresql:// DATABASE_URL for the same database.
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+from app.config import settings
+from app.services.supabase_db_service import SupabaseDBService
+from app.services.postgres_db_service import PostgresDBService
+
+
+async def time_calls(fn, iterations: int) -> list:
+    """Run fn sequentially and return per-call latencies in milliseconds"""
+    latencies = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        await fn()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def summarize(latencies: list) -> str:
+    latencies = sorted(latencies)
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    return (f"mean {statistics.mean(latencies):7.2f} ms | "
+            f"p50 {statistics.median(latencies):7.2f} ms | "
+            f"p95 {p95:7.2f} ms")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--user-id", type=int, required=True, help="Existing user to read")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=10)
+    args = parser.parse_args()
+
+    backends = {
+        "supabase (PostgREST)": SupabaseDBService(),
+        "postgres (asyncpg)": PostgresDBService(settings.DATABASE_URL),
+    }
+
+    operations = {
+        "get_user_by_id": lambda db: db.get_user_by_id(args.user_id),
+        "get_questions_by_user": lambda db: db.get_questions_by_user(args.user_id),
+        "get_questions_by_user(limit=10)": lambda db: db.get_questions_by_user(args.user_id, limit=10),
+        "count_questions_by_user": lambda db: db.count_questions_by_user(args.user_id),
+    }
+
+    for op_name, op in operations.items():
+        print(f"\n📊 {op_name} ({args.iterations} calls)")
+        for backend_name, db in backends.items():
+            await time_calls(lambda: op(db), args.warmup)
+            latencies = await time_calls(lambda: op(db), args.iterations)
+            print(f"   {backend_name:22s} {summarize(latencies)}")
+
+    for db in backends.values():
+        await db.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Benchmark: memory vs recall for compact embedding storage
+Compares the in-process index at float32 / float16 / int8 (with and without
+full-precision rescoring), across reduced embedding dimensions
+
+Usage (from backend/):
+    python -m benchmarks.bench_embedding_quantization --rows 3000 --queries 200
+
+Synthetic clustered vectors stand in for question embeddings. Dimension
+reduction is truncate + re-normalize, as the API does for text-embedding-3;
+those models concentrate signal in leading components, so the reduced-dimension
+recall here (where signal is spread evenly) is a pessimistic bound.
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import numpy as np
+
+from app.config import settings
+from app.services.embedding_codec import reduce_dimensions
+from app.services.vector_index_service import UserVectorIndex, VectorIndexCache
+
+
+def make_corpus(rows: int, dim: int, clusters: int, spread: float, rng) -> np.ndarray:
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    assignments = rng.integers(0, clusters, rows)
+    vectors = centers[assignments] + spread * rng.standard_normal((rows, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def build_index(vectors: np.ndarray, precision: str) -> UserVectorIndex:
+    index = UserVectorIndex(vectors.shape[1], capacity=len(vectors), precision=precision)
+    for i, vector in enumerate(vectors):
+        index.add(str(i), vector, i)
+    return index
+
+
+async def run_config(index, cache, queries, truth, k, full_vectors):
+    async def fetch_vectors(ids):
+        return {vid: full_vectors[int(vid)] for vid in ids}
+
+    recalls, latencies = [], []
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        results = await cache.search(index, query, k, None, None, fetch_vectors)
+        latencies.append((time.perf_counter() - start) * 1000)
+        recalls.append(len(expected & {int(r["id"]) for r in results}) / k)
+    return statistics.mean(recalls), statistics.median(latencies)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=3000, help="Vectors per user index")
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--dims", type=int, nargs="+", default=[1536, 768, 512, 256])
+    parser.add_argument("--clusters", type=int, default=40)
+    parser.add_argument("--spread", type=float, default=0.6, help="Within-topic noise (higher = harder)")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--rescore-factor", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    # Threshold off: measure ranking quality only
+    settings.VECTOR_MATCH_THRESHOLD = -1.0
+
+    rng = np.random.default_rng(args.seed)
+    corpus = make_corpus(args.rows + args.queries, args.dim, args.clusters, args.spread, rng)
+    vectors, queries = corpus[:args.rows], corpus[args.rows:]
+
+    # Ground truth: exact float32 top-k at full dimension
+    truth = [set(np.argsort(-(vectors @ q))[:args.k].tolist()) for q in queries]
+
+    configs = [
+        ("float32", 1),
+        ("float16", 1),
+        ("int8", 1),
+        ("int8", args.rescore_factor),
+    ]
+
+    print(f"📊 {args.rows} vectors, {args.queries} queries, recall@{args.k} vs exact float32 at dim {args.dim}\n")
+    print(f"   {'dim':>5} {'precision':<18} {'bytes/vector':>12} {'MB/1000 q':>10} {'recall':>7} {'p50 ms':>8}")
+    for dim in args.dims:
+        reduced = np.stack([reduce_dimensions(v, dim) for v in vectors])
+        reduced_queries = [reduce_dimensions(q, dim) for q in queries]
+        for precision, factor in configs:
+            index = build_index(reduced, precision)
+            cache = VectorIndexCache(1, precision=precision, rescore_factor=factor)
+            recall, p50 = await run_config(index, cache, reduced_queries, truth, args.k, reduced)
+
+            label = precision + (f" + rescore x{factor}" if precision == "int8" and factor > 1 else "")
+            per_vector = index.nbytes / index._matrix.shape[0]
+            print(f"   {dim:>5} {label:<18} {per_vector:>12.0f} {per_vector * 1000 / 1e6:>10.2f} "
+                  f"{recall:>7.3f} {p50:>8.2f}")
+        print()
+
+    json_bytes = len(",".join(repr(float(x)) for x in vectors[0])) + 2
+    print(f"   For reference: one {args.dim}-dim vector as a JSON float list is ~{json_bytes} bytes")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
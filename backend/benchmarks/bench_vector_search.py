@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Benchmark: pgvector HNSW vs exact cosine search on synthetic data
+Reports recall@k (against an exact scan) and query latency for several ef_search values
+
+Usage (from backend/):
+    python -m benchmarks.bench_vector_search --rows 20000 --dim 1536 --queries 100
+
+Requires a postgresql:// DATABASE_URL with the pgvector extension available.
+Works on a TEMP table, so nothing is left behind.
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+import asyncpg
+
+from app.config import settings
+
+
+def random_unit_vector(dim: int, center=None, spread: float = 0.3) -> list:
+    """Gaussian vector, optionally around a cluster center, normalized to unit length"""
+    if center is None:
+        vector = [random.gauss(0, 1) for _ in range(dim)]
+    else:
+        vector = [c + random.gauss(0, spread) for c in center]
+    norm = sum(x * x for x in vector) ** 0.5
+    return [x / norm for x in vector]
+
+
+def to_pgvector(vector: list) -> str:
+    return "[" + ",".join(f"{x:.6f}" for x in vector) + "]"
+
+
+async def timed_search(conn, sql: str, query: str, k: int) -> tuple:
+    start = time.perf_counter()
+    rows = await conn.fetch(sql, query, k)
+    return [r["id"] for r in rows], (time.perf_counter() - start) * 1000
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--clusters", type=int, default=50, help="Topics in the synthetic corpus")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[20, 40, 100, 200])
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    conn = await asyncpg.connect(settings.DATABASE_URL.replace("postgresql+asyncpg://", "postgresql://"))
+
+    try:
+        await conn.execute("CREATE EXTENSION IF NOT EXISTS vector")
+        await conn.execute(f"CREATE TEMP TABLE bench_embeddings (id SERIAL PRIMARY KEY, embedding vector({args.dim}))")
+
+        print(f"📥 Inserting {args.rows} synthetic vectors (dim={args.dim}, clusters={args.clusters})...")
+        centers = [random_unit_vector(args.dim) for _ in range(args.clusters)]
+        rows = [(to_pgvector(random_unit_vector(args.dim, random.choice(centers))),) for _ in range(args.rows)]
+        await conn.executemany("INSERT INTO bench_embeddings (embedding) VALUES ($1::vector)", rows)
+
+        queries = [to_pgvector(random_unit_vector(args.dim, random.choice(centers))) for _ in range(args.queries)]
+        sql = "SELECT id FROM bench_embeddings ORDER BY embedding <=> $1::vector LIMIT $2"
+
+        # Ground truth: exact scan
+        await conn.execute("SET enable_indexscan = off")
+        truth, exact_latencies = [], []
+        for q in queries:
+            ids, ms = await timed_search(conn, sql, q, args.k)
+            truth.append(set(ids))
+            exact_latencies.append(ms)
+        await conn.execute("RESET enable_indexscan")
+
+        print("🏗️  Building HNSW index (m=16, ef_construction=64)...")
+        start = time.perf_counter()
+        await conn.execute("CREATE INDEX ON bench_embeddings USING hnsw (embedding vector_cosine_ops) WITH (m = 16, ef_construction = 64)")
+        print(f"   built in {time.perf_counter() - start:.1f} s")
+
+        print(f"\n📊 recall@{args.k} and latency over {args.queries} queries")
+        print(f"   exact scan           recall 1.000 | p50 {statistics.median(exact_latencies):7.2f} ms")
+        for ef in args.ef_search:
+            await conn.execute(f"SET hnsw.ef_search = {int(ef)}")
+            recalls, latencies = [], []
+            for q, expected in zip(queries, truth):
+                ids, ms = await timed_search(conn, sql, q, args.k)
+                recalls.append(len(expected & set(ids)) / len(expected))
+                latencies.append(ms)
+            latencies.sort()
+            p95 = latencies[int(len(latencies) * 0.95) - 1]
+            print(f"   hnsw ef_search={ef:<5d} recall {statistics.mean(recalls):.3f} | "
+                  f"p50 {statistics.median(latencies):7.2f} ms | p95 {p95:7.2f} ms")
+    finally:
+        await conn.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,10 +1,21 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
 import os
 from dotenv import load_dotenv
 
-from app.routers import auth, questions, stats, usage, users
+from app.routers import auth, questions, stats, usage, users, embeddings, uploads
+from app.services.supabase_db_service import supabase_db
+from app.services.azure_ai_service import azure_ai_service
+from app.services.vector_index_service import vector_index
+from app.services.explanation_reuse_service import explanation_reuse
+from app.services.lazy_explanation_service import lazy_explanations
+from app.services.practice_pool_service import practice_pools
+from app.services.embedding_backfill_service import backfill_runner
+from app.services.embedding_model_service import embedding_models
+from app.services.image_ref_service import image_refs
+from app.services.purge_service import purge_worker
+from app.services.supabase_storage_service import supabase_storage
+from app.services.storage_cache_service import CachedStorageBackend
 
 load_dotenv()
 
@@ -23,30 +34,36 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
-# Create uploads directory (only used as fallback if Supabase Storage fails)
-# NOTE: Images are now stored in Supabase Storage for persistence on Railway
-UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads")
-os.makedirs(UPLOAD_DIR, exist_ok=True)
-
-# Mount static files (fallback for local development)
-if os.path.exists(UPLOAD_DIR):
-    app.mount("/uploads", StaticFiles(directory=UPLOAD_DIR), name="uploads")
-
 # Include routers
 app.include_router(auth.router, prefix="/auth", tags=["Authentication"])
 app.include_router(questions.router, prefix="/questions", tags=["Questions"])
 app.include_router(stats.router, prefix="/stats", tags=["Statistics"])
 app.include_router(usage.router, prefix="/usage", tags=["Usage"])
 app.include_router(users.router, prefix="/users", tags=["User Management"])
+app.include_router(embeddings.router, prefix="/admin/embeddings", tags=["Embedding Maintenance"])
+# Stored images (local backend, local fallback, and the bucket cache)
+app.include_router(uploads.router, prefix="/uploads", tags=["Files"])
 
 @app.on_event("startup")
 async def startup_event():
     """Initialize services on startup"""
     # Supabase client is initialized in supabase_db_service.py
+    # Remove embeddings and images of deleted questions in the background
+    purge_worker.start()
     print("✅ Application started successfully")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop background jobs and release database connections"""
+    await backfill_runner.cancel()
+    await purge_worker.stop()
+    await lazy_explanations.stop()
+    await practice_pools.stop()
+    await supabase_db.close()
+
 @app.get("/")
 async def root():
     return {
@@ -59,6 +76,22 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/metrics")
+async def metrics():
+    """Runtime counters for performance monitoring"""
+    return {
+        "db_singleflight": supabase_db.get_singleflight_stats(),
+        "vector_index": vector_index.get_stats(),
+        "explanation_reuse": explanation_reuse.get_stats(),
+        "lazy_explanations": lazy_explanations.get_stats(),
+        "practice_pools": practice_pools.get_stats(),
+        "ai_routes": azure_ai_service.get_route_stats(),
+        "embedding_models": embedding_models.get_status(),
+        "image_refs": image_refs.get_stats(),
+        "storage_cache": supabase_storage.get_stats() if isinstance(supabase_storage, CachedStorageBackend) else None,
+        "purge": await purge_worker.get_stats()
+    }
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
@@ -0,0 +1,27 @@
+-- Bulk question updates that write a user's explanation also mark its provenance
+-- ("edited"), keeping each row's other metadata, so the text is never reused
+-- for other users' questions
+-- Used by SupabaseDBService.update_questions via RPC. Run this in Supabase SQL Editor
+
+-- Set explanation (and status, if given) on several of a user's questions and store
+-- p_provenance as question_metadata.explanation; returns the updated rows
+CREATE OR REPLACE FUNCTION update_questions_explanation(
+    p_user_id INT,
+    p_question_ids INT[],
+    p_provenance JSONB,
+    p_explanation TEXT DEFAULT NULL,
+    p_status TEXT DEFAULT NULL
+)
+RETURNS SETOF study_questions
+LANGUAGE sql
+AS $$
+    UPDATE study_questions q
+    SET explanation = COALESCE(p_explanation, q.explanation),
+        status = COALESCE(p_status, q.status),
+        question_metadata = jsonb_set(COALESCE(q.question_metadata, '{}'::jsonb), '{explanation}', p_provenance),
+        updated_at = NOW()
+    WHERE q.user_id = p_user_id AND q.id = ANY(p_question_ids)
+    RETURNING q.*;
+$$;
+
+GRANT EXECUTE ON FUNCTION update_questions_explanation(INT, INT[], JSONB, TEXT, TEXT) TO anon, authenticated;
@@ -0,0 +1,107 @@
+-- Deferred deletion of question embeddings and images
+-- Deleting questions (or a user) removes the rows and queues their embeddings and image
+-- references in the same statement; the purge worker (app/services/purge_service.py)
+-- removes them in batches and retries failures with backoff.
+-- Requires add_image_reference_counts.sql. Run this in Supabase SQL Editor
+
+CREATE TABLE IF NOT EXISTS study_purge_queue (
+    id SERIAL PRIMARY KEY,
+    question_id INTEGER,               -- NULL for entries that only delete images
+    user_id INTEGER,
+    image_urls TEXT[] NOT NULL DEFAULT '{}',
+    refs_released BOOLEAN NOT NULL DEFAULT FALSE,  -- image_urls then lists only images left unreferenced
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    last_error TEXT,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_study_purge_queue_due ON study_purge_queue(next_attempt_at, id);
+
+-- ================== DELETE + QUEUE ==================
+
+-- Delete a user's questions; returns the ids deleted (others are not found or not owned)
+CREATE OR REPLACE FUNCTION delete_questions_queued(p_user_id INT, p_question_ids INT[])
+RETURNS TABLE (id INT)
+LANGUAGE sql
+AS $$
+    WITH gone AS (
+        DELETE FROM study_questions q
+        WHERE q.user_id = p_user_id AND q.id = ANY(p_question_ids)
+        RETURNING q.id, q.user_id, q.image_url, q.image_snippet_url, q.image_thumbnail_url, q.image_review_url
+    ), queued AS (
+        INSERT INTO study_purge_queue (question_id, user_id, image_urls)
+        SELECT gone.id, gone.user_id,
+               array_remove(ARRAY[gone.image_url, gone.image_snippet_url, gone.image_thumbnail_url, gone.image_review_url], NULL)
+        FROM gone
+    )
+    SELECT gone.id FROM gone;
+$$;
+
+-- Delete a user with their upload history and questions; returns the user's id if it existed
+CREATE OR REPLACE FUNCTION delete_user_queued(p_user_id INT)
+RETURNS TABLE (id INT)
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    DELETE FROM study_upload_history h WHERE h.user_id = p_user_id;
+    PERFORM 1 FROM delete_questions_queued(
+        p_user_id,
+        ARRAY(SELECT q.id FROM study_questions q WHERE q.user_id = p_user_id)
+    );
+    RETURN QUERY DELETE FROM study_users u WHERE u.id = p_user_id RETURNING u.id;
+END;
+$$;
+
+-- ================== PURGE WORKER ==================
+
+-- Drop the image references of queued entries (once per entry) and keep, on each entry,
+-- only the images whose last reference went. Returns the images of the entries that
+-- are left unreferenced (including entries released by an earlier, failed attempt)
+CREATE OR REPLACE FUNCTION release_purge_refs(p_ids INT[])
+RETURNS TABLE (url TEXT)
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    UPDATE study_image_refs r SET ref_count = r.ref_count - dropped.n
+    FROM (
+        SELECT u AS url, count(*) AS n
+        FROM study_purge_queue q, unnest(q.image_urls) AS u
+        WHERE q.id = ANY(p_ids) AND NOT q.refs_released
+        GROUP BY u
+    ) dropped
+    WHERE r.url = dropped.url;
+
+    UPDATE study_purge_queue q
+    SET refs_released = TRUE,
+        image_urls = ARRAY(
+            SELECT u FROM unnest(q.image_urls) AS u
+            WHERE EXISTS (SELECT 1 FROM study_image_refs r WHERE r.url = u AND r.ref_count <= 0)
+        )
+    WHERE q.id = ANY(p_ids) AND NOT q.refs_released;
+
+    DELETE FROM study_image_refs r
+    WHERE r.ref_count <= 0
+      AND r.url IN (SELECT unnest(q.image_urls) FROM study_purge_queue q WHERE q.id = ANY(p_ids));
+
+    RETURN QUERY
+    SELECT DISTINCT unnest(q.image_urls) FROM study_purge_queue q WHERE q.id = ANY(p_ids);
+END;
+$$;
+
+-- Schedule another attempt with exponential backoff (base * 2^attempts, capped)
+CREATE OR REPLACE FUNCTION retry_purge(p_ids INT[], p_error TEXT, p_base_seconds INT, p_max_seconds INT)
+RETURNS VOID
+LANGUAGE sql
+AS $$
+    UPDATE study_purge_queue
+    SET attempts = attempts + 1,
+        last_error = p_error,
+        next_attempt_at = NOW() + LEAST(p_max_seconds, p_base_seconds * power(2, LEAST(attempts, 20))) * interval '1 second'
+    WHERE id = ANY(p_ids);
+$$;
+
+GRANT EXECUTE ON FUNCTION delete_questions_queued(INT, INT[]) TO anon, authenticated;
+GRANT EXECUTE ON FUNCTION delete_user_queued(INT) TO anon, authenticated;
+GRANT EXECUTE ON FUNCTION release_purge_refs(INT[]) TO anon, authenticated;
+GRANT EXECUTE ON FUNCTION retry_purge(INT[], TEXT, INT, INT) TO anon, authenticated;
@@ -0,0 +1,23 @@
+-- Embedding health report for the backfill job (backfill_embeddings.py)
+-- Lets the job find zero/NULL vectors without downloading every embedding
+-- Run this in Supabase SQL Editor
+
+-- One row per stored embedding; the job pages through it with
+-- ?question_id=gt.N&order=question_id&limit=M
+CREATE OR REPLACE FUNCTION question_embedding_health()
+RETURNS TABLE (
+    id UUID,
+    question_id INT,
+    dims INT,
+    is_zero BOOLEAN
+)
+LANGUAGE sql STABLE
+AS $$
+    SELECT e.id,
+           e.question_id,
+           vector_dims(e.embedding) AS dims,
+           coalesce(vector_norm(e.embedding) = 0, true) AS is_zero
+    FROM study.question_embeddings e;
+$$;
+
+GRANT EXECUTE ON FUNCTION question_embedding_health() TO anon, authenticated;
@@ -0,0 +1,161 @@
+-- Embedding model versioning for online model migrations
+-- Every embedding is tagged with the model that produced it ("<deployment>@<dimensions>");
+-- search, nearest-question lookup and the health report only compare vectors of one model.
+-- The active/shadow models live in study_app_config (key 'embedding_models'), so a cutover
+-- is a single-row write (see app/services/embedding_model_service.py)
+-- Requires add_halfvec_vector_index.sql, add_explanation_reuse.sql and
+-- add_embedding_health_function.sql. Run this in Supabase SQL Editor
+
+-- ================== CONFIG ROW ==================
+
+CREATE TABLE IF NOT EXISTS study_app_config (
+    key TEXT PRIMARY KEY,
+    value JSONB NOT NULL,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- ================== MODEL TAG ==================
+
+-- Existing rows were produced by the initial model
+ALTER TABLE study.question_embeddings
+    ADD COLUMN IF NOT EXISTS embedding_model TEXT NOT NULL DEFAULT 'text-embedding-ada-002@1536';
+ALTER TABLE study.question_embeddings ALTER COLUMN embedding_model DROP DEFAULT;
+
+-- Models may differ in dimensions, so the column holds vectors of any size
+DROP INDEX IF EXISTS study.idx_question_embeddings_vector_hnsw;
+DROP INDEX IF EXISTS study.idx_question_embeddings_halfvec_hnsw;
+ALTER TABLE study.question_embeddings ALTER COLUMN embedding TYPE vector;
+
+CREATE INDEX IF NOT EXISTS idx_question_embeddings_model_user
+ON study.question_embeddings(embedding_model, user_id);
+
+-- One partial halfvec HNSW index per model. Before starting a migration to a
+-- new model, create its index the same way, e.g. for text-embedding-3-large@1024:
+--
+--   CREATE INDEX idx_question_embeddings_hnsw_te3l_1024 ON study.question_embeddings
+--   USING hnsw ((embedding::halfvec(1024)) halfvec_cosine_ops)
+--   WITH (m = 16, ef_construction = 64)
+--   WHERE embedding_model = 'text-embedding-3-large@1024';
+CREATE INDEX IF NOT EXISTS idx_question_embeddings_hnsw_ada002_1536 ON study.question_embeddings
+USING hnsw ((embedding::halfvec(1536)) halfvec_cosine_ops)
+WITH (m = 16, ef_construction = 64)
+WHERE embedding_model = 'text-embedding-ada-002@1536';
+
+-- ================== SEARCH ==================
+
+-- The queries cast to halfvec(<query dimensions>) so the planner can use the
+-- partial index of the requested model; they are built per call for that reason
+
+DROP FUNCTION IF EXISTS match_question_embeddings(vector, FLOAT, INT, INT, TEXT, TEXT, INT);
+
+CREATE OR REPLACE FUNCTION match_question_embeddings(
+    query_embedding vector,
+    match_threshold FLOAT,
+    match_count INT,
+    p_user_id INT,
+    p_subject TEXT DEFAULT NULL,
+    p_grade TEXT DEFAULT NULL,
+    rescore_factor INT DEFAULT 4,
+    p_model TEXT DEFAULT 'text-embedding-ada-002@1536'
+)
+RETURNS TABLE (
+    id UUID,
+    question_id INT,
+    subject VARCHAR,
+    grade VARCHAR,
+    similarity FLOAT
+)
+LANGUAGE plpgsql STABLE
+-- Candidate list size for HNSW scans; must be >= match_count * rescore_factor
+SET hnsw.ef_search = 100
+AS $$
+BEGIN
+    RETURN QUERY EXECUTE format($query$
+        WITH candidates AS (
+            SELECT e.id, e.question_id, e.subject, e.grade, e.embedding
+            FROM study.question_embeddings e
+            WHERE e.embedding_model = $1
+              AND e.user_id = $2
+              AND ($3::text IS NULL OR e.subject = $3)
+              AND ($4::text IS NULL OR e.grade = $4)
+            ORDER BY e.embedding::halfvec(%1$s) <=> $5::halfvec(%1$s)
+            LIMIT $6 * $7
+        )
+        SELECT c.id,
+               c.question_id,
+               c.subject::varchar,
+               c.grade::varchar,
+               1 - (c.embedding <=> $5) AS similarity
+        FROM candidates c
+        WHERE 1 - (c.embedding <=> $5) >= $8
+        ORDER BY c.embedding <=> $5
+        LIMIT $6
+    $query$, vector_dims(query_embedding))
+    USING p_model, p_user_id, p_subject, p_grade, query_embedding, match_count, rescore_factor, match_threshold;
+END;
+$$;
+
+GRANT EXECUTE ON FUNCTION match_question_embeddings(vector, FLOAT, INT, INT, TEXT, TEXT, INT, TEXT) TO anon, authenticated;
+
+DROP FUNCTION IF EXISTS match_nearest_question(vector, TEXT, TEXT, INT);
+
+CREATE OR REPLACE FUNCTION match_nearest_question(
+    query_embedding vector,
+    p_subject TEXT,
+    p_grade TEXT DEFAULT NULL,
+    candidate_count INT DEFAULT 8,
+    p_model TEXT DEFAULT 'text-embedding-ada-002@1536'
+)
+RETURNS TABLE (
+    question_id INT,
+    similarity FLOAT
+)
+LANGUAGE plpgsql STABLE
+SET hnsw.ef_search = 100
+AS $$
+BEGIN
+    RETURN QUERY EXECUTE format($query$
+        WITH candidates AS (
+            SELECT e.question_id, e.embedding
+            FROM study.question_embeddings e
+            WHERE e.embedding_model = $1
+              AND e.subject = $2
+              AND e.grade IS NOT DISTINCT FROM $3
+            ORDER BY e.embedding::halfvec(%1$s) <=> $4::halfvec(%1$s)
+            LIMIT $5
+        )
+        SELECT c.question_id, 1 - (c.embedding <=> $4) AS similarity
+        FROM candidates c
+        ORDER BY c.embedding <=> $4
+        LIMIT 1
+    $query$, vector_dims(query_embedding))
+    USING p_model, p_subject, p_grade, query_embedding, candidate_count;
+END;
+$$;
+
+GRANT EXECUTE ON FUNCTION match_nearest_question(vector, TEXT, TEXT, INT, TEXT) TO anon, authenticated;
+
+-- ================== HEALTH REPORT ==================
+
+-- The result gains embedding_model, so the old function must be dropped
+DROP FUNCTION IF EXISTS question_embedding_health();
+
+CREATE OR REPLACE FUNCTION question_embedding_health()
+RETURNS TABLE (
+    id UUID,
+    question_id INT,
+    embedding_model TEXT,
+    dims INT,
+    is_zero BOOLEAN
+)
+LANGUAGE sql STABLE
+AS $$
+    SELECT e.id,
+           e.question_id,
+           e.embedding_model,
+           vector_dims(e.embedding) AS dims,
+           coalesce(vector_norm(e.embedding) = 0, true) AS is_zero
+    FROM study.question_embeddings e;
+$$;
+
+GRANT EXECUTE ON FUNCTION question_embedding_health() TO anon, authenticated;
@@ -0,0 +1,37 @@
+-- Nearest existing question across all users, for reusing explanations at ingest
+-- Used by SupabaseService.find_nearest_question via RPC
+-- Requires add_halfvec_vector_index.sql (halfvec HNSW index). Run this in Supabase SQL Editor
+
+CREATE INDEX IF NOT EXISTS idx_question_embeddings_subject_grade
+ON study.question_embeddings(subject, grade);
+
+-- Best match in the same subject and grade (NULL grade matches NULL grade).
+-- Candidates come from the halfvec index and are rescored on full precision
+CREATE OR REPLACE FUNCTION match_nearest_question(
+    query_embedding vector(1536),
+    p_subject TEXT,
+    p_grade TEXT DEFAULT NULL,
+    candidate_count INT DEFAULT 8
+)
+RETURNS TABLE (
+    question_id INT,
+    similarity FLOAT
+)
+LANGUAGE sql STABLE
+SET hnsw.ef_search = 100
+AS $$
+    WITH candidates AS (
+        SELECT e.question_id, e.embedding
+        FROM study.question_embeddings e
+        WHERE e.subject = p_subject
+          AND e.grade IS NOT DISTINCT FROM p_grade
+        ORDER BY e.embedding::halfvec(1536) <=> query_embedding::halfvec(1536)
+        LIMIT candidate_count
+    )
+    SELECT c.question_id, 1 - (c.embedding <=> query_embedding) AS similarity
+    FROM candidates c
+    ORDER BY c.embedding <=> query_embedding
+    LIMIT 1;
+$$;
+
+GRANT EXECUTE ON FUNCTION match_nearest_question(vector, TEXT, TEXT, INT) TO anon, authenticated;
@@ -0,0 +1,61 @@
+-- Half-precision HNSW index with full-precision rescoring
+-- Halves the vector index size; the table keeps full vector(1536) values
+-- Requires pgvector >= 0.7.0 (halfvec). Run after add_vector_search_function.sql
+--
+-- Reduced dimensions (EMBEDDING_DIMENSIONS < 1536, text-embedding-3 deployments):
+-- replace 1536 below and in the column type, then re-embed existing rows
+
+CREATE EXTENSION IF NOT EXISTS vector;
+
+-- Index a halfvec copy of each embedding (2 bytes/dimension instead of 4)
+DROP INDEX IF EXISTS study.idx_question_embeddings_vector_hnsw;
+CREATE INDEX IF NOT EXISTS idx_question_embeddings_halfvec_hnsw ON study.question_embeddings
+USING hnsw ((embedding::halfvec(1536)) halfvec_cosine_ops)
+WITH (m = 16, ef_construction = 64);
+
+-- The signature gains rescore_factor, so the old function must be dropped
+DROP FUNCTION IF EXISTS match_question_embeddings(vector, FLOAT, INT, INT, TEXT, TEXT);
+
+-- Candidates come from the halfvec index (match_count * rescore_factor of them),
+-- then are re-ranked and thresholded on the full-precision vectors
+CREATE OR REPLACE FUNCTION match_question_embeddings(
+    query_embedding vector(1536),
+    match_threshold FLOAT,
+    match_count INT,
+    p_user_id INT,
+    p_subject TEXT DEFAULT NULL,
+    p_grade TEXT DEFAULT NULL,
+    rescore_factor INT DEFAULT 4
+)
+RETURNS TABLE (
+    id UUID,
+    question_id INT,
+    subject VARCHAR,
+    grade VARCHAR,
+    similarity FLOAT
+)
+LANGUAGE sql STABLE
+-- Candidate list size for HNSW scans; must be >= match_count * rescore_factor
+SET hnsw.ef_search = 100
+AS $$
+    WITH candidates AS (
+        SELECT e.id, e.question_id, e.subject, e.grade, e.embedding
+        FROM study.question_embeddings e
+        WHERE e.user_id = p_user_id
+          AND (p_subject IS NULL OR e.subject = p_subject)
+          AND (p_grade IS NULL OR e.grade = p_grade)
+        ORDER BY e.embedding::halfvec(1536) <=> query_embedding::halfvec(1536)
+        LIMIT match_count * rescore_factor
+    )
+    SELECT c.id,
+           c.question_id,
+           c.subject,
+           c.grade,
+           1 - (c.embedding <=> query_embedding) AS similarity
+    FROM candidates c
+    WHERE 1 - (c.embedding <=> query_embedding) >= match_threshold
+    ORDER BY c.embedding <=> query_embedding
+    LIMIT match_count;
+$$;
+
+GRANT EXECUTE ON FUNCTION match_question_embeddings(vector, FLOAT, INT, INT, TEXT, TEXT, INT) TO anon, authenticated;
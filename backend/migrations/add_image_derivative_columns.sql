@@ -0,0 +1,7 @@
+-- Downscaled WebP copies of each question image (list thumbnail, review-size image)
+-- Written at upload by app/services/image_derivative_service.py; NULL for older
+-- questions, whose clients fall back to image_url
+-- Run this in Supabase SQL Editor
+
+ALTER TABLE study_questions ADD COLUMN IF NOT EXISTS image_thumbnail_url TEXT;
+ALTER TABLE study_questions ADD COLUMN IF NOT EXISTS image_review_url TEXT;
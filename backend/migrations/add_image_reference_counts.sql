@@ -0,0 +1,60 @@
+-- Reference counts for content-addressed question images
+-- Images are stored once per content hash (<sha256[:2]>/<sha256[2:4]>/<sha256>.<ext>) and shared
+-- by every question that uses them; an object is deleted when its last reference goes.
+-- Used by app/services/image_ref_service.py. Run this in Supabase SQL Editor
+
+CREATE TABLE IF NOT EXISTS study_image_refs (
+    url TEXT PRIMARY KEY,
+    ref_count INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- Count references to images uploaded before this migration
+INSERT INTO study_image_refs (url, ref_count)
+SELECT url, count(*)
+FROM (
+    SELECT image_url AS url FROM study_questions
+    UNION ALL SELECT image_snippet_url FROM study_questions
+    UNION ALL SELECT image_thumbnail_url FROM study_questions
+    UNION ALL SELECT image_review_url FROM study_questions
+) refs
+WHERE url IS NOT NULL
+GROUP BY url
+ON CONFLICT (url) DO NOTHING;
+
+-- Add references; returns the new counts (count = added means the image is new)
+CREATE OR REPLACE FUNCTION acquire_image_refs(p_urls TEXT[], p_counts INT[])
+RETURNS TABLE (url TEXT, ref_count INT)
+LANGUAGE sql
+AS $$
+    INSERT INTO study_image_refs AS r (url, ref_count)
+    SELECT added.url, added.n FROM unnest(p_urls, p_counts) AS added(url, n)
+    ON CONFLICT (url) DO UPDATE SET ref_count = r.ref_count + EXCLUDED.ref_count
+    RETURNING r.url, r.ref_count;
+$$;
+
+-- Drop references; deletes and returns the rows whose count reached zero
+CREATE OR REPLACE FUNCTION release_image_refs(p_urls TEXT[], p_counts INT[])
+RETURNS TABLE (url TEXT)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    released TEXT[];
+BEGIN
+    WITH updated AS (
+        UPDATE study_image_refs r SET ref_count = r.ref_count - dropped.n
+        FROM unnest(p_urls, p_counts) AS dropped(url, n)
+        WHERE r.url = dropped.url
+        RETURNING r.url, r.ref_count
+    )
+    SELECT array_agg(updated.url) INTO released FROM updated WHERE updated.ref_count <= 0;
+
+    RETURN QUERY
+    DELETE FROM study_image_refs r
+    WHERE r.url = ANY(coalesce(released, '{}')) AND r.ref_count <= 0
+    RETURNING r.url;
+END;
+$$;
+
+GRANT EXECUTE ON FUNCTION acquire_image_refs(TEXT[], INT[]) TO anon, authenticated;
+GRANT EXECUTE ON FUNCTION release_image_refs(TEXT[], INT[]) TO anon, authenticated;
@@ -0,0 +1,39 @@
+-- Paged embedding health report (backfill job, /admin/embeddings coverage)
+-- Pages hold every embedding of whole questions, so a question's active and
+-- shadow vectors are never split across pages, and only the page's vectors are
+-- measured (the filter and limit used to run after the whole table was scanned)
+-- Requires add_embedding_model_versioning.sql. Run this in Supabase SQL Editor
+
+CREATE INDEX IF NOT EXISTS idx_question_embeddings_question_id
+    ON study.question_embeddings (question_id);
+
+DROP FUNCTION IF EXISTS question_embedding_health();
+
+-- Embeddings of the first p_question_limit questions with id > p_after_question_id
+CREATE OR REPLACE FUNCTION question_embedding_health(p_after_question_id INT, p_question_limit INT)
+RETURNS TABLE (
+    id UUID,
+    question_id INT,
+    embedding_model TEXT,
+    dims INT,
+    is_zero BOOLEAN
+)
+LANGUAGE sql STABLE
+AS $$
+    SELECT e.id,
+           e.question_id,
+           e.embedding_model,
+           vector_dims(e.embedding) AS dims,
+           coalesce(vector_norm(e.embedding) = 0, true) AS is_zero
+    FROM study.question_embeddings e
+    WHERE e.question_id IN (
+        SELECT DISTINCT p.question_id
+        FROM study.question_embeddings p
+        WHERE p.question_id > p_after_question_id
+        ORDER BY p.question_id
+        LIMIT p_question_limit
+    )
+    ORDER BY e.question_id;
+$$;
+
+GRANT EXECUTE ON FUNCTION question_embedding_health(INT, INT) TO anon, authenticated;
@@ -0,0 +1,9 @@
+-- Explanation prefetch in lazy mode (EXPLANATION_MODE=lazy)
+-- GET /questions/{id} looks up the next few questions of the user still waiting
+-- for an explanation (get_pending_explanations_after); this partial index holds
+-- only those questions, in review order
+-- Run this in Supabase SQL Editor
+
+CREATE INDEX IF NOT EXISTS idx_study_questions_pending_explanation
+    ON study_questions(user_id, created_at DESC, id DESC)
+    WHERE explanation IS NULL;
@@ -0,0 +1,46 @@
+-- Practice pools: take_practice_questions also reports the pool's size and its
+-- unseen questions left, so /similar decides on a background refill without
+-- reading the whole pool
+-- Requires add_practice_question_pools.sql. Run this in Supabase SQL Editor
+
+-- The result gains pool_size and pool_unseen, so the old function must be dropped
+DROP FUNCTION IF EXISTS take_practice_questions(INT, INT);
+
+-- Serve up to p_limit practice questions, least served first, counting them as served.
+-- Concurrent clicks skip rows another click is serving, so they get different items.
+-- Every row carries the pool's size and unseen count after this take
+CREATE OR REPLACE FUNCTION take_practice_questions(p_question_id INT, p_limit INT)
+RETURNS TABLE (
+    id INT,
+    question_id INT,
+    question_text TEXT,
+    text_key TEXT,
+    served_count INT,
+    last_served_at TIMESTAMP WITH TIME ZONE,
+    created_at TIMESTAMP WITH TIME ZONE,
+    pool_size BIGINT,
+    pool_unseen BIGINT
+)
+LANGUAGE sql
+AS $$
+    WITH taken AS (
+        UPDATE study_practice_questions
+        SET served_count = served_count + 1, last_served_at = NOW()
+        WHERE study_practice_questions.id IN (
+            SELECT p.id FROM study_practice_questions p WHERE p.question_id = p_question_id
+            ORDER BY p.served_count, p.last_served_at NULLS FIRST, p.id LIMIT p_limit
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING *
+    ), pool AS (
+        -- Counted before the update (same snapshot): unseen drops by the rows served first now
+        SELECT count(*) AS size, count(*) FILTER (WHERE p.served_count = 0) AS unseen
+        FROM study_practice_questions p WHERE p.question_id = p_question_id
+    )
+    SELECT t.id, t.question_id, t.question_text, t.text_key, t.served_count, t.last_served_at, t.created_at,
+           pool.size,
+           pool.unseen - (SELECT count(*) FROM taken WHERE taken.served_count = 1)
+    FROM taken t, pool;
+$$;
+
+GRANT EXECUTE ON FUNCTION take_practice_questions(INT, INT) TO anon, authenticated;
@@ -0,0 +1,34 @@
+-- Practice question pools for POST /questions/{id}/similar
+-- Practice questions are generated in batches ahead of time (app/services/practice_pool_service.py)
+-- and served from this table, least served first, so repeat clicks show new questions.
+-- text_key (normalized text) keeps each pool free of duplicates.
+-- Run this in Supabase SQL Editor
+
+CREATE TABLE IF NOT EXISTS study_practice_questions (
+    id SERIAL PRIMARY KEY,
+    question_id INTEGER NOT NULL REFERENCES study_questions(id) ON DELETE CASCADE,
+    question_text TEXT NOT NULL,
+    text_key TEXT NOT NULL,
+    served_count INTEGER NOT NULL DEFAULT 0,
+    last_served_at TIMESTAMP WITH TIME ZONE,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    UNIQUE (question_id, text_key)
+);
+
+-- Serve up to p_limit practice questions, least served first, counting them as served.
+-- Concurrent clicks skip rows another click is serving, so they get different items
+CREATE OR REPLACE FUNCTION take_practice_questions(p_question_id INT, p_limit INT)
+RETURNS SETOF study_practice_questions
+LANGUAGE sql
+AS $$
+    UPDATE study_practice_questions
+    SET served_count = served_count + 1, last_served_at = NOW()
+    WHERE id IN (
+        SELECT id FROM study_practice_questions WHERE question_id = p_question_id
+        ORDER BY served_count, last_served_at NULLS FIRST, id LIMIT p_limit
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING *;
+$$;
+
+GRANT EXECUTE ON FUNCTION take_practice_questions(INT, INT) TO anon, authenticated;
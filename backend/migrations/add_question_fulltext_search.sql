@@ -0,0 +1,36 @@
+-- Indexed full-text search over question text
+-- Lexical half of the hybrid search in POST /questions/search (fused with
+-- vector results by reciprocal rank fusion)
+-- Run this in Supabase SQL Editor
+
+-- Expression index (no extra column, so SELECT * stays unchanged).
+-- 'simple' config: no stemming or stop words, so question numbers, variable
+-- names and formula fragments ("2x", "x2", "pythagoras") stay searchable
+CREATE INDEX IF NOT EXISTS idx_study_questions_fulltext
+ON study_questions USING gin (to_tsvector('simple', question_text));
+
+-- Returns ids ranked by ts_rank_cd; any query term may match (OR semantics),
+-- questions matching more terms rank higher
+CREATE OR REPLACE FUNCTION search_question_ids(
+    p_user_id INT,
+    p_query TEXT,
+    match_count INT
+)
+RETURNS TABLE (
+    id INT,
+    rank REAL
+)
+LANGUAGE sql STABLE
+AS $$
+    WITH q AS (
+        SELECT nullif(replace(plainto_tsquery('simple', p_query)::text, ' & ', ' | '), '')::tsquery AS query
+    )
+    SELECT s.id, ts_rank_cd(to_tsvector('simple', s.question_text), q.query) AS rank
+    FROM study_questions s, q
+    WHERE s.user_id = p_user_id
+      AND to_tsvector('simple', s.question_text) @@ q.query
+    ORDER BY rank DESC, s.id DESC
+    LIMIT match_count;
+$$;
+
+GRANT EXECUTE ON FUNCTION search_question_ids(INT, TEXT, INT) TO anon, authenticated;
@@ -0,0 +1,11 @@
+-- Multi-page submissions (POST /questions/upload/pages)
+-- One upload record covers every page of a submission: pages_analyzed counts the
+-- pages whose analysis finished (progress while the request runs), and the token
+-- columns sum the usage of all of the submission's AI calls
+-- Run this in Supabase SQL Editor
+
+ALTER TABLE study_upload_history ADD COLUMN IF NOT EXISTS pages_total INTEGER DEFAULT 1;
+ALTER TABLE study_upload_history ADD COLUMN IF NOT EXISTS pages_analyzed INTEGER DEFAULT 0;
+ALTER TABLE study_upload_history ADD COLUMN IF NOT EXISTS prompt_tokens INTEGER DEFAULT 0;
+ALTER TABLE study_upload_history ADD COLUMN IF NOT EXISTS completion_tokens INTEGER DEFAULT 0;
+ALTER TABLE study_upload_history ADD COLUMN IF NOT EXISTS total_tokens INTEGER DEFAULT 0;
@@ -0,0 +1,43 @@
+-- Server-side sorting, keyset pagination and prefix search for the admin user list
+-- Backs GET /users/?limit=&cursor=&sort=&search= and GET /usage/tokens/all?limit=
+-- Run this in Supabase SQL Editor
+
+-- Token counters must be non-null so they sort and paginate consistently
+UPDATE study_users SET total_tokens_used = 0 WHERE total_tokens_used IS NULL;
+UPDATE study_users SET prompt_tokens_used = 0 WHERE prompt_tokens_used IS NULL;
+UPDATE study_users SET completion_tokens_used = 0 WHERE completion_tokens_used IS NULL;
+
+ALTER TABLE study_users ALTER COLUMN total_tokens_used SET NOT NULL;
+ALTER TABLE study_users ALTER COLUMN prompt_tokens_used SET NOT NULL;
+ALTER TABLE study_users ALTER COLUMN completion_tokens_used SET NOT NULL;
+
+-- Keyset pagination indexes: (sort column, id) matches ORDER BY ... DESC, id DESC
+CREATE INDEX IF NOT EXISTS idx_study_users_created_at_id ON study_users(created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_study_users_tokens_id ON study_users(total_tokens_used DESC, id DESC);
+
+-- Superseded by idx_study_users_tokens_id
+DROP INDEX IF EXISTS idx_study_users_total_tokens;
+
+-- Case-insensitive prefix search (ILIKE 'abc%') on email and name
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX IF NOT EXISTS idx_study_users_email_trgm ON study_users USING gin (email gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_study_users_name_trgm ON study_users USING gin (name gin_trgm_ops);
+
+-- System-wide token totals, aggregated in the database
+CREATE OR REPLACE FUNCTION study_token_usage_totals()
+RETURNS TABLE (
+    total_users BIGINT,
+    total_tokens BIGINT,
+    total_prompt_tokens BIGINT,
+    total_completion_tokens BIGINT
+)
+LANGUAGE sql STABLE
+AS $$
+    SELECT count(*),
+           COALESCE(sum(total_tokens_used), 0),
+           COALESCE(sum(prompt_tokens_used), 0),
+           COALESCE(sum(completion_tokens_used), 0)
+    FROM study_users;
+$$;
+
+GRANT EXECUTE ON FUNCTION study_token_usage_totals() TO anon, authenticated;
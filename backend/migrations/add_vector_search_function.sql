@@ -0,0 +1,52 @@
+-- True top-K cosine similarity search over question embeddings
+-- Used by SupabaseService.search_similar_questions via RPC
+-- Requires pgvector >= 0.5.0 (HNSW). Run this in Supabase SQL Editor
+
+CREATE EXTENSION IF NOT EXISTS vector;
+
+-- Replace the IVFFlat index with HNSW: better recall/latency trade-off,
+-- no training step, and it stays accurate as rows are inserted
+DROP INDEX IF EXISTS study.idx_question_embeddings_vector;
+CREATE INDEX IF NOT EXISTS idx_question_embeddings_vector_hnsw ON study.question_embeddings
+USING hnsw (embedding vector_cosine_ops)
+WITH (m = 16, ef_construction = 64);
+
+-- Composite filter index for the per-user search (small banks are scanned exactly)
+CREATE INDEX IF NOT EXISTS idx_question_embeddings_user_subject_grade
+ON study.question_embeddings(user_id, subject, grade);
+
+-- Returns ids and scores only - never the 1536-float embeddings
+CREATE OR REPLACE FUNCTION match_question_embeddings(
+    query_embedding vector(1536),
+    match_threshold FLOAT,
+    match_count INT,
+    p_user_id INT,
+    p_subject TEXT DEFAULT NULL,
+    p_grade TEXT DEFAULT NULL
+)
+RETURNS TABLE (
+    id UUID,
+    question_id INT,
+    subject VARCHAR,
+    grade VARCHAR,
+    similarity FLOAT
+)
+LANGUAGE sql STABLE
+-- Candidate list size for HNSW scans; must be >= match_count
+SET hnsw.ef_search = 100
+AS $$
+    SELECT e.id,
+           e.question_id,
+           e.subject,
+           e.grade,
+           1 - (e.embedding <=> query_embedding) AS similarity
+    FROM study.question_embeddings e
+    WHERE e.user_id = p_user_id
+      AND (p_subject IS NULL OR e.subject = p_subject)
+      AND (p_grade IS NULL OR e.grade = p_grade)
+      AND 1 - (e.embedding <=> query_embedding) >= match_threshold
+    ORDER BY e.embedding <=> query_embedding
+    LIMIT match_count;
+$$;
+
+GRANT EXECUTE ON FUNCTION match_question_embeddings(vector, FLOAT, INT, INT, TEXT, TEXT) TO anon, authenticated;
@@ -90,10 +90,10 @@ CREATE INDEX IF NOT EXISTS idx_question_embeddings_question_id ON study.question
 CREATE INDEX IF NOT EXISTS idx_question_embeddings_subject ON study.question_embeddings(subject);
 CREATE INDEX IF NOT EXISTS idx_question_embeddings_grade ON study.question_embeddings(grade);
 
--- Create vector similarity search index (IVFFlat)
-CREATE INDEX IF NOT EXISTS idx_question_embeddings_vector ON study.question_embeddings
-USING ivfflat (embedding vector_cosine_ops)
-WITH (lists = 100);
+-- Create vector similarity search index (HNSW)
+CREATE INDEX IF NOT EXISTS idx_question_embeddings_vector_hnsw ON study.question_embeddings
+USING hnsw (embedding vector_cosine_ops)
+WITH (m = 16, ef_construction = 64);
 
 -- ================== AUTO-UPDATE TRIGGERS ==================
 